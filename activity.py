@@ -0,0 +1,485 @@
+"""
+Aktivitätsprotokoll: wer hat wann welchen Kunden/Lead wie geändert.
+
+- Jede Schreibmethode der Modelle sendet nach dem Commit ein Signal
+  (models.py); daraus wird ein Eintrag mit Benutzer, Zeitpunkt, Aktion
+  (create/update/delete) und Feld-Diff ({Feld: [alt, neu]}) erzeugt. Bei
+  delete enthält der Diff die letzten Werte der Zeile, gelöschte Daten
+  bleiben also nachvollziehbar.
+- Einträge landen zuerst in einem Puffer im Prozess. Ein Hintergrund-Thread
+  schreibt alle ACTIVITY_LOG_FLUSH_INTERVAL Sekunden (oder sobald
+  ACTIVITY_LOG_BATCH_SIZE Einträge warten) alles in einer Transaktion per
+  executemany (Group Commit). Der schreibende Request wartet damit auf
+  keinen zusätzlichen Commit. Stürzt der Prozess ab, fehlen höchstens die
+  Einträge des letzten Intervalls; bei normalem Beenden wird geleert.
+- Gespeichert wird in Monats-Partitionen (Tabellen activity_log_JJJJMM).
+  Retention: Partitionen, die komplett älter als
+  ACTIVITY_LOG_RETENTION_DAYS sind, werden per DROP TABLE entfernt – ohne
+  großes DELETE, ohne Sperre über viele Zeilen.
+- Jede Partition hat einen Index (entity_type, entity_id, created_at); die
+  Historie eines Kunden kostet pro Partition eine Indexsuche, unabhängig
+  von der Größe des Protokolls.
+- Jeder Eintrag trägt den Mandanten der Zeile; die Historie zeigt nur
+  Einträge des eigenen Mandanten. Bei TENANT_STORAGE=files liegen die
+  Partitionen in der Datei des jeweiligen Mandanten (tenancy.py).
+
+    flask --app app prune-activity   # Retention sofort anwenden
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import g, has_app_context, has_request_context
+from flask.cli import with_appcontext
+from flask_login import current_user
+
+from models import (
+    CHANGE_FEED_MODELS,
+    DEFAULT_TENANT_ID,
+    User,
+    current_tenant_id,
+    db,
+    row_added,
+    row_deleted,
+    row_updated,
+    rows_deleted,
+    rows_imported,
+    rows_updated,
+    utcnow,
+)
+from tenancy import tenant_router
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_BATCH_SIZE = 500
+# Wartet mehr im Puffer (z.B. Datenbank gesperrt), schreibt der Aufrufer selbst
+DEFAULT_MAX_PENDING = 50000
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_TIMELINE_LIMIT = 20
+# Retention höchstens so oft prüfen (Sekunden)
+PRUNE_INTERVAL = 3600
+
+# Ändern sich bei jedem Schreibzugriff, gehören nicht in den Diff
+IGNORED_FIELDS = ("row_version", "updated_at", "tenant_id")
+
+PARTITION_PREFIX = "activity_log_"
+_PARTITION_NAME = re.compile(rf"{PARTITION_PREFIX}(\d{{4}})(\d{{2}})")
+# Eigene Metadaten: db.create_all() und Migration 1 legen keine Partitionen an
+_partition_metadata = db.MetaData()
+
+# Modell → entity_type im Protokoll (wie im Änderungs-Feed: "customer", "lead")
+_ENTITY_TYPES = {model: kind for kind, model in CHANGE_FEED_MODELS.items()}
+
+
+def partition_name(created_at):
+    """Name der Monats-Partition für einen Zeitpunkt."""
+    return f"{PARTITION_PREFIX}{created_at:%Y%m}"
+
+
+def _partition_end(name):
+    """Erster Zeitpunkt nach der Partition (Monatsanfang des Folgemonats)."""
+    year, month = map(int, _PARTITION_NAME.fullmatch(name).groups())
+    return datetime(year + month // 12, month % 12 + 1, 1)
+
+
+def partition_table(name):
+    """Table-Objekt einer Partition (alle Partitionen haben dasselbe Schema)."""
+    table = _partition_metadata.tables.get(name)
+    if table is None:
+        table = db.Table(
+            name,
+            _partition_metadata,
+            db.Column("id", db.Integer, primary_key=True, autoincrement=True),
+            db.Column("created_at", db.DateTime, nullable=False),
+            db.Column("entity_type", db.String(16), nullable=False),
+            db.Column("entity_id", db.Integer, nullable=False),
+            db.Column("action", db.String(16), nullable=False),
+            db.Column("user_id", db.Integer),
+            db.Column("changes", db.Text, nullable=False),
+            db.Column("tenant_id", db.Integer, nullable=False,
+                      server_default=db.text(str(DEFAULT_TENANT_ID))),
+            db.Index(f"ix_{name}_entity", "entity_type", "entity_id", "created_at"),
+        )
+    return table
+
+
+def list_partitions(connection):
+    """Vorhandene Partitionen, neueste zuerst."""
+    names = db.inspect(connection).get_table_names()
+    return sorted((name for name in names if _PARTITION_NAME.fullmatch(name)), reverse=True)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _diff(before, after):
+    """{Feld: [alt, neu]} für alle geänderten Felder (None = kein Wert)."""
+    before = before or {}
+    after = after or {}
+    changes = {}
+    for field in dict.fromkeys([*before, *after]):
+        if field in IGNORED_FIELDS or field == "id":
+            continue
+        old, new = before.get(field), after.get(field)
+        if old != new:
+            changes[field] = [_json_value(old), _json_value(new)]
+    return changes
+
+
+def _tenant_of(row):
+    """Mandant einer geänderten Zeile (ohne tenant_id im Dict: der des Kontexts)."""
+    tenant_id = row.get("tenant_id")
+    if tenant_id is None:
+        tenant_id = current_tenant_id()
+    return DEFAULT_TENANT_ID if tenant_id is None else tenant_id
+
+
+def _current_user_id():
+    """Eingeloggter Benutzer des Requests bzw. Auftraggeber eines Jobs (g.activity_user_id)."""
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    if has_app_context():
+        return g.get("activity_user_id")
+    return None
+
+
+class ActivityLog:
+    """Gepufferte Aktivitätseinträge mit Group Commit (prozessweite Instanz `activity_log`)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.max_pending = DEFAULT_MAX_PENDING
+        self.retention_days = DEFAULT_RETENTION_DAYS
+        self._app = None
+        self._lock = threading.Lock()
+        # Serialisiert die Flushes (Hintergrund-Thread, Backpressure, atexit)
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        # Gerade in Arbeit befindlicher Block (für history() weiter sichtbar)
+        self._in_flight = []
+        self._created = set()
+        self._thread_pid = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+        self.recorded = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.largest_batch = 0
+        self.last_flush_seconds = 0.0
+        self.partitions_dropped = 0
+
+    def init_app(self, app):
+        """Konfiguration übernehmen und den CLI-Befehl `prune-activity` registrieren."""
+        self._app = app
+        self.enabled = app.config.get("ACTIVITY_LOG", True)
+        self.flush_interval = app.config.get("ACTIVITY_LOG_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        self.batch_size = app.config.get("ACTIVITY_LOG_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.max_pending = app.config.get("ACTIVITY_LOG_MAX_PENDING", DEFAULT_MAX_PENDING)
+        self.retention_days = app.config.get("ACTIVITY_LOG_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+        app.cli.add_command(prune_activity_command)
+
+    # -----------------------
+    # Schreiben
+    # -----------------------
+    def record(self, model, action, before=None, after=None):
+        """Eine Änderung vormerken; geschrieben wird gebündelt im Hintergrund."""
+        entity_type = _ENTITY_TYPES.get(model)
+        if not self.enabled or entity_type is None:
+            return
+        changes = _diff(before, after)
+        if action == "update" and not changes:
+            return
+        row = after or before
+        entry = {
+            "created_at": utcnow(),
+            "entity_type": entity_type,
+            "entity_id": row["id"],
+            "action": action,
+            "user_id": _current_user_id(),
+            "changes": changes,
+            "tenant_id": _tenant_of(row),
+        }
+        self._enqueue([entry])
+
+    def record_many(self, model, action, before=None, after=None):
+        """Wie record() für einen Block (Bulk-Import, Umwandlung); Listen gleicher Länge."""
+        if not self.enabled or model not in _ENTITY_TYPES:
+            return
+        rows = before or after
+        pairs = zip(before or [None] * len(rows), after or [None] * len(rows))
+        entity_type = _ENTITY_TYPES[model]
+        created_at = utcnow()
+        user_id = _current_user_id()
+        entries = []
+        for old, new in pairs:
+            changes = _diff(old, new)
+            if action == "update" and not changes:
+                continue
+            row = new or old
+            entries.append({
+                "created_at": created_at,
+                "entity_type": entity_type,
+                "entity_id": row["id"],
+                "action": action,
+                "user_id": user_id,
+                "changes": changes,
+                "tenant_id": _tenant_of(row),
+            })
+        self._enqueue(entries)
+
+    def _enqueue(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            self._pending.extend(entries)
+            self.recorded += len(entries)
+            pending = len(self._pending)
+        if not self.flush_interval or pending >= self.max_pending:
+            # Synchron (Intervall 0) bzw. Puffer voll: der Aufrufer schreibt selbst
+            self.flush()
+            return
+        self.ensure_thread()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def ensure_thread(self):
+        """Flush-Thread in diesem Prozess starten (Threads überleben kein fork())."""
+        if self._thread_pid == os.getpid() or self._app is None:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._stopping.clear()
+            threading.Thread(target=self._flush_loop, name="activity-log", daemon=True).start()
+            self._thread_pid = os.getpid()
+            atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if self.retention_days and time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    self.prune()
+            except Exception:
+                logger.exception("Writing the activity log failed; entries stay buffered.")
+
+    def flush(self):
+        """Alle gepufferten Einträge in einer Transaktion schreiben; gibt die Anzahl zurück."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            if not batch:
+                return 0
+            count = len(batch)
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception:
+                # Nicht verlieren: beim nächsten Flush erneut versuchen (_write hat
+                # bereits geschriebene Einträge aus batch entfernt)
+                with self._lock:
+                    self._pending[:0] = batch
+                self.flush_errors += 1
+                raise
+            finally:
+                self._in_flight = []
+            self.written += count
+            self.flushes += 1
+            self.largest_batch = max(self.largest_batch, count)
+            self.last_flush_seconds = time.perf_counter() - start
+            return count
+
+    def _write(self, batch):
+        # Ziel-Datenbank: bei einer Datei pro Mandant die des Mandanten, sonst die primäre
+        per_file = tenant_router.storage == "files"
+        stores = {}
+        for entry in batch:
+            row = dict(entry, changes=json.dumps(entry["changes"], default=str))
+            store = stores.setdefault(entry["tenant_id"] if per_file else None, ([], {}))
+            store[0].append(entry)
+            store[1].setdefault(partition_name(entry["created_at"]), []).append(row)
+        written = set()
+        try:
+            with self._app.app_context():
+                # Eigene Verbindung, unabhängig von der Request-Session
+                for store, (entries, partitions) in stores.items():
+                    with tenant_router.engine_for(store).begin() as conn:
+                        for name, rows in partitions.items():
+                            table = partition_table(name)
+                            if (store, name) not in self._created:
+                                table.create(conn, checkfirst=True)
+                                self._created.add((store, name))
+                            conn.execute(db.insert(table), rows)
+                    written.update(map(id, entries))
+        finally:
+            # Bei einem Fehler bleibt nur der nicht geschriebene Rest für den nächsten Versuch
+            batch[:] = [entry for entry in batch if id(entry) not in written]
+
+    def close(self):
+        """Flush-Thread beenden und den Puffer schreiben."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread_pid = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Writing the activity log failed; %d entries lost.", len(self._pending))
+
+    # -----------------------
+    # Retention
+    # -----------------------
+    def prune(self, now=None):
+        """Partitionen löschen, die komplett älter als die Retention sind; gibt ihre Namen zurück."""
+        self._last_prune = time.monotonic()
+        if not self.retention_days:
+            return []
+        cutoff = (now or utcnow()) - timedelta(days=self.retention_days)
+        dropped = []
+        with self._app.app_context():
+            for store, engine in tenant_router.engines():
+                with engine.begin() as conn:
+                    for name in list_partitions(conn):
+                        if _partition_end(name) <= cutoff:
+                            partition_table(name).drop(conn, checkfirst=True)
+                            self._created.discard((store, name))
+                            dropped.append(name)
+        self.partitions_dropped += len(dropped)
+        return dropped
+
+    # -----------------------
+    # Lesen
+    # -----------------------
+    def history(self, entity_type, entity_id, limit=DEFAULT_TIMELINE_LIMIT):
+        """
+        Die letzten `limit` Einträge eines Kunden/Leads, neueste zuerst:
+        Dicts mit created_at, action, user_id, username und changes.
+        Enthält auch noch gepufferte Einträge dieses Prozesses.
+        """
+        tenant_id = current_tenant_id()
+        with self._lock:
+            local = [
+                entry for entry in (*self._pending, *self._in_flight)
+                if entry["entity_type"] == entity_type and entry["entity_id"] == entity_id
+                and tenant_id in (None, entry["tenant_id"])
+            ]
+        entries = []
+        for name in list_partitions(db.session.connection()):
+            table = partition_table(name)
+            stmt = db.select(table.c.created_at, table.c.action, table.c.user_id, table.c.changes)
+            if tenant_id is not None:
+                # Core-Tabelle: der Mandantenfilter der Session greift hier nicht
+                stmt = stmt.where(table.c.tenant_id == tenant_id)
+            rows = db.session.execute(
+                stmt.where(table.c.entity_type == entity_type, table.c.entity_id == entity_id)
+                .order_by(table.c.created_at.desc(), table.c.id.desc())
+                .limit(limit - len(entries))
+            ).mappings()
+            entries.extend(dict(row, changes=json.loads(row["changes"])) for row in rows)
+            if len(entries) >= limit:
+                break
+        # Ein gerade committeter Block kann in beiden Quellen stehen
+        stored = {(entry["created_at"], entry["action"]) for entry in entries}
+        entries.extend(
+            dict(entry) for entry in local if (entry["created_at"], entry["action"]) not in stored
+        )
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        entries = entries[:limit]
+
+        user_ids = {entry["user_id"] for entry in entries if entry["user_id"] is not None}
+        usernames = dict(db.session.execute(
+            db.select(User.id, User.username).where(User.id.in_(user_ids))
+        ).all()) if user_ids else {}
+        for entry in entries:
+            entry["username"] = usernames.get(entry["user_id"])
+        return [
+            {key: entry[key] for key in ("created_at", "action", "user_id", "username", "changes")}
+            for entry in entries
+        ]
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "pending": pending,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "largest_batch": self.largest_batch,
+            "last_flush_seconds": self.last_flush_seconds,
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+# Prozessweite Instanz
+activity_log = ActivityLog()
+
+
+@row_added.connect
+def _on_row_added(model, row, **extra):
+    activity_log.record(model, "create", after=row)
+
+
+@row_updated.connect
+def _on_row_updated(model, before, after, **extra):
+    activity_log.record(model, "update", before=before, after=after)
+
+
+@row_deleted.connect
+def _on_row_deleted(model, row, **extra):
+    activity_log.record(model, "delete", before=row)
+
+
+@rows_imported.connect
+def _on_rows_imported(model, rows, **extra):
+    if not activity_log.enabled or model not in _ENTITY_TYPES or not rows:
+        return
+    if "id" not in rows[0]:
+        # Bulk-Import liefert keine IDs → über die im Block vergebenen row_versions nachschlagen
+        versions = [row["row_version"] for row in rows]
+        ids = dict(db.session.execute(
+            db.select(model.row_version, model.id)
+            .where(model.tenant_id == rows[0]["tenant_id"],
+                   model.row_version.between(min(versions), max(versions)))
+        ).all())
+        rows = [dict(row, id=ids[row["row_version"]]) for row in rows if row["row_version"] in ids]
+    activity_log.record_many(model, "create", after=rows)
+
+
+@rows_updated.connect
+def _on_rows_updated(model, before, after, **extra):
+    activity_log.record_many(model, "update", before=before, after=after)
+
+
+@rows_deleted.connect
+def _on_rows_deleted(model, rows, **extra):
+    activity_log.record_many(model, "delete", before=rows)
+
+
+# -----------------------
+# CLI
+# -----------------------
+@click.command("prune-activity")
+@with_appcontext
+def prune_activity_command():
+    """Drop activity log partitions older than ACTIVITY_LOG_RETENTION_DAYS."""
+    dropped = activity_log.prune()
+    click.echo(f"Dropped {len(dropped)} partition(s){': ' + ', '.join(dropped) if dropped else ''}.")
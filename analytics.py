@@ -0,0 +1,361 @@
+"""
+Auswertungen der Lead-Pipeline (GET /api/analytics/leads).
+
+Ein Bericht enthält:
+- Anzahl, Summe, Minimum, Maximum und Durchschnitt der Lead-Werte je
+  Status und je Quelle
+- gewichtete Prognose: Wert × Abschlusswahrscheinlichkeit des Status
+  (LEAD_STAGE_WEIGHTS; unbekannte Status → DEFAULT_STAGE_WEIGHT)
+- Perzentile der Werteverteilung
+- die Top-N-Firmen nach Pipeline-Wert
+
+Zwei Verfahren liefern denselben Bericht:
+- "sql" (Standard): alle Gruppierungen laufen in der Datenbank. Ein
+  GROUP BY (status, source) liefert Status- und Quellen-Summen samt
+  Prognose, die Top-Firmen kommen aus einem GROUP BY company. Beide lesen
+  nur den Bereich des Mandanten in den abdeckenden Indizes
+  ix_leads_tenant_status_source_value bzw. ix_leads_tenant_company_value
+  statt der Tabelle. Perzentile berechnet PostgreSQL mit percentile_cont;
+  unter SQLite wird je Perzentil der Nachbarwert über den Index
+  ix_leads_tenant_value angesprungen (ORDER BY value LIMIT 2 OFFSET k) und
+  linear interpoliert.
+- "numpy": die Spalten werden in einem Durchlauf als Arrays geladen und
+  vektorisiert ausgewertet (bincount/reduceat/percentile) – für Datenbanken
+  ohne passende Indizes oder Perzentilfunktionen. Benötigt numpy (optional).
+
+Berichte werden pro Mandant und Version der Tabelle leads (TableVersion)
+gecacht; jede Schreibmethode erhöht die Version, ein Bericht ist damit nie
+veraltet.
+Version und Daten stammen aus demselben Lese-Snapshot der Transaktion.
+"""
+import gc
+import importlib.util
+import math
+import threading
+from collections import OrderedDict
+
+from models import Lead, TableVersion, current_tenant_id, db, tenant_clause
+
+# numpy ist optional und wird erst bei der ersten numpy-Auswertung importiert
+# (der Import kostet beim Start spürbar Zeit, die meisten Worker brauchen ihn nie)
+HAVE_NUMPY = importlib.util.find_spec("numpy") is not None
+numpy = None
+
+ENGINES = ("sql", "numpy")
+DEFAULT_ENGINE = "sql"
+# Abschlusswahrscheinlichkeit je Status für die gewichtete Prognose
+DEFAULT_STAGE_WEIGHTS = {
+    "new": 0.1,
+    "contacted": 0.2,
+    "qualified": 0.4,
+    "proposal": 0.6,
+    "negotiation": 0.8,
+    "won": 1.0,
+    "lost": 0.0,
+}
+DEFAULT_STAGE_WEIGHT = 0.1
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 100
+# Anzahl gecachter Berichte (verschiedene Versionen/Parameter)
+DEFAULT_CACHE_SIZE = 16
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """Das gewünschte Verfahren braucht ein nicht installiertes Paket."""
+
+
+class LeadAnalytics:
+    """Berechnet Pipeline-Berichte und cacht sie pro Tabellenversion (LRU)."""
+
+    def __init__(self, engine=DEFAULT_ENGINE, stage_weights=None, max_entries=DEFAULT_CACHE_SIZE):
+        self.engine = engine
+        self.stage_weights = dict(stage_weights or DEFAULT_STAGE_WEIGHTS)
+        self.default_weight = DEFAULT_STAGE_WEIGHT
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Verhindert, dass parallele Requests denselben Bericht mehrfach rechnen
+        self._compute_lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Verfahren, Gewichte und Cache-Größe aus der App-Konfiguration übernehmen."""
+        self.engine = app.config.get("ANALYTICS_ENGINE", DEFAULT_ENGINE)
+        self.stage_weights = dict(app.config.get("LEAD_STAGE_WEIGHTS", DEFAULT_STAGE_WEIGHTS))
+        self.default_weight = app.config.get("LEAD_DEFAULT_STAGE_WEIGHT", DEFAULT_STAGE_WEIGHT)
+        self.max_entries = app.config.get("ANALYTICS_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+        self.clear()
+
+    def weight(self, status):
+        return self.stage_weights.get(status, self.default_weight)
+
+    # -----------------------
+    # Bericht
+    # -----------------------
+    def report(self, top_n=DEFAULT_TOP_N, engine=None):
+        """Pipeline-Bericht als Dict (aus dem Cache, falls die Version passt)."""
+        engine = engine or self.engine
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of: {', '.join(ENGINES)}.")
+        if engine == "numpy" and not HAVE_NUMPY:
+            raise AnalyticsUnavailable("engine=numpy requires the numpy package.")
+
+        version = TableVersion.get_versions([Lead.__tablename__])[Lead.__tablename__][0]
+        key = (current_tenant_id(), version, engine, top_n)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        with self._compute_lock:
+            cached = self._get(key, count=False)
+            if cached is not None:
+                return cached
+            compute = _sql_report if engine == "sql" else _numpy_report
+            report = compute(self, top_n)
+            report.update(version=version, engine=engine)
+            self._put(key, report)
+        return report
+
+    # -----------------------
+    # Cache
+    # -----------------------
+    def _get(self, key, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            if count:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return entry
+
+    def _put(self, key, report):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Prozessweite Instanz
+lead_analytics = LeadAnalytics()
+
+
+def _group(count, total, low, high, weighted):
+    return {
+        "count": count,
+        "value": round(total, 2),
+        "avg": round(total / count, 2) if count else None,
+        "min": low,
+        "max": high,
+        "weighted_value": round(weighted, 2),
+    }
+
+
+def _build_report(analytics, cells, percentiles, top_companies):
+    """
+    Bericht aus den Zellen (status, source, count, sum, min, max) des
+    GROUP BY zusammensetzen – Status, Quellen und Gesamtwerte sind nur
+    Verdichtungen dieser wenigen Zeilen.
+    """
+    by_status, by_source = {}, {}
+    for status, source, count, total, low, high in cells:
+        weighted = total * analytics.weight(status)
+        for groups, name in ((by_status, status), (by_source, source)):
+            group = groups.get(name)
+            if group is None:
+                groups[name] = [count, total, low, high, weighted]
+            else:
+                group[0] += count
+                group[1] += total
+                group[2] = min(group[2], low)
+                group[3] = max(group[3], high)
+                group[4] += weighted
+
+    count = sum(group[0] for group in by_status.values())
+    total = sum((group[1] for group in by_status.values()), 0.0)
+    weighted = sum((group[4] for group in by_status.values()), 0.0)
+    statuses = {}
+    for status, group in sorted(by_status.items(), key=lambda item: -item[1][1]):
+        statuses[status] = dict(_group(*group), weight=analytics.weight(status))
+    return {
+        "total": {
+            "count": count,
+            "value": round(total, 2),
+            "avg": round(total / count, 2) if count else None,
+            "weighted_value": round(weighted, 2),
+        },
+        "by_status": statuses,
+        "by_source": {
+            source: _group(*group)
+            for source, group in sorted(by_source.items(), key=lambda item: -item[1][1])
+        },
+        "percentiles": {f"p{p}": value for p, value in zip(PERCENTILES, percentiles)},
+        "top_companies": [
+            {"company": company, "count": n, "value": round(value, 2)}
+            for company, n, value in top_companies
+        ],
+    }
+
+
+# -----------------------
+# SQL
+# -----------------------
+def _sql_report(analytics, top_n):
+    cells = db.session.execute(
+        db.select(
+            Lead.status,
+            Lead.source,
+            db.func.count(),
+            db.func.sum(Lead.value),
+            db.func.min(Lead.value),
+            db.func.max(Lead.value),
+        ).group_by(Lead.status, Lead.source)
+    ).all()
+    total = db.func.sum(Lead.value)
+    top_companies = db.session.execute(
+        db.select(Lead.company, db.func.count(), total)
+        .group_by(Lead.company)
+        .order_by(total.desc(), Lead.company)
+        .limit(top_n)
+    ).all()
+    count = sum(cell[2] for cell in cells)
+    return _build_report(analytics, cells, _sql_percentiles(count), top_companies)
+
+
+def _sql_percentiles(count):
+    """Perzentile (lineare Interpolation wie percentile_cont / numpy.percentile)."""
+    if not count:
+        return [None] * len(PERCENTILES)
+    if db.session.get_bind().dialect.name == "postgresql":
+        row = db.session.execute(
+            db.select(*(
+                db.func.percentile_cont(p / 100).within_group(Lead.value) for p in PERCENTILES
+            ))
+        ).one()
+        return list(row)
+
+    values = []
+    for p in PERCENTILES:
+        position = p / 100 * (count - 1)
+        offset = math.floor(position)
+        # Geht über ix_leads_tenant_value: O(offset) Indexeinträge, keine Sortierung
+        neighbours = db.session.execute(
+            db.select(Lead.value).order_by(Lead.value).limit(2).offset(offset)
+        ).scalars().all()
+        low = neighbours[0]
+        high = neighbours[1] if len(neighbours) > 1 else low
+        values.append(low + (high - low) * (position - offset))
+    return values
+
+
+# -----------------------
+# numpy
+# -----------------------
+# Zeilen pro fetchmany beim Laden der Spalten (begrenzt den Speicher für Row-Tupel)
+LOAD_BATCH_SIZE = 50000
+
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        import numpy
+
+
+def _encode(values, codes):
+    """Werte über das Dict `codes` (Wert → Code, wird ergänzt) in ein int-Array übersetzen."""
+    for value in dict.fromkeys(values):
+        codes.setdefault(value, len(codes))
+    return numpy.fromiter(map(codes.__getitem__, values), dtype=numpy.intp, count=len(values))
+
+
+def _load_columns():
+    """
+    Status, Quelle, Firma und Wert aller Leads des Mandanten in einem Durchlauf laden.
+    Texte werden dabei direkt in Codes übersetzt, sodass nur int-/float-Arrays
+    und die eindeutigen Werte übrig bleiben. Die Zeilen werden blockweise
+    über Core (ohne ORM-Pufferung) geholt und sofort verworfen. Die zyklische
+    Garbage Collection ist währenddessen aus: die Row-Tupel bilden keine
+    Zyklen, bei einer Million davon würde sie aber Sekunden kosten.
+    """
+    dictionaries = ({}, {}, {})
+    chunks = ([], [], [], [])
+    result = db.session.connection().execute(
+        # Core-Ausführung: der Mandantenfilter der Session greift hier nicht
+        db.select(Lead.status, Lead.source, Lead.company, Lead.value).where(tenant_clause(Lead))
+    )
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for rows in result.partitions(LOAD_BATCH_SIZE):
+            *texts, values = zip(*rows)
+            for position, codes in enumerate(dictionaries):
+                chunks[position].append(_encode(texts[position], codes))
+            chunks[3].append(numpy.fromiter(values, dtype=numpy.float64, count=len(values)))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if not chunks[3]:
+        return None
+    arrays = [numpy.concatenate(chunk) for chunk in chunks]
+    names = [list(codes) for codes in dictionaries]
+    return arrays, names
+
+
+def _numpy_report(analytics, top_n):
+    _import_numpy()
+    columns = _load_columns()
+    if columns is None:
+        return _build_report(analytics, [], [None] * len(PERCENTILES), [])
+    (status_codes, source_codes, company_codes, values), names = columns
+    status_names, source_names, company_names = names
+
+    # Zellen (status, source) als ein kombinierter Code
+    cell_codes = status_codes * len(source_names) + source_codes
+    order = numpy.argsort(cell_codes, kind="stable")
+    sorted_cells = cell_codes[order]
+    sorted_values = values[order]
+    starts = numpy.flatnonzero(numpy.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    cell_ids = sorted_cells[starts]
+    counts = numpy.diff(numpy.r_[starts, len(sorted_cells)])
+    sums = numpy.add.reduceat(sorted_values, starts)
+    lows = numpy.minimum.reduceat(sorted_values, starts)
+    highs = numpy.maximum.reduceat(sorted_values, starts)
+    cells = [
+        (status_names[cell // len(source_names)], source_names[cell % len(source_names)],
+         int(n), float(total), float(low), float(high))
+        for cell, n, total, low, high in zip(cell_ids.tolist(), counts, sums, lows, highs)
+    ]
+
+    percentiles = numpy.percentile(values, PERCENTILES).tolist()
+
+    company_counts = numpy.bincount(company_codes)
+    company_sums = numpy.bincount(company_codes, weights=values)
+    if len(company_sums) > top_n:
+        candidates = numpy.argpartition(-company_sums, top_n - 1)[:top_n] if top_n else []
+    else:
+        candidates = numpy.arange(len(company_sums))
+    top_companies = sorted(
+        ((company_names[i], int(company_counts[i]), float(company_sums[i])) for i in candidates),
+        key=lambda item: (-item[2], item[0]),
+    )
+    return _build_report(analytics, cells, percentiles, top_companies)
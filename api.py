@@ -1,43 +1,259 @@
-from flask import Blueprint, jsonify, request
+import json
+import os
+from functools import wraps
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    jsonify,
+    make_response,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user
 
-from models import Customer, Lead
+import search
+import serializers
+from analytics import AnalyticsUnavailable, DEFAULT_TOP_N, ENGINES, MAX_TOP_N, lead_analytics
+from dedup import DEFAULT_REPORT_LIMIT, MAX_REPORT_LIMIT, duplicate_detector
+from http_cache import body_cache, conditional_response
+from importers import UnsupportedFormat, check_mimetype, iter_records
+from jobs import JOB_STATUSES, JobRejected, job_queue
+from models import (
+    BULK_CHUNK_SIZE,
+    CONVERT_CHUNK_SIZE,
+    MAX_BULK_CHUNK_SIZE,
+    Customer,
+    Lead,
+    get_changes,
+    parse_list_args,
+)
+from stats import dashboard_stats
+from user_cache import user_cache
 
 
 # API-Blueprint: bündelt alle REST- und JSON-Endpunkte unter dem Präfix "/api"
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+# Standard- und Maximalgröße einer Seite bei Keyset-Pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Änderungen pro Antwort im Delta-Sync-Feed (/changes)
+DEFAULT_CHANGES_LIMIT = 500
+# Größte Änderungsnummer (64-Bit-Integer der Datenbank)
+MAX_CHANGE_SEQ = 2 ** 63 - 1
+
+# Unterstützte Streaming-Formate für Komplett-Exporte (?stream=...)
+STREAM_FORMATS = ("ndjson", "json")
+
+
+def _bad_request(message):
+    """Anfrage mit einer JSON-Fehlermeldung (400) abbrechen."""
+    abort(make_response(jsonify({"message": message}), 400))
+
+
+def api_login_required(f):
+    """Decorator: Route nur für eingeloggte Benutzer, sonst 401 als JSON statt Umleitung."""
+    @wraps(f)
+    def decorated_view(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({"message": "Login required."}), 401
+        return f(*args, **kwargs)
+    return decorated_view
+
+
+def _int_arg(name):
+    """Optionalen Integer-Query-Parameter lesen (None, wenn nicht gesetzt)."""
+    raw = request.args.get(name)
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        _bad_request(f"{name} must be an integer.")
+
+
+def _parse_paging_args():
+    """Pagination-Parameter (after, limit, stream) aus der Query lesen und validieren."""
+    after = _int_arg("after")
+    limit = _int_arg("limit")
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        _bad_request(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    stream = request.args.get("stream")
+    if stream is not None and stream not in STREAM_FORMATS:
+        _bad_request(f"stream must be one of: {', '.join(STREAM_FORMATS)}.")
+    return after, limit, stream
+
+
+def _stream_rows(rows, stream):
+    """
+    Zeilen-Generator als gestreamte HTTP-Antwort ausliefern.
+    - ndjson: ein JSON-Objekt pro Zeile
+    - json:   ein JSON-Array, das Element für Element geschrieben wird
+    """
+    if stream == "ndjson":
+        def generate():
+            for row in rows:
+                yield serializers.dumps(row) + b"\n"
+
+        mimetype = "application/x-ndjson"
+    else:
+        def generate():
+            yield b"["
+            first = True
+            for row in rows:
+                yield (b"" if first else b",") + serializers.dumps(row)
+                first = False
+            yield b"]"
+
+        mimetype = "application/json"
+
+    # stream_with_context hält App- und DB-Kontext offen, solange der Generator läuft
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def _list_response(model, get_rows, iter_rows):
+    """
+    Listen-Antwort mit ETag/Last-Modified aus der Tabellenversion:
+    unveränderte Daten → 304 ohne Datenbankzugriff auf die Zeilen,
+    sonst Body aus dem Body-Cache oder neu erzeugt (siehe http_cache.py).
+    """
+    return conditional_response(
+        (model.__tablename__,),
+        lambda: _build_list_response(model, get_rows, iter_rows),
+        cache_body=True,
+    )
+
+
+def _build_list_response(model, get_rows, iter_rows):
+    """
+    Gemeinsame Logik für die Listen-Endpunkte:
+    - ohne Parameter: komplette Liste (bisheriges Verhalten)
+    - mit limit/after: eine Seite plus Cursor für die nächste Seite
+    - mit stream: kompletter Export als gestreamte Antwort
+    - mit format: json (Standard), columnar, csv oder arrow (siehe serializers.py)
+    Filter, Suche (q) und Sortierung (sort) gelten in allen Modi.
+    Zeilen werden als Tupel der API-Spalten geladen (ohne ORM-Objekte).
+    """
+    after, limit, stream = _parse_paging_args()
+    fmt = request.args.get("format", "json")
+    if fmt not in serializers.FORMATS:
+        _bad_request(f"format must be one of: {', '.join(serializers.FORMATS)}.")
+    if stream and fmt != "json":
+        _bad_request("stream can only be combined with format=json.")
+
+    paged = limit is not None or after is not None
+    if paged:
+        limit = limit or DEFAULT_PAGE_SIZE
+    try:
+        filters, sort = parse_list_args(model, request.args)
+        if stream:
+            return _stream_rows(iter_rows(after=after, filters=filters, sort=sort), stream)
+        rows = get_rows(after=after, limit=limit, filters=filters, sort=sort)
+    except ValueError as exc:
+        _bad_request(str(exc))
+
+    # Nur wenn die Seite voll ist, kann es weitere Datensätze geben
+    next_cursor = None
+    if paged and len(rows) == limit:
+        next_cursor = rows[-1][model.API_FIELDS.index("id")]
+    try:
+        return serializers.render_rows(fmt, model.API_FIELDS, rows, paged, next_cursor)
+    except serializers.FormatUnavailable as exc:
+        return jsonify({"message": str(exc)}), 503
+
+
+def _bulk_import_response(bulk_add):
+    """
+    Gemeinsame Logik für die Bulk-Import-Endpunkte:
+    Body als JSON-Array, NDJSON oder CSV lesen und blockweise importieren.
+    Antwortet mit der Anzahl importierter Zeilen und einem Fehler pro Zeile.
+    """
+    if not current_user.is_admin():
+        return jsonify({"message": "Admin access required."}), 403
+
+    chunk_size = _int_arg("chunk_size") or BULK_CHUNK_SIZE
+    if not 1 <= chunk_size <= MAX_BULK_CHUNK_SIZE:
+        _bad_request(f"chunk_size must be between 1 and {MAX_BULK_CHUNK_SIZE}.")
+
+    try:
+        records = iter_records(request)
+    except UnsupportedFormat as exc:
+        return jsonify({"message": str(exc)}), exc.status_code
+
+    inserted, errors = bulk_add(records, chunk_size=chunk_size)
+    return jsonify({"inserted": inserted, "failed": len(errors), "errors": errors})
+
 
 @api_bp.route("/customers", methods=["GET"])
+@api_login_required
 def api_get_customers():
     """
-    Get all customers
+    Get customers (all, paginated or streamed)
     ---
     tags:
       - Customers
     produces:
       - application/json
+      - application/x-ndjson
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        description: Page size (1-1000). Enables keyset pagination.
+      - in: query
+        name: after
+        type: integer
+        description: Cursor; return customers with an id greater than this value.
+      - in: query
+        name: stream
+        type: string
+        enum: [ndjson, json]
+        description: Stream the full table (starting after the cursor) with constant memory.
+      - in: query
+        name: format
+        type: string
+        enum: [json, columnar, csv, arrow]
+        description: >
+          Output format. columnar returns {columns, data} with one array per column;
+          csv and arrow (Arrow IPC stream, needs pyarrow) return the next-page cursor in X-Next-Cursor.
+      - in: query
+        name: status
+        type: string
+        description: Exact status filter
+      - in: query
+        name: company
+        type: string
+        description: Case-insensitive company prefix
+      - in: query
+        name: q
+        type: string
+        description: Case-insensitive prefix search over name, email and company
+      - in: query
+        name: sort
+        type: string
+        enum: [id, -id, name, -name, email, -email, company, -company, status, -status]
+        description: Sort field, prefix with "-" for descending order
     responses:
       200:
-        description: List of customers
-    """
-    # Alle Kunden-Objekte per SQLAlchemy holen und in primitive JSON-Struktur umwandeln
-    customers = Customer.get_all_customers()
-    data = [
-        {
-            "id": c.id,
-            "name": c.name,
-            "email": c.email,
-            "company": c.company,
-            "phone": c.phone,
-            "status": c.status,
-        }
-        for c in customers
-    ]
-    return jsonify(data)
+        description: List of customers, or {items, next} when paginated
+      400:
+        description: Invalid pagination, filter or sort parameters
+      401:
+        description: Login required
+      503:
+        description: The requested format needs an optional package that is not installed
+    """
+    return _list_response(Customer, Customer.get_customer_rows, Customer.iter_customer_rows)
 
 
 @api_bp.route("/customers", methods=["POST"])
+@api_login_required
 def api_create_customer():
     """
     Create a new customer
@@ -65,16 +281,26 @@ def api_create_customer():
               type: string
             status:
               type: string
+      - in: query
+        name: force
+        type: boolean
+        description: Create the customer even if the duplicate policy is "reject"
     responses:
       201:
-        description: Created customer
+        description: >
+          Created customer; with the "warn" duplicate policy it carries
+          possible_duplicates when similar customers exist
       400:
         description: Invalid input data
+      401:
+        description: Login required
       403:
         description: Admin access required for creating customers
+      409:
+        description: Possible duplicates found and the duplicate policy is "reject"
     """
     # Nur eingeloggte Admin-Benutzer dürfen neue Kunden per API anlegen
-    if not current_user.is_authenticated or not current_user.is_admin():
+    if not current_user.is_admin():
         return jsonify({"message": "Admin access required."}), 403
 
     # JSON-Body der Anfrage einlesen
@@ -89,54 +315,175 @@ def api_create_customer():
     if not all([name, email, company, phone]):
         return jsonify({"message": "name, email, company and phone are required."}), 400
 
+    # Dublettenprüfung über den Schlüsselindex (siehe dedup.py)
+    duplicates = []
+    if duplicate_detector.policy != "off":
+        duplicates = duplicate_detector.find_duplicates(name, email, company)
+    force = request.args.get("force", "").lower() in ("1", "true", "yes")
+    if duplicates and duplicate_detector.policy == "reject" and not force:
+        return jsonify({
+            "message": "Possible duplicate customer; repeat with force=true to create it anyway.",
+            "duplicates": duplicates,
+        }), 409
+
     # Über das SQLAlchemy-Modell neuen Datensatz in der DB anlegen
     customer = Customer.add_customer(name, email, company, phone, status)
-    return (
-        jsonify(
-            {
-                "id": customer.id,
-                "name": customer.name,
-                "email": customer.email,
-                "company": customer.company,
-                "phone": customer.phone,
-                "status": customer.status,
-            }
-        ),
-        201,
+    body = customer.to_dict()
+    if duplicates:
+        body["possible_duplicates"] = duplicates
+    return jsonify(body), 201
+
+
+@api_bp.route("/customers/duplicates", methods=["GET"])
+@api_login_required
+def api_customer_duplicates():
+    """
+    Duplicate customer report
+    ---
+    tags:
+      - Customers
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of groups (1-1000, default 100), largest groups first
+    responses:
+      200:
+        description: >
+          Groups of likely duplicate customers (same normalized email, or similar
+          names at the same normalized company) with score and reasons, plus scan
+          counters; cached per customers table version
+      400:
+        description: Invalid limit
+      401:
+        description: Login required
+    """
+    limit = _int_arg("limit") or DEFAULT_REPORT_LIMIT
+    if not 1 <= limit <= MAX_REPORT_LIMIT:
+        _bad_request(f"limit must be between 1 and {MAX_REPORT_LIMIT}.")
+    return conditional_response(
+        (Customer.__tablename__,),
+        lambda: serializers.json_response(duplicate_detector.report(limit)),
     )
 
 
+@api_bp.route("/customers/bulk", methods=["POST"])
+@api_login_required
+def api_bulk_create_customers():
+    """
+    Bulk import customers
+    ---
+    tags:
+      - Customers
+    consumes:
+      - application/json
+      - application/x-ndjson
+      - text/csv
+    produces:
+      - application/json
+    parameters:
+      - in: body
+        name: body
+        required: true
+        description: JSON array, NDJSON stream or CSV with a header row (name, email, company, phone, status)
+        schema:
+          type: array
+          items:
+            type: object
+      - in: query
+        name: chunk_size
+        type: integer
+        description: Rows per insert transaction (default 1000)
+    responses:
+      200:
+        description: Import report with the number of inserted rows and per-row errors
+      400:
+        description: Malformed body or parameters
+      401:
+        description: Login required
+      403:
+        description: Admin access required for importing customers
+      415:
+        description: Unsupported content type
+    """
+    return _bulk_import_response(Customer.bulk_add)
+
+
 @api_bp.route("/leads", methods=["GET"])
+@api_login_required
 def api_get_leads():
     """
-    Get all leads
+    Get leads (all, paginated or streamed)
     ---
     tags:
       - Leads
     produces:
       - application/json
+      - application/x-ndjson
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        description: Page size (1-1000). Enables keyset pagination.
+      - in: query
+        name: after
+        type: integer
+        description: Cursor; return leads with an id greater than this value.
+      - in: query
+        name: stream
+        type: string
+        enum: [ndjson, json]
+        description: Stream the full table (starting after the cursor) with constant memory.
+      - in: query
+        name: format
+        type: string
+        enum: [json, columnar, csv, arrow]
+        description: >
+          Output format. columnar returns {columns, data} with one array per column;
+          csv and arrow (Arrow IPC stream, needs pyarrow) return the next-page cursor in X-Next-Cursor.
+      - in: query
+        name: status
+        type: string
+        description: Exact status filter
+      - in: query
+        name: source
+        type: string
+        description: Exact source filter
+      - in: query
+        name: company
+        type: string
+        description: Case-insensitive company prefix
+      - in: query
+        name: min_value
+        type: number
+      - in: query
+        name: max_value
+        type: number
+      - in: query
+        name: q
+        type: string
+        description: Case-insensitive prefix search over name, email and company
+      - in: query
+        name: sort
+        type: string
+        description: One of id, name, email, company, value, source, status; prefix with "-" for descending order
     responses:
       200:
-        description: List of leads
-    """
-    # Alle Leads holen und in JSON-Struktur mappen
-    leads = Lead.get_all_leads()
-    data = [
-        {
-            "id": l.id,
-            "name": l.name,
-            "email": l.email,
-            "company": l.company,
-            "value": l.value,
-            "source": l.source,
-            "status": l.status,
-        }
-        for l in leads
-    ]
-    return jsonify(data)
+        description: List of leads, or {items, next} when paginated
+      400:
+        description: Invalid pagination, filter or sort parameters
+      401:
+        description: Login required
+      503:
+        description: The requested format needs an optional package that is not installed
+    """
+    return _list_response(Lead, Lead.get_lead_rows, Lead.iter_lead_rows)
 
 
 @api_bp.route("/leads", methods=["POST"])
+@api_login_required
 def api_create_lead():
     """
     Create a new lead
@@ -169,11 +516,13 @@ def api_create_lead():
         description: Created lead
       400:
         description: Invalid input data
+      401:
+        description: Login required
       403:
         description: Admin access required for creating leads
     """
     # Erneut: nur Admins dürfen Leads über die API anlegen
-    if not current_user.is_authenticated or not current_user.is_admin():
+    if not current_user.is_admin():
         return jsonify({"message": "Admin access required."}), 403
 
     # JSON-Body einlesen
@@ -196,18 +545,595 @@ def api_create_lead():
 
     # Lead über das SQLAlchemy-Modell speichern
     lead = Lead.add_lead(name, email, company, value_float, source)
-    return (
-        jsonify(
-            {
-                "id": lead.id,
-                "name": lead.name,
-                "email": lead.email,
-                "company": lead.company,
-                "value": lead.value,
-                "source": lead.source,
-                "status": lead.status,
-            }
-        ),
-        201,
+    return jsonify(lead.to_dict()), 201
+
+
+@api_bp.route("/leads/bulk", methods=["POST"])
+@api_login_required
+def api_bulk_create_leads():
+    """
+    Bulk import leads
+    ---
+    tags:
+      - Leads
+    consumes:
+      - application/json
+      - application/x-ndjson
+      - text/csv
+    produces:
+      - application/json
+    parameters:
+      - in: body
+        name: body
+        required: true
+        description: JSON array, NDJSON stream or CSV with a header row (name, email, company, value, source)
+        schema:
+          type: array
+          items:
+            type: object
+      - in: query
+        name: chunk_size
+        type: integer
+        description: Rows per insert transaction (default 1000)
+    responses:
+      200:
+        description: Import report with the number of inserted rows and per-row errors
+      400:
+        description: Malformed body or parameters
+      401:
+        description: Login required
+      403:
+        description: Admin access required for importing leads
+      415:
+        description: Unsupported content type
+    """
+    return _bulk_import_response(Lead.bulk_add)
+
+
+def _conversion_options(payload):
+    """Kundenstatus und delete-Flag für die Lead-Umwandlung aus dem Body lesen."""
+    status = payload.get("status", "active")
+    if not isinstance(status, str) or not status:
+        _bad_request("status must be a non-empty string.")
+    delete = payload.get("delete", False)
+    if not isinstance(delete, bool):
+        _bad_request("delete must be a boolean.")
+    return status, delete
+
+
+@api_bp.route("/leads/<int:lead_id>/convert", methods=["POST"])
+@api_login_required
+def api_convert_lead(lead_id):
+    """
+    Convert a lead into a customer
+    ---
+    tags:
+      - Leads
+    consumes:
+      - application/json
+    produces:
+      - application/json
+    parameters:
+      - in: path
+        name: lead_id
+        type: integer
+        required: true
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              description: Status of the new customer (default "active")
+            delete:
+              type: boolean
+              description: Delete the lead instead of marking it as converted
+    responses:
+      201:
+        description: Created customer
+      401:
+        description: Login required
+      403:
+        description: Admin access required for converting leads
+      404:
+        description: Lead not found
+      409:
+        description: Lead has already been converted
+    """
+    if not current_user.is_admin():
+        return jsonify({"message": "Admin access required."}), 403
+
+    status, delete = _conversion_options(request.get_json(silent=True) or {})
+    lead = Lead.get_lead_by_id(lead_id)
+    if lead is None:
+        return jsonify({"message": "Lead not found."}), 404
+    if lead.converted_at is not None:
+        return jsonify({
+            "message": "Lead has already been converted.",
+            "customer_id": lead.converted_customer_id,
+        }), 409
+
+    customer = Lead.convert_lead(lead_id, customer_status=status, delete=delete)
+    if customer is None:
+        # Zwischenzeitlich parallel umgewandelt oder gelöscht
+        return jsonify({"message": "Lead has already been converted."}), 409
+    return jsonify(customer.to_dict()), 201
+
+
+@api_bp.route("/leads/convert", methods=["POST"])
+@api_login_required
+def api_convert_leads():
+    """
+    Convert many leads into customers
+    ---
+    tags:
+      - Leads
+    description: >
+      Converts the leads given by "ids", or, without ids, all leads matching the
+      list filters in the query (same filters as GET /api/leads). Leads are
+      processed in chunks, one transaction per chunk; leads that are missing or
+      already converted are skipped.
+    consumes:
+      - application/json
+    produces:
+      - application/json
+    parameters:
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+            status:
+              type: string
+              description: Status of the new customers (default "active")
+            delete:
+              type: boolean
+              description: Delete the leads instead of marking them as converted
+      - in: query
+        name: chunk_size
+        type: integer
+        description: Leads per transaction (default 1000)
+      - in: query
+        name: status
+        type: string
+        description: Lead filter (only without ids); other list filters and q work as well
+    responses:
+      200:
+        description: Number of converted leads, lead/customer id pairs and number of skipped ids
+      400:
+        description: Invalid body, filter or chunk_size, or neither ids nor a filter given
+      401:
+        description: Login required
+      403:
+        description: Admin access required for converting leads
+    """
+    if not current_user.is_admin():
+        return jsonify({"message": "Admin access required."}), 403
+
+    chunk_size = _int_arg("chunk_size") or CONVERT_CHUNK_SIZE
+    if not 1 <= chunk_size <= MAX_BULK_CHUNK_SIZE:
+        _bad_request(f"chunk_size must be between 1 and {MAX_BULK_CHUNK_SIZE}.")
+    payload = request.get_json(silent=True) or {}
+    status, delete = _conversion_options(payload)
+
+    ids = payload.get("ids")
+    filters = None
+    if ids is not None:
+        if not isinstance(ids, list) or not all(
+            isinstance(lead_id, int) and not isinstance(lead_id, bool) for lead_id in ids
+        ):
+            _bad_request("ids must be an array of integers.")
+    else:
+        try:
+            filters, _ = parse_list_args(Lead, request.args)
+        except ValueError as exc:
+            _bad_request(str(exc))
+        # Schutz vor versehentlicher Umwandlung aller Leads
+        if not filters:
+            _bad_request("ids or at least one list filter is required.")
+
+    conversions, skipped = Lead.convert_leads(
+        ids, filters, customer_status=status, delete=delete, chunk_size=chunk_size
+    )
+    return jsonify({
+        "converted": len(conversions),
+        "skipped": skipped,
+        "conversions": [
+            {"lead_id": lead_id, "customer_id": customer_id}
+            for lead_id, customer_id in conversions
+        ],
+    })
+
+
+@api_bp.route("/search", methods=["GET"])
+@api_login_required
+def api_search():
+    """
+    Full-text search over customers and leads
+    ---
+    tags:
+      - Search
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        description: Search text; every word is matched as a prefix against name, email and company
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of results (1-50, default 10)
+      - in: query
+        name: type
+        type: string
+        enum: [customer, lead]
+        description: Restrict results to one record type
+    responses:
+      200:
+        description: >
+          Matches ordered by relevance (bm25). When the query matches more rows than
+          SEARCH_RANK_WINDOW, only the newest of them are ranked and the response
+          carries the header X-Search-Truncated: true
+      400:
+        description: Missing or invalid parameters
+      401:
+        description: Login required
+      503:
+        description: Full-text search is not available on this database
+    """
+    if not search.is_available():
+        return jsonify({"message": "Full-text search is not available."}), 503
+
+    text = request.args.get("q", "").strip()
+    if not text:
+        _bad_request("q is required.")
+    limit = _int_arg("limit") or search.DEFAULT_LIMIT
+    if not 1 <= limit <= search.MAX_LIMIT:
+        _bad_request(f"limit must be between 1 and {search.MAX_LIMIT}.")
+    kind = request.args.get("type")
+    if kind is not None and kind not in search.KINDS:
+        _bad_request(f"type must be one of: {', '.join(search.KINDS)}.")
+
+    results, truncated = search.search(text, limit=limit, kind=kind)
+    response = jsonify(results)
+    if truncated:
+        # Nur die neuesten SEARCH_RANK_WINDOW Treffer wurden nach Relevanz sortiert
+        response.headers["X-Search-Truncated"] = "true"
+    return response
+
+
+@api_bp.route("/changes", methods=["GET"])
+@api_login_required
+def api_changes():
+    """
+    Changes feed for incremental sync of customers and leads
+    ---
+    tags:
+      - Sync
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: since
+        type: string
+        description: Resume token from the previous response ("next"); omit or 0 for a full sync
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of changes (1-1000, default 500)
+    responses:
+      200:
+        description: >
+          Inserted/updated rows (op "upsert", with data) and deletions (op "delete")
+          in commit order, the resume token "next" and "has_more"
+      400:
+        description: Invalid token or limit
+      401:
+        description: Login required
+    """
+    since = request.args.get("since") or "0"
+    # Nur ASCII-Ziffern (isdigit() allein lässt z.B. "²" durch), höchstens 64 Bit
+    if not (since.isascii() and since.isdigit()) or int(since) > MAX_CHANGE_SEQ:
+        _bad_request("since must be a token returned by this endpoint.")
+    limit = _int_arg("limit") or DEFAULT_CHANGES_LIMIT
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        _bad_request(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    changes, last_seq, has_more = get_changes(int(since), limit)
+    return serializers.json_response(
+        {"changes": changes, "next": str(last_seq), "has_more": has_more}
+    )
+
+
+@api_bp.route("/jobs", methods=["POST"])
+@api_login_required
+def api_submit_job():
+    """
+    Submit a background job
+    ---
+    tags:
+      - Jobs
+    consumes:
+      - application/json
+      - application/x-ndjson
+      - text/csv
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: type
+        type: string
+        required: true
+        enum: [export, import, rebuild_search_index, rebuild_duplicate_index, migrate]
+        description: >
+          export: full customer/lead export to a file (format csv, ndjson or json; list filters and sort apply).
+          import: bulk import of the request body (admin only).
+          rebuild_search_index: rebuild the full-text index (admin only).
+          rebuild_duplicate_index: rebuild the duplicate-detection keys (admin only).
+          migrate: apply pending schema migrations in small batches, resuming interrupted ones (admin only).
+      - in: query
+        name: model
+        type: string
+        enum: [customers, leads]
+        description: Table to export or import (export/import)
+      - in: query
+        name: format
+        type: string
+        enum: [csv, ndjson, json]
+        description: Export file format (default csv)
+      - in: query
+        name: chunk_size
+        type: integer
+        description: Rows per insert transaction of an import (1-10000, default 1000)
+      - in: body
+        name: body
+        required: false
+        description: Rows to import (same formats as the bulk endpoints)
+    responses:
+      202:
+        description: Job accepted; poll the URL in the Location header
+      400:
+        description: Invalid job type or parameters
+      401:
+        description: Login required
+      403:
+        description: Admin access required for this job type
+      415:
+        description: Unsupported import Content-Type
+      503:
+        description: Too many queued jobs
+    """
+    job_type = request.args.get("type", "")
+    if job_queue.requires_admin(job_type) and not current_user.is_admin():
+        return jsonify({"message": "Admin access required."}), 403
+
+    params = {key: value for key, value in request.args.items() if key != "type"}
+    input_stream = None
+    if job_type == "import":
+        try:
+            check_mimetype(request.mimetype)
+        except UnsupportedFormat as exc:
+            return jsonify({"message": str(exc)}), exc.status_code
+        params["mimetype"] = request.mimetype
+        input_stream = request.stream
+
+    try:
+        job = job_queue.submit(
+            job_type, params, input_stream=input_stream,
+            user_id=current_user.id, tenant_id=current_user.tenant_id,
+        )
+    except JobRejected as exc:
+        return jsonify({"message": str(exc)}), exc.status_code
+
+    response = jsonify(_job_dict(job))
+    response.status_code = 202
+    response.headers["Location"] = url_for("api.api_get_job", job_id=job.id)
+    return response
+
+
+@api_bp.route("/jobs", methods=["GET"])
+@api_login_required
+def api_list_jobs():
+    """
+    List recent background jobs
+    ---
+    tags:
+      - Jobs
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: status
+        type: string
+        enum: [queued, running, succeeded, failed]
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of jobs (1-200, default 50)
+    responses:
+      200:
+        description: Jobs, newest first
+      401:
+        description: Login required
+    """
+    limit = _int_arg("limit") or 50
+    if not 1 <= limit <= 200:
+        _bad_request("limit must be between 1 and 200.")
+    status = request.args.get("status")
+    if status is not None and status not in JOB_STATUSES:
+        _bad_request(f"status must be one of: {', '.join(JOB_STATUSES)}.")
+    return jsonify([_job_dict(job) for job in job_queue.recent(limit, status)])
+
+
+@api_bp.route("/jobs/<job_id>", methods=["GET"])
+@api_login_required
+def api_get_job(job_id):
+    """
+    Status and progress of a background job
+    ---
+    tags:
+      - Jobs
+    produces:
+      - application/json
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Job status, progress, error and result
+      401:
+        description: Login required
+      404:
+        description: Job not found
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"message": "Job not found."}), 404
+    return jsonify(_job_dict(job))
+
+
+@api_bp.route("/jobs/<job_id>/result", methods=["GET"])
+@api_login_required
+def api_get_job_result(job_id):
+    """
+    Download the result file of a finished job
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Result file (e.g. the export)
+      401:
+        description: Login required
+      404:
+        description: Job not found or it has no result file
+      409:
+        description: Job has not finished successfully yet
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"message": "Job not found."}), 404
+    if job.status != "succeeded":
+        return jsonify({"message": f"Job is {job.status}."}), 409
+    if not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({"message": "Job has no result file."}), 404
+    result = json.loads(job.result or "{}")
+    return send_file(
+        job.result_path,
+        mimetype=result.get("mimetype"),
+        as_attachment=True,
+        download_name=result.get("filename"),
     )
 
+
+def _job_dict(job):
+    data = job.to_dict()
+    if data["has_file"]:
+        data["result_url"] = url_for("api.api_get_job_result", job_id=job.id)
+    return data
+
+
+@api_bp.route("/analytics/leads", methods=["GET"])
+@api_login_required
+def api_lead_analytics():
+    """
+    Lead pipeline analytics
+    ---
+    tags:
+      - Stats
+    produces:
+      - application/json
+    parameters:
+      - in: query
+        name: top
+        type: integer
+        description: Number of top companies by pipeline value (1-100, default 10)
+      - in: query
+        name: engine
+        type: string
+        enum: [sql, numpy]
+        description: >
+          Aggregation engine; sql pushes all group-bys down to the database,
+          numpy loads the columns once and aggregates them in memory (default from ANALYTICS_ENGINE)
+    responses:
+      200:
+        description: >
+          Count, value, min, max, average and weighted forecast per status and source,
+          totals, value percentiles and the top companies; cached per leads table version
+      400:
+        description: Invalid parameters
+      401:
+        description: Login required
+      503:
+        description: The requested engine needs a package that is not installed
+    """
+    top_n = _int_arg("top") or DEFAULT_TOP_N
+    if not 1 <= top_n <= MAX_TOP_N:
+        _bad_request(f"top must be between 1 and {MAX_TOP_N}.")
+    engine = request.args.get("engine")
+    if engine is not None and engine not in ENGINES:
+        _bad_request(f"engine must be one of: {', '.join(ENGINES)}.")
+
+    def build():
+        try:
+            return serializers.json_response(lead_analytics.report(top_n, engine))
+        except AnalyticsUnavailable as exc:
+            return jsonify({"message": str(exc)}), 503
+
+    return conditional_response((Lead.__tablename__,), build)
+
+
+@api_bp.route("/stats", methods=["GET"])
+@api_login_required
+def api_stats():
+    """
+    Dashboard statistics
+    ---
+    tags:
+      - Stats
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Customer counts per status, lead count and pipeline value per status and source
+      401:
+        description: Login required
+    """
+    return jsonify(dashboard_stats.get())
+
+
+@api_bp.route("/cache-stats", methods=["GET"])
+def api_cache_stats():
+    """
+    Cache statistics for monitoring
+    ---
+    tags:
+      - Monitoring
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Hit/miss counters and sizes of the in-process caches
+    """
+    return jsonify({
+        "user_cache": user_cache.stats(),
+        "http_body_cache": body_cache.stats(),
+        "lead_analytics": lead_analytics.stats(),
+        "duplicate_detector": duplicate_detector.stats(),
+    })
@@ -0,0 +1,134 @@
+"""
+Swagger-UI und OpenAPI-Spezifikation (flasgger), erst beim ersten Aufruf geladen.
+
+flasgger (samt YAML-/Schema-Abhängigkeiten) kostet beim Import spürbar Zeit
+und wird nur für /apidocs gebraucht. Statt Swagger(app) beim Start zu
+initialisieren, leitet eine WSGI-Middleware die Doku-Pfade an eine eigene
+kleine Flask-App weiter, die beim ersten Aufruf gebaut wird.
+
+Die Spezifikation entsteht aus den Docstrings der Views der Haupt-App und
+wird als JSON in APISPEC_CACHE_FILE (Standard: instance/apispec.json)
+abgelegt. Der Schlüssel ist ein Hash über Routen und Docstrings – nach
+Code-Änderungen wird neu erzeugt, sonst nur die Datei gelesen.
+`flask --app app apispec` erzeugt die Datei vorab (z.B. beim Deployment).
+
+Die Doku-Requests laufen an den Hooks der Haupt-App vorbei (kein
+Rate-Limit, keine Metriken).
+"""
+import hashlib
+import json
+import os
+import threading
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+# Pfade, die flasgger bedient (UI, Spezifikation, statische Dateien der UI)
+DOCS_PATHS = ("/apidocs", "/apispec_1.json", "/flasgger_static")
+
+
+def _spec_key(app):
+    """Hash über alle Routen und Docstrings (ändert sich mit jeder API-Änderung)."""
+    digest = hashlib.sha1()
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: (rule.rule, rule.endpoint)):
+        view = app.view_functions.get(rule.endpoint)
+        methods = ",".join(sorted(rule.methods or ()))
+        digest.update(f"{rule.rule}|{rule.endpoint}|{methods}|{getattr(view, '__doc__', '')}\n".encode())
+    return digest.hexdigest()
+
+
+def _cache_file(app):
+    path = app.config.get("APISPEC_CACHE_FILE")
+    if path is None:
+        path = os.path.join(app.instance_path, "apispec.json")
+    return path
+
+
+def build_spec(app):
+    """Spezifikation aus den Docstrings der App erzeugen (importiert flasgger)."""
+    from flasgger import Swagger
+
+    # Ohne init_app: keine Routen in der Haupt-App, nur die Spezifikations-Erzeugung
+    swagger = Swagger()
+    swagger.app = app
+    swagger.load_config(app)
+    with app.app_context():
+        return json.loads(json.dumps(swagger.get_apispecs()))
+
+
+def load_spec(app):
+    """Spezifikation aus der Cache-Datei, bei fehlendem/veraltetem Schlüssel neu erzeugen."""
+    key = _spec_key(app)
+    path = _cache_file(app)
+    if path:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                cached = json.load(fh)
+            if cached.get("key") == key:
+                return cached["spec"]
+        except (OSError, ValueError, KeyError):
+            pass
+    spec = build_spec(app)
+    if path:
+        write_spec(path, key, spec)
+    return spec
+
+
+def write_spec(path, key, spec):
+    """Cache-Datei atomar schreiben (parallele Worker lesen nie eine halbe Datei)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"key": key, "spec": spec}, fh)
+    os.replace(tmp_path, path)
+
+
+class LazyApiDocs:
+    """WSGI-Middleware: Doku-Pfade an die beim ersten Aufruf gebaute Doku-App."""
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._docs_app = None
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(DOCS_PATHS):
+            return self.docs_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def docs_app(self):
+        if self._docs_app is None:
+            with self._lock:
+                if self._docs_app is None:
+                    self._docs_app = self._build()
+        return self._docs_app
+
+    def _build(self):
+        from flasgger import Swagger
+
+        docs = Flask(__name__)
+        docs.config["SWAGGER"] = self.app.config.get("SWAGGER", {})
+        # Pfade stehen bereits in der Spezifikation; die Doku-App selbst hat keine API-Routen
+        Swagger(docs, template=load_spec(self.app))
+        return docs
+
+
+def init_apidocs(app):
+    """Doku-Middleware vor die App schalten und den CLI-Befehl `apispec` registrieren."""
+    app.wsgi_app = LazyApiDocs(app)
+    app.cli.add_command(apispec_command)
+
+
+@click.command("apispec")
+@with_appcontext
+def apispec_command():
+    """Build the OpenAPI spec and write it to APISPEC_CACHE_FILE."""
+    app = current_app._get_current_object()
+    path = _cache_file(app)
+    if not path:
+        raise click.ClickException("APISPEC_CACHE_FILE is disabled.")
+    spec = build_spec(app)
+    write_spec(path, _spec_key(app), spec)
+    click.echo(f"Wrote {len(spec.get('paths', {}))} API paths to {path}.")
@@ -1,89 +1,381 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+import os
+
+import click
+from flask import Flask, current_app, render_template, request, redirect, url_for, flash
+from flask.cli import with_appcontext
 from flask_login import login_required, current_user
-from flask_session import Session
-from models import db, Customer, Lead
+from models import db, Customer, InvalidCursor, Lead, parse_list_args
 
 from auth import auth_bp, login_manager, admin_required
 from api import api_bp
+from analytics import lead_analytics
+from apidocs import init_apidocs
 from database import init_db
-from flasgger import Swagger
-
-# Haupt-Flask-App erstellen
-app = Flask(__name__)
-# Secret-Key für Sessions und CSRF-Schutz
-app.secret_key = "your-secret-key-change-this"
-
-# -----------------------
-# SQLAlchemy-Konfiguration
-# -----------------------
-# Verbindung zur SQLite-Datenbank, die von SQLAlchemy verwendet wird
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///crm.db"
-# Optionales Event-System von SQLAlchemy deaktivieren (etwas effizienter)
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# -----------------------
-# Session-Konfiguration
-# -----------------------
-# Sessiondaten in der Datenbank speichern (nicht im Browser-Cookie)
-app.config["SESSION_TYPE"] = "sqlalchemy"
-app.config["SESSION_SQLALCHEMY"] = db
-app.config["SESSION_SQLALCHEMY_TABLE"] = "sessions"
-app.config["SESSION_PERMANENT"] = True
-
-# SQLAlchemy mit dieser Flask-App verbinden
-db.init_app(app)
-# Flask-Session mit SQLAlchemy-Backend initialisieren
-Session(app)
-
-# LoginManager mit der App verbinden, damit current_user & Login funktioniert
-login_manager.init_app(app)
-login_manager.login_view = "auth.login"
-login_manager.login_message = "Please log in to access this page."
-
-# -----------------------
-# Blueprints & Swagger
-# -----------------------
-# Authentifizierungs-Blueprint und API-Blueprint registrieren
-app.register_blueprint(auth_bp)
-app.register_blueprint(api_bp)
-
-# Flasgger initialisieren → generiert OpenAPI/Swagger-Doku und /apidocs UI
-swagger = Swagger(app)
-
-# Datenbanktabellen erzeugen und Beispieldaten einfügen (falls noch leer)
-init_db(app)
+from dedup import duplicate_detector
+from db_config import init_database
+from http_cache import body_cache, conditional_response
+from instrumentation import instrumentation
+from jobs import job_queue
+from migrations import echo_progress, migrator
+from passwords import password_hasher
+from session_store import init_session
+from stats import dashboard_stats
+from templating import fragment_cache
+from tenancy import tenant_router
+from user_cache import user_cache
+
+# HTML-Views werden beim Import nur vorgemerkt und in create_app registriert
+# (ohne Blueprint, damit die Endpoint-Namen wie url_for('customers') bleiben)
+_views = []
+
+
+def route(rule, **options):
+    """Wie @app.route, aber für die App aus create_app."""
+    def decorator(view):
+        _views.append((rule, view, options))
+        return view
+    return decorator
+
+
+def create_app(config=None):
+    """
+    App-Factory: Konfiguration, Erweiterungen, Blueprints und Views.
+    `config` überschreibt einzelne Einstellungen (z.B. in Benchmarks).
+    Greift nicht auf die Datenbank zu – Schema und Beispieldaten legt
+    `flask --app app init-db` an; die API-Doku lädt erst der erste Aufruf
+    von /apidocs (siehe apidocs.py).
+    """
+    # Haupt-Flask-App erstellen
+    app = Flask(__name__)
+    # Secret-Key für Sessions und CSRF-Schutz
+    app.secret_key = "your-secret-key-change-this"
+
+    # -----------------------
+    # SQLAlchemy-Konfiguration
+    # -----------------------
+    # Datenbank-URI, Connection-Pool und SQLite-PRAGMAs setzt db_config
+    # (URI überschreibbar per Umgebungsvariable CRM_DATABASE_URL / DATABASE_URL)
+
+    # -----------------------
+    # Session-Konfiguration
+    # -----------------------
+    # Backend wählen: "cached" (LRU + Write-Behind in die Tabelle 'sessions'),
+    # "cookie" (signiertes Cookie) oder "filesystem" – siehe session_store.py
+    app.config["SESSION_BACKEND"] = os.environ.get("CRM_SESSION_BACKEND", "cached")
+    app.config["SESSION_PERMANENT"] = True
+
+    # -----------------------
+    # Dashboard-Kennzahlen
+    # -----------------------
+    # Sekunden, bis die gecachten Kennzahlen aus der Datenbank neu berechnet werden
+    app.config["STATS_CACHE_TTL"] = 60
+
+    # -----------------------
+    # Passwort-Hashing
+    # -----------------------
+    # Verfahren + Kosten im Werkzeug-Format, z.B. "scrypt" oder "pbkdf2:sha256:600000".
+    # Bestehende Hashes mit anderen Parametern werden beim nächsten Login erneuert.
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("CRM_PASSWORD_HASH_METHOD", "scrypt")
+    # Threads für Hashing/Prüfung; weitere Logins warten bis zum Limit, dann 503
+    app.config["PASSWORD_HASH_WORKERS"] = 2
+    app.config["PASSWORD_HASH_QUEUE_LIMIT"] = 16
+
+    # -----------------------
+    # Instrumentierung
+    # -----------------------
+    # SQL-Abfragen ab dieser Dauer (ms) mit EXPLAIN-Plan ins Slow-Query-Log schreiben
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = int(os.environ.get("CRM_SLOW_QUERY_MS", "100"))
+    app.config["SERVER_TIMING_HEADER"] = True
+
+    # -----------------------
+    # HTTP-Caching
+    # -----------------------
+    # Anzahl serialisierter JSON-Listen im Speicher (0 = aus); Schlüssel ist der ETag
+    app.config["HTTP_BODY_CACHE_SIZE"] = 64
+
+    # -----------------------
+    # Listenseiten & Templates
+    # -----------------------
+    # Zeilen pro Seite in den HTML-Listen (?limit=... bis LIST_MAX_PAGE_SIZE)
+    app.config["LIST_PAGE_SIZE"] = 50
+    app.config["LIST_MAX_PAGE_SIZE"] = 500
+    # Gerenderte Tabellenkörper im Speicher (Schlüssel: Tabellenversion, Rolle, Seite)
+    app.config["FRAGMENT_CACHE_SIZE"] = 256
+    # Verzeichnis für kompilierte Templates (None = instance/jinja-cache, "" = aus)
+    app.config["JINJA_BYTECODE_CACHE_DIR"] = os.environ.get("CRM_JINJA_CACHE_DIR")
+
+    # -----------------------
+    # Volltextsuche
+    # -----------------------
+    # Nur die neuesten so vielen Treffer nach Relevanz sortieren (0 = alle);
+    # abgeschnittene Suchen melden den Header X-Search-Truncated
+    app.config["SEARCH_RANK_WINDOW"] = 1000
+
+    # -----------------------
+    # Lead-Auswertungen
+    # -----------------------
+    # "sql" (Gruppierung in der Datenbank) oder "numpy" (Spalten-Arrays im Speicher)
+    app.config["ANALYTICS_ENGINE"] = os.environ.get("CRM_ANALYTICS_ENGINE", "sql")
+    # Abschlusswahrscheinlichkeit je Lead-Status für die gewichtete Prognose
+    app.config["LEAD_STAGE_WEIGHTS"] = {
+        "new": 0.1,
+        "contacted": 0.2,
+        "qualified": 0.4,
+        "proposal": 0.6,
+        "negotiation": 0.8,
+        "won": 1.0,
+        "lost": 0.0,
+    }
+    # Gewicht für Status, die oben nicht vorkommen
+    app.config["LEAD_DEFAULT_STAGE_WEIGHT"] = 0.1
+    # Anzahl gecachter Berichte (pro Tabellenversion und Parametern)
+    app.config["ANALYTICS_CACHE_SIZE"] = 16
+
+    # -----------------------
+    # Dublettenprüfung
+    # -----------------------
+    # Beim Anlegen von Kunden: "off", "warn" (anlegen + Hinweis) oder "reject"
+    app.config["CUSTOMER_DUPLICATE_POLICY"] = os.environ.get("CRM_DUPLICATE_POLICY", "warn")
+    # Mindestähnlichkeit der Namen (0–1) bei gleicher Firma; gleiche E-Mail zählt immer
+    app.config["CUSTOMER_DUPLICATE_THRESHOLD"] = 0.7
+
+    # -----------------------
+    # Hintergrund-Jobs
+    # -----------------------
+    # Threads pro Prozess für Exporte, Importe und Index-Neuaufbau (0 = keine Worker)
+    app.config["JOB_WORKERS"] = int(os.environ.get("CRM_JOB_WORKERS", "2"))
+    # Exportdateien werden nach dieser Zeit (Sekunden) gelöscht
+    app.config["JOB_RESULT_TTL"] = 24 * 3600
+
+    # -----------------------
+    # Rate-Limits & Lastbegrenzung
+    # -----------------------
+    # "memory" (pro Prozess), "sqlite" (Datei für alle Worker-Prozesse) oder "off"
+    app.config["RATE_LIMIT_BACKEND"] = os.environ.get("CRM_RATE_LIMIT_BACKEND", "memory")
+    # Datei des sqlite-Backends (Standard: instance/ratelimit.db)
+    app.config["RATE_LIMIT_DB"] = os.environ.get("CRM_RATE_LIMIT_DB")
+    # Endpoint oder Blueprint → (Requests pro Sekunde, Burst[, Methoden]); Bucket je Client und Endpoint
+    app.config["RATE_LIMITS"] = {
+        "api": (20, 40),
+        # Login: 5 Versuche am Stück, danach einer alle 10 Sekunden
+        "auth.login": (0.1, 5, ("POST",)),
+        "auth.register": (0.02, 3, ("POST",)),
+    }
+    # Gleichzeitige Requests pro Prozess (0 = unbegrenzt); darüber Warteschlange, dann 503
+    app.config["MAX_CONCURRENT_REQUESTS"] = int(os.environ.get("CRM_MAX_CONCURRENT_REQUESTS", "16"))
+    app.config["REQUEST_QUEUE_LIMIT"] = 32
+    # Sekunden, die ein Request höchstens auf einen freien Platz wartet
+    app.config["REQUEST_QUEUE_TIMEOUT"] = 2.0
+
+    # -----------------------
+    # Read-Replica
+    # -----------------------
+    # Lesende Requests (GET/HEAD) gegen "snapshot" (Kopie der SQLite-Datei,
+    # alle READ_REPLICA_REFRESH Sekunden erneuert), eine Replica-URI oder "off"
+    app.config["READ_REPLICA"] = os.environ.get("CRM_READ_REPLICA", "off")
+    app.config["READ_REPLICA_REFRESH"] = float(os.environ.get("CRM_READ_REPLICA_REFRESH", "5"))
+    # Nur für eine Replica-URI: maximale Verzögerung gegenüber der primären Datenbank (Sekunden)
+    app.config["READ_REPLICA_MAX_LAG"] = 1.0
+
+    # -----------------------
+    # Mandanten (Teams)
+    # -----------------------
+    # Kunden/Leads gehören dem Mandanten ihres Benutzers (siehe tenancy.py):
+    # "shared" (eine Datenbank, Filter auf tenant_id) oder "files" (eine
+    # SQLite-Datei pro Mandant, nicht zusammen mit READ_REPLICA)
+    app.config["TENANT_STORAGE"] = os.environ.get("CRM_TENANT_STORAGE", "shared")
+    # Ordner der Mandanten-Dateien (Standard: instance/tenants)
+    app.config["TENANT_DIR"] = os.environ.get("CRM_TENANT_DIR")
+    # Höchstens so viele Mandanten-Engines (je ein Connection-Pool) gleichzeitig offen
+    app.config["TENANT_ENGINE_CACHE_SIZE"] = 32
+
+    # -----------------------
+    # Schema-Migrationen
+    # -----------------------
+    # Zeilen pro Backfill-Transaktion und Pause danach (Sekunden), damit die
+    # App während `flask --app app migrate` weiter schreiben kann
+    app.config["MIGRATION_BATCH_SIZE"] = 1000
+    app.config["MIGRATION_BATCH_PAUSE"] = 0.02
+
+    # -----------------------
+    # Aktivitätsprotokoll
+    # -----------------------
+    # Änderungen an Kunden/Leads mit Benutzer und Feld-Diff protokollieren (siehe activity.py)
+    app.config["ACTIVITY_LOG"] = True
+    # Gepufferte Einträge werden spätestens nach dieser Zeit (s) bzw. ab
+    # BATCH_SIZE Einträgen gemeinsam geschrieben (0 = sofort, eigene Transaktion)
+    app.config["ACTIVITY_LOG_FLUSH_INTERVAL"] = 0.5
+    app.config["ACTIVITY_LOG_BATCH_SIZE"] = 500
+    # Monats-Partitionen, die komplett älter sind, werden gelöscht (0 = nie)
+    app.config["ACTIVITY_LOG_RETENTION_DAYS"] = int(os.environ.get("CRM_ACTIVITY_RETENTION_DAYS", "365"))
+    # Einträge in der Zeitleiste auf der Kundenseite
+    app.config["ACTIVITY_TIMELINE_LIMIT"] = 20
+
+    # Einstellungen des Aufrufers haben Vorrang
+    app.config.update(config or {})
+
+    # SQLAlchemy mit dieser Flask-App verbinden (inkl. Pool und SQLite-Tuning)
+    init_database(app)
+    # Request-/SQL-/Template-Metriken, Slow-Query-Log und /metrics
+    instrumentation.init_app(app)
+    # Optionale Teilsysteme werden nur importiert, wenn die Konfiguration
+    # sie einschaltet (ausgeschaltet registrieren sie weder Hooks noch Listener)
+    if app.config["RATE_LIMIT_BACKEND"] != "off" or app.config["MAX_CONCURRENT_REQUESTS"]:
+        from ratelimit import concurrency_limiter, rate_limiter
+
+        # Rate-Limits vor der Lastbegrenzung: gedrosselte Clients belegen keinen Platz
+        rate_limiter.init_app(app)
+        instrumentation.register_collector("rate_limiter", rate_limiter.stats)
+        concurrency_limiter.init_app(app)
+        instrumentation.register_collector("admission", concurrency_limiter.stats)
+    # Session-Backend registrieren
+    init_session(app)
+    if (app.config["READ_REPLICA"] or "off") != "off":
+        from replicas import read_router
+
+        # Lesende Requests auf die Read-Replica (braucht die Session für read-your-writes)
+        read_router.init_app(app)
+        instrumentation.register_collector("read_replica", read_router.stats)
+    # Mandant des Benutzers für Filter und Datenbank des Requests
+    tenant_router.init_app(app)
+    instrumentation.register_collector("tenants", tenant_router.stats)
+    # Kennzahlen-Cache konfigurieren
+    dashboard_stats.init_app(app)
+    # Passwort-Hashing (Verfahren, Thread-Pool, Warteschlange)
+    password_hasher.init_app(app)
+    # Job-Warteschlange (Worker starten beim ersten Request des Prozesses)
+    job_queue.init_app(app)
+    # Schema-Migrationen (flask --app app migrate, Job-Typ "migrate")
+    migrator.init_app(app)
+
+    # LoginManager mit der App verbinden, damit current_user & Login funktioniert
+    login_manager.init_app(app)
+    login_manager.login_view = "auth.login"
+    login_manager.login_message = "Please log in to access this page."
+    # Cache für den user_loader (spart die User-Abfrage bei jedem Request)
+    user_cache.init_app(app)
+    instrumentation.register_collector("user_cache", user_cache.stats)
+    # Cache für serialisierte API-Listen (Schlüssel: ETag aus der Tabellenversion)
+    body_cache.init_app(app)
+    instrumentation.register_collector("http_body_cache", body_cache.stats)
+    # Fragment-Cache für Listenseiten und Jinja-Bytecode-Cache
+    fragment_cache.init_app(app)
+    instrumentation.register_collector("fragment_cache", fragment_cache.stats)
+    # Pipeline-Auswertungen (Cache pro Version der Lead-Tabelle)
+    lead_analytics.init_app(app)
+    instrumentation.register_collector("lead_analytics", lead_analytics.stats)
+    # Dublettenprüfung für neue Kunden
+    duplicate_detector.init_app(app)
+    instrumentation.register_collector("duplicate_detector", duplicate_detector.stats)
+    if app.config["ACTIVITY_LOG"]:
+        from activity import activity_log
+
+        # Aktivitätsprotokoll (Group Commit im Hintergrund, flask --app app prune-activity)
+        activity_log.init_app(app)
+        instrumentation.register_collector("activity_log", activity_log.stats)
+
+    # -----------------------
+    # Blueprints, Views & API-Doku
+    # -----------------------
+    # Authentifizierungs-Blueprint und API-Blueprint registrieren
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(api_bp)
+    for rule, view, options in _views:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.register_error_handler(404, page_not_found)
+    app.register_error_handler(500, internal_error)
+
+    # Swagger-UI unter /apidocs, flasgger wird erst beim ersten Aufruf geladen
+    init_apidocs(app)
+    # Schema und Beispieldaten: flask --app app init-db
+    app.cli.add_command(init_db_command)
+    return app
 
 
 # -----------------------
 # Dashboard
 # -----------------------
-@app.route('/')
+@route('/')
 def index():
     if not current_user.is_authenticated:
         return redirect(url_for('auth.login'))
 
-    total_customers = Customer.query.count()
-    total_leads = Lead.query.count()
+    # Kennzahlen kommen aus dem Cache statt aus count(*)-Abfragen
+    stats = dashboard_stats.get()
     return render_template(
         'index.html',
-        total_customers=total_customers,
-        total_leads=total_leads
+        total_customers=stats['customers']['total'],
+        total_leads=stats['leads']['total'],
+        stats=stats
+    )
+
+
+# -----------------------
+# Listenseiten (gemeinsame Logik)
+# -----------------------
+def _list_page(template, rows_template, model, get_rows):
+    """
+    Listenseite mit Keyset-Pagination (?after=<id>&limit=...):
+    - Filter/Suche/Sortierung aus der Query wie bei der API
+    - der Tabellenkörper wird als Fragment gecacht; Schlüssel sind
+      Tabellenversion, Rolle und Seite (siehe templating.py)
+    - ETag/304 über conditional_response
+    """
+    return conditional_response(
+        (model.__tablename__,),
+        lambda: _render_list_page(template, rows_template, model, get_rows),
+        per_user=True,
+    )
+
+
+def _render_list_page(template, rows_template, model, get_rows):
+    # Filter/Suche/Sortierung aus der Query (?status=...&company=...&q=...&sort=...)
+    try:
+        filters, sort = parse_list_args(model, request.args)
+    except ValueError as exc:
+        flash(str(exc), 'error')
+        filters, sort = {}, None
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int) or current_app.config['LIST_PAGE_SIZE']
+    limit = max(1, min(limit, current_app.config['LIST_MAX_PAGE_SIZE']))
+    # Nur einmal pro Seite statt pro Zeile auswerten
+    is_admin = current_user.is_admin()
+
+    def render_rows():
+        rows = get_rows(after=after, limit=limit, filters=filters, sort=sort)
+        # Nur wenn die Seite voll ist, kann es weitere Zeilen geben
+        next_after = rows[-1].id if len(rows) == limit else None
+        return render_template(rows_template, rows=rows, is_admin=is_admin), next_after
+
+    key = (rows_template, is_admin, tuple(sorted(filters.items())), sort, after, limit)
+    page_args = {name: value for name, value in request.args.items() if name != 'after'}
+    try:
+        rows_html, next_after = fragment_cache.render(key, (model.__tablename__,), render_rows)
+    except InvalidCursor as exc:
+        # Cursor-Zeile inzwischen gelöscht → wieder bei der ersten Seite beginnen
+        flash(str(exc), 'error')
+        return redirect(url_for(request.endpoint, **page_args))
+    return render_template(
+        template,
+        rows_html=rows_html,
+        next_after=next_after,
+        paged=after is not None,
+        page_args=page_args,
+        filters=filters,
+        sort=sort or 'id'
     )
 
 
 # -----------------------
 # Customers (HTML Views)
 # -----------------------
-@app.route('/customers')
+@route('/customers')
 @login_required  # nur eingeloggte Nutzer dürfen die Kundenliste sehen
 def customers():
-    return render_template(
-        'customers.html',
-        customers=Customer.get_all_customers()
-    )
+    return _list_page('customers.html', '_customer_rows.html', Customer, Customer.get_customer_rows)
 
 
-@app.route('/customers/add', methods=['GET', 'POST'])
+@route('/customers/add', methods=['GET', 'POST'])
 @login_required  # Login erforderlich
 @admin_required  # zusätzlich Admin-Rolle erforderlich
 def add_customer():
@@ -98,25 +390,57 @@ def add_customer():
             flash('All fields are required!', 'error')
             return redirect(url_for('add_customer'))
 
+        # Mögliche Dubletten: je nach Einstellung nur Hinweis oder Formular erneut zeigen
+        duplicates = []
+        if duplicate_detector.policy != 'off':
+            duplicates = duplicate_detector.find_duplicates(name, email, company)
+        if duplicates and duplicate_detector.policy == 'reject' and not request.form.get('force'):
+            flash('Possible duplicate customer found. Check the list below or add anyway.', 'error')
+            return render_template('add_customer.html', form=request.form, duplicates=duplicates)
+
         Customer.add_customer(name, email, company, phone, status)
         flash(f'Customer {name} added successfully!', 'success')
+        for duplicate in duplicates:
+            flash(
+                f"Possible duplicate of {duplicate['name']} ({duplicate['email']}, "
+                f"{duplicate['company']}) – customer #{duplicate['id']}.",
+                'warning'
+            )
         return redirect(url_for('customers'))
 
-    return render_template('add_customer.html')
+    return render_template('add_customer.html', form={}, duplicates=[])
 
 
-@app.route('/customers/<int:customer_id>')
+@route('/customers/<int:customer_id>')
 @login_required  # Detailseite nur für eingeloggte Nutzer
 def customer_detail(customer_id):
+    if current_app.config['ACTIVITY_LOG']:
+        # Die Zeitleiste kommt gepuffert und von anderen Prozessen verzögert
+        # in die Datenbank – die Version der Kundentabelle deckt sie nicht ab
+        return _render_customer_detail(customer_id)
+    # ETag aus der Tabellenversion: unverändert → 304, ohne den Kunden zu laden
+    return conditional_response(
+        (Customer.__tablename__,), lambda: _render_customer_detail(customer_id), per_user=True
+    )
+
+
+def _render_customer_detail(customer_id):
     customer = Customer.get_customer_by_id(customer_id)
     if not customer:
         flash('Customer not found!', 'error')
         return redirect(url_for('customers'))
 
-    return render_template('customer_detail.html', customer=customer)
+    activity = []
+    if current_app.config['ACTIVITY_LOG']:
+        from activity import activity_log
+
+        activity = activity_log.history(
+            'customer', customer_id, limit=current_app.config['ACTIVITY_TIMELINE_LIMIT']
+        )
+    return render_template('customer_detail.html', customer=customer, activity=activity)
 
 
-@app.route('/customers/<int:customer_id>/edit', methods=['GET', 'POST'])
+@route('/customers/<int:customer_id>/edit', methods=['GET', 'POST'])
 @login_required  # Login erforderlich
 @admin_required  # nur Admins dürfen Kundendaten ändern
 def edit_customer(customer_id):
@@ -140,7 +464,7 @@ def edit_customer(customer_id):
     return render_template('edit_customer.html', customer=customer)
 
 
-@app.route('/customers/<int:customer_id>/delete', methods=['POST'])
+@route('/customers/<int:customer_id>/delete', methods=['POST'])
 @login_required  # Login erforderlich
 @admin_required  # nur Admins dürfen Kunden löschen
 def delete_customer(customer_id):
@@ -152,16 +476,13 @@ def delete_customer(customer_id):
 # -----------------------
 # Leads (HTML Views)
 # -----------------------
-@app.route('/leads')
+@route('/leads')
 @login_required  # Lead-Liste nur für eingeloggte Nutzer
 def leads():
-    return render_template(
-        'leads.html',
-        leads=Lead.get_all_leads()
-    )
+    return _list_page('leads.html', '_lead_rows.html', Lead, Lead.get_lead_rows)
 
 
-@app.route('/leads/add', methods=['GET', 'POST'])
+@route('/leads/add', methods=['GET', 'POST'])
 @login_required  # Login erforderlich
 @admin_required  # nur Admins dürfen neue Leads anlegen
 def add_lead():
@@ -187,9 +508,16 @@ def add_lead():
     return render_template('add_lead.html')
 
 
-@app.route('/leads/<int:lead_id>')
+@route('/leads/<int:lead_id>')
 @login_required  # Detailansicht nur mit Login
 def lead_detail(lead_id):
+    # ETag aus der Tabellenversion: unverändert → 304, ohne den Lead zu laden
+    return conditional_response(
+        (Lead.__tablename__,), lambda: _render_lead_detail(lead_id), per_user=True
+    )
+
+
+def _render_lead_detail(lead_id):
     lead = Lead.get_lead_by_id(lead_id)
     if not lead:
         flash('Lead not found!', 'error')
@@ -198,7 +526,20 @@ def lead_detail(lead_id):
     return render_template('lead_detail.html', lead=lead)
 
 
-@app.route('/leads/<int:lead_id>/delete', methods=['POST'])
+@route('/leads/<int:lead_id>/convert', methods=['POST'])
+@login_required  # Login erforderlich
+@admin_required  # nur Admins dürfen Leads umwandeln
+def convert_lead(lead_id):
+    customer = Lead.convert_lead(lead_id)
+    if customer is None:
+        flash('Lead not found or already converted!', 'error')
+        return redirect(url_for('lead_detail', lead_id=lead_id))
+
+    flash(f'Lead converted to customer {customer.name}!', 'success')
+    return redirect(url_for('customer_detail', customer_id=customer.id))
+
+
+@route('/leads/<int:lead_id>/delete', methods=['POST'])
 @login_required  # Login erforderlich
 @admin_required  # nur Admins dürfen Leads löschen
 def delete_lead(lead_id):
@@ -210,15 +551,27 @@ def delete_lead(lead_id):
 # -----------------------
 # Error Handlers
 # -----------------------
-@app.errorhandler(404)
 def page_not_found(error):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
 def internal_error(error):
     return render_template('500.html'), 500
 
 
+# -----------------------
+# CLI
+# -----------------------
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Apply pending migrations; seed demo users and sample data."""
+    init_db(current_app._get_current_object(), progress=echo_progress)
+    click.echo('Database initialized.')
+
+
 if __name__ == '__main__':
+    app = create_app()
+    # Entwicklungsstart: Datenbank wie mit `flask --app app init-db` vorbereiten
+    init_db(app)
     app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
@@ -9,10 +9,15 @@ from flask_login import (
     current_user,
 )
 from models import db, User, ROLE_ADMIN, ROLE_USER
+from passwords import HashingBusy
+from user_cache import user_cache
 
 # Blueprint bündelt alle Authentifizierungs-Routen unter dem Präfix 'auth'
 auth_bp = Blueprint("auth", __name__)
 
+# Antwort, wenn der Passwort-Hashing-Pool ausgelastet ist (HTTP 503)
+HASHING_BUSY_MESSAGE = "The server is busy, please try again in a moment."
+
 # Zentrale Login-Verwaltung für Flask-Login (Session-Handling, current_user, etc.)
 login_manager = LoginManager()
 
@@ -21,10 +26,14 @@ login_manager = LoginManager()
 def load_user(user_id):
     """
     Callback für Flask-Login:
-    Lädt einen User anhand seiner ID aus der Datenbank.
+    Lädt einen User anhand seiner ID – zuerst aus dem User-Cache, nur bei
+    einem Fehlschlag aus der Datenbank.
     Wird intern verwendet, um 'current_user' aus der Session wiederherzustellen.
     """
-    return User.query.get(int(user_id))
+    try:
+        return user_cache.get(int(user_id))
+    except ValueError:
+        return None
 
 
 def admin_required(f):
@@ -52,7 +61,11 @@ def guest_login():
     guest = User.get_by_username("guest")
     if guest is None:
         guest = User(username="guest", email="guest@crm.local", role=ROLE_USER)
-        guest.set_password("guest")
+        try:
+            guest.set_password("guest")
+        except HashingBusy:
+            flash(HASHING_BUSY_MESSAGE, "error")
+            return render_template("login.html"), 503
         db.session.add(guest)
         db.session.commit()
 
@@ -73,7 +86,16 @@ def login():
         password = request.form.get("password", "")
         # User über das User-Modell + SQLAlchemy aus der DB laden
         user = User.get_by_username(username)
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+            # Veraltete Hash-Parameter beim Login auf das aktuelle Verfahren heben
+            if valid and user.rehash_password_if_needed(password):
+                db.session.commit()
+        except HashingBusy:
+            # Hashing-Pool voll: lieber sofort ablehnen als Worker blockieren
+            flash(HASHING_BUSY_MESSAGE, "error")
+            return render_template("login.html"), 503
+        if valid:
             # Validierung erfolgreich: Login-Session anlegen
             login_user(user)
             flash(f"Welcome back, {user.username}!", "success")
@@ -121,7 +143,11 @@ def register():
 
         role = ROLE_ADMIN if request.form.get("register_as_admin") else ROLE_USER
         user = User(username=username, email=email, role=role)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            flash(HASHING_BUSY_MESSAGE, "error")
+            return render_template("register.html"), 503
         db.session.add(user)
         db.session.commit()
         login_user(user)
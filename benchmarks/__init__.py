@@ -0,0 +1 @@
+"""Benchmarks für das CRM (Aufruf aus dem Projektverzeichnis mit `python -m benchmarks.<name>`)."""
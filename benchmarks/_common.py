@@ -0,0 +1,109 @@
+"""Gemeinsame Hilfsfunktionen für die Benchmarks."""
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+
+from db_config import init_database
+from models import db
+
+
+def make_app(db_path=None, sqlite_pragmas=None):
+    """
+    Schlanke Flask-App mit eigener SQLite-Datei erzeugen.
+    So laufen Benchmarks nie gegen die echte crm.db.
+    sqlite_pragmas: eigene PRAGMAs ({} = SQLite-Standardeinstellungen),
+    None = Produktionseinstellungen aus db_config.
+    """
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix="crm-bench-", suffix=".db")
+        os.close(fd)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    if sqlite_pragmas is not None:
+        app.config["SQLITE_PRAGMAS"] = sqlite_pragmas
+    init_database(app)
+    with app.app_context():
+        db.create_all()
+    app.config["BENCH_DB_PATH"] = db_path
+    return app
+
+
+def crm_app(db_path=None):
+    """
+    Die echte CRM-App (create_app aus app.py) mit eigener SQLite-Datei,
+    Tabellen und Beispieldaten. Die Datenbank-URL wird per
+    Umgebungsvariable gesetzt; wegen der prozessweiten Erweiterungen
+    (Caches, Job-Queue) nur einmal pro Prozess aufrufbar.
+    """
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix="crm-bench-", suffix=".db")
+        os.close(fd)
+    os.environ["CRM_DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Alle Requests kommen von einer IP → Rate-Limits würden die Messung drosseln
+    os.environ.setdefault("CRM_RATE_LIMIT_BACKEND", "off")
+    # Bulk-Inserts beim Befüllen würden sonst das Slow-Query-Log fluten
+    logging.getLogger("crm.slow_query").setLevel(logging.ERROR)
+    from app import create_app
+    from database import init_db
+
+    app = create_app()
+    init_db(app)
+    app.config["BENCH_DB_PATH"] = db_path
+    return app
+
+
+def remove_db(app):
+    """SQLite-Datei des Benchmarks samt WAL-/SHM-Dateien löschen."""
+    with app.app_context():
+        db.engine.dispose()
+    path = app.config["BENCH_DB_PATH"]
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def reset_tables(app, *models):
+    """Alle Zeilen der angegebenen Modelle löschen."""
+    with app.app_context():
+        for model in models:
+            db.session.execute(db.delete(model))
+        db.session.commit()
+
+
+@contextmanager
+def timed(results, label):
+    """Laufzeit eines Blocks in Sekunden unter `label` in `results` ablegen."""
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
+
+
+def print_table(rows, headers):
+    """Einfache Texttabelle ausgeben."""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+def percentile(values, pct):
+    """Perzentil (0–1) nach der Nearest-Rank-Methode; nan bei leerer Liste."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def peak_rss_mb():
+    """Höchster Speicherverbrauch (RSS) dieses Prozesses bisher, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet KiB, macOS Bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,148 @@
+"""
+Aktivitätsprotokoll (activity.py): Kosten pro Schreibzugriff, Zeitleiste, Retention.
+
+1. Latenz von Customer.update_customer (Commit inklusive) – ohne Protokoll,
+   mit sofortigem Schreiben (eigene Transaktion pro Eintrag, Intervall 0)
+   und gepuffert mit Group Commit (Standard, Intervall 0.5 s).
+2. Zeitleiste eines Kunden (activity_log.history) bei --entries
+   Einträgen, verteilt auf --months Monats-Partitionen, gegen ein
+   Protokoll mit einem Hundertstel der Größe: die Dauer hängt von der
+   Zahl der Partitionen ab, kaum von der Zahl der Einträge.
+3. Retention: ältesten Monat per DROP TABLE entfernen gegen ein DELETE
+   derselben Zeilen aus einer einzigen großen Tabelle.
+
+    python -m benchmarks.bench_activity --entries 1000000 --months 12
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks._common import crm_app, percentile, print_table
+from activity import activity_log, list_partitions, partition_name, partition_table
+from models import Customer, db
+
+
+def _write_latencies(app, customer_ids, writes):
+    latencies = []
+    with app.app_context():
+        for n in range(writes):
+            start = time.perf_counter()
+            Customer.update_customer(
+                customer_ids[n % len(customer_ids)], f"Bench {n}", f"bench{n}@example.com",
+                "Bench GmbH", "555", "active" if n % 2 else "inactive",
+            )
+            latencies.append(time.perf_counter() - start)
+    activity_log.flush()
+    return sorted(latencies)
+
+
+def _fill(app, entries, months, entity_ids, rng):
+    """`entries` Einträge gleichmäßig auf die letzten `months` Monate verteilen."""
+    now = datetime.utcnow().replace(day=15)
+    changes = json.dumps({"status": ["prospect", "active"]})
+    with app.app_context():
+        for month in range(months):
+            created_at = now - timedelta(days=30 * month)
+            table = partition_table(partition_name(created_at))
+            rows = [{
+                "created_at": created_at + timedelta(seconds=n),
+                "entity_type": "customer",
+                "entity_id": rng.choice(entity_ids),
+                "action": "update",
+                "user_id": 1,
+                "changes": changes,
+            } for n in range(entries // months)]
+            with db.engine.begin() as conn:
+                table.create(conn, checkfirst=True)
+                conn.execute(db.insert(table), rows)
+
+
+def _drop_partitions(app):
+    with app.app_context(), db.engine.begin() as conn:
+        for name in list_partitions(conn):
+            partition_table(name).drop(conn)
+
+
+def _timeline_latencies(app, entity_ids, lookups, rng):
+    latencies = []
+    with app.app_context():
+        for _ in range(lookups):
+            start = time.perf_counter()
+            activity_log.history("customer", rng.choice(entity_ids), limit=20)
+            latencies.append(time.perf_counter() - start)
+            db.session.remove()
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-activity-")
+    app = crm_app(os.path.join(workdir, "crm.db"))
+    rng = random.Random(1)
+    with app.app_context():
+        customer_ids = db.session.scalars(db.select(Customer.id)).all()
+
+    # 1. Schreiblatenz
+    table = []
+    for label, enabled, interval in (("off", False, 0.5), ("immediate", True, 0), ("group commit", True, 0.5)):
+        activity_log.enabled, activity_log.flush_interval = enabled, interval
+        latencies = _write_latencies(app, customer_ids, args.writes)
+        table.append((label, f"{percentile(latencies, 0.5) * 1000:.2f}",
+                      f"{percentile(latencies, 0.99) * 1000:.2f}", f"{args.writes / sum(latencies):,.0f}"))
+    print_table(table, ("activity log", "write p50 ms", "write p99 ms", "writes/s"))
+    print(f"largest group commit: {activity_log.largest_batch} entries")
+
+    # 2. Zeitleiste bei wachsendem Protokoll
+    entity_ids = list(range(1, 100001))
+    table = []
+    for entries in (args.entries // 100, args.entries):
+        _drop_partitions(app)
+        _fill(app, entries, args.months, entity_ids, rng)
+        latencies = _timeline_latencies(app, entity_ids, args.lookups, rng)
+        table.append((f"{entries:,}", args.months, f"{percentile(latencies, 0.5) * 1000:.2f}",
+                      f"{percentile(latencies, 0.99) * 1000:.2f}"))
+    print_table(table, ("log entries", "partitions", "timeline p50 ms", "timeline p99 ms"))
+
+    # 3. Retention: Partition löschen gegen DELETE aus einer Tabelle
+    with app.app_context(), db.engine.begin() as conn:
+        partitions = list_partitions(conn)
+        oldest = partitions[-1]
+        rows = conn.execute(db.select(db.func.count()).select_from(partition_table(oldest))).scalar()
+        conn.exec_driver_sql(f"CREATE TABLE activity_single AS SELECT * FROM {oldest}")
+        for name in partitions[:-1]:
+            conn.exec_driver_sql(f"INSERT INTO activity_single SELECT * FROM {name}")
+        conn.exec_driver_sql("CREATE INDEX ix_activity_single_created ON activity_single (created_at)")
+        conn.exec_driver_sql(
+            "CREATE INDEX ix_activity_single_entity ON activity_single (entity_type, entity_id, created_at)"
+        )
+        cutoff = conn.exec_driver_sql(f"SELECT max(created_at) FROM {oldest}").scalar()
+    with app.app_context():
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM activity_single WHERE created_at <= ?", (cutoff,))
+        delete_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            partition_table(oldest).drop(conn)
+        drop_seconds = time.perf_counter() - start
+    print_table([("DELETE from one table", f"{delete_seconds * 1000:.1f}"),
+                 ("DROP TABLE partition", f"{drop_seconds * 1000:.1f}")],
+                (f"remove oldest month ({rows:,} rows)", "ms"))
+
+    activity_log.close()
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
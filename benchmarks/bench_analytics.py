@@ -0,0 +1,131 @@
+"""
+Pipeline-Auswertung (analytics.py): SQL und numpy vs. naive Python-Schleifen.
+
+Berechnet denselben Bericht (Summen je Status/Quelle, gewichtete Prognose,
+Perzentile, Top-Firmen) auf drei Wegen und misst jeweils die Zeit ohne
+Cache (kalt) sowie den anschließenden Cache-Treffer:
+- naiv:  alle Leads als ORM-Objekte laden, Python-Schleifen, sorted()
+- sql:   GROUP BY über die abdeckenden Indizes, Perzentile per Index-Offset
+- numpy: Spalten in einem Durchlauf laden, vektorisiert aggregieren
+
+    python -m benchmarks.bench_analytics --leads 200000
+    python -m benchmarks.seed --customers 1000 --leads 1000000 --db /tmp/crm-1m.db
+    python -m benchmarks.bench_analytics --db /tmp/crm-1m.db
+
+Die Status der Leads werden vorher deterministisch auf mehrere Stufen
+verteilt (auch in einer per --db übergebenen Datei).
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import analytics
+from analytics import PERCENTILES, lead_analytics
+from benchmarks._common import crm_app, print_table, remove_db
+from benchmarks.seed import seed_database
+from models import Lead, bump_table_version, db
+
+STATUSES = tuple(analytics.DEFAULT_STAGE_WEIGHTS)
+
+
+def _spread_statuses():
+    """Lead-Status reihum über die Stufen der Prognose verteilen."""
+    status = db.case(
+        *((Lead.id % len(STATUSES) == i, name) for i, name in enumerate(STATUSES))
+    )
+    db.session.execute(
+        db.update(Lead).values(status=status).execution_options(synchronize_session=False)
+    )
+    bump_table_version(Lead.__tablename__)
+    db.session.commit()
+
+
+def _naive_report(top_n):
+    """Referenz: derselbe Bericht mit Schleifen über ORM-Objekte."""
+    leads = Lead.query.all()
+    by_status = defaultdict(lambda: {"count": 0, "value": 0.0})
+    by_source = defaultdict(lambda: {"count": 0, "value": 0.0})
+    companies = defaultdict(float)
+    weighted = 0.0
+    for lead in leads:
+        for group in (by_status[lead.status], by_source[lead.source]):
+            group["count"] += 1
+            group["value"] += lead.value
+        companies[lead.company] += lead.value
+        weighted += lead.value * lead_analytics.weight(lead.status)
+    values = sorted(lead.value for lead in leads)
+    percentiles = []
+    for p in PERCENTILES:
+        position = p / 100 * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        percentiles.append(values[low] + (values[high] - values[low]) * (position - low))
+    top = sorted(companies.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+    return {
+        "weighted_value": round(weighted, 2),
+        "percentiles": percentiles,
+        "top_companies": [company for company, _ in top],
+    }
+
+
+def _measure(fn):
+    db.session.rollback()
+    db.session.expunge_all()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    # Neue Transaktion, damit der folgende Lauf nicht im alten Snapshot liest
+    db.session.rollback()
+    return seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--leads", type=int, default=200000)
+    parser.add_argument("--db", help="vorhandene/neue SQLite-Datei statt einer temporären")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-naive", action="store_true", help="naive Referenz auslassen")
+    args = parser.parse_args()
+
+    keep_db = bool(args.db) and os.path.exists(args.db)
+    app = crm_app(args.db)
+    engines = ["sql"] + (["numpy"] if analytics.HAVE_NUMPY else [])
+    table = []
+    with app.app_context():
+        if not keep_db:
+            seed_database(0, args.leads)
+        _spread_statuses()
+        leads = Lead.query.count()
+
+        naive = naive_seconds = None
+        if not args.skip_naive:
+            naive_seconds, naive = _measure(lambda: _naive_report(args.top))
+            table.append(("naive (ORM + loops)", f"{naive_seconds * 1000:,.0f}", "–", "1.0x"))
+
+        for engine in engines:
+            cold = float("inf")
+            for _ in range(args.repeat):
+                lead_analytics.clear()
+                seconds, report = _measure(lambda: lead_analytics.report(args.top, engine))
+                cold = min(cold, seconds)
+            hit, _ = _measure(lambda: lead_analytics.report(args.top, engine))
+            if naive is not None:
+                # Summenreihenfolge unterscheidet sich → Rundung auf Cent kann abweichen
+                assert abs(report["total"]["weighted_value"] - naive["weighted_value"]) <= 0.05
+                assert [row["company"] for row in report["top_companies"]] == naive["top_companies"]
+                for ours, theirs in zip(report["percentiles"].values(), naive["percentiles"]):
+                    assert abs(ours - theirs) < 1e-6, (ours, theirs)
+            speedup = f"{naive_seconds / cold:.1f}x" if naive_seconds else "–"
+            table.append((engine, f"{cold * 1000:,.0f}", f"{hit * 1000:.2f}", speedup))
+
+    app.session_interface.close()
+    if not args.db:
+        remove_db(app)
+    print(f"{leads:,} leads")
+    print_table(table, ("engine", "cold ms", "cached ms", "speedup"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Bulk-Import vs. ein Commit pro Zeile.
+
+Vergleicht den bisherigen Weg (`Customer.add_customer` / `Lead.add_lead`,
+ein Commit und damit ein fsync pro Datensatz) mit `bulk_add`
+(executemany, ein Commit pro Block) in Zeilen pro Sekunde.
+
+    python -m benchmarks.bench_bulk_import --rows 50000
+"""
+import argparse
+
+from benchmarks._common import make_app, print_table, remove_db, reset_tables, timed
+from benchmarks.seed import customer_rows, lead_rows
+from models import Customer, Lead
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000, help="Zeilen für den Bulk-Pfad")
+    parser.add_argument(
+        "--single-rows",
+        type=int,
+        default=2000,
+        help="Zeilen für den Einzel-Commit-Pfad (langsam, daher kleiner)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = make_app()
+    timings = {}
+    cases = [
+        ("customers", Customer, customer_rows, lambda r: Customer.add_customer(**r)),
+        ("leads", Lead, lead_rows, lambda r: Lead.add_lead(**r)),
+    ]
+    table = []
+    with app.app_context():
+        for label, model, rows, add_one in cases:
+            reset_tables(app, model)
+            with timed(timings, "single"):
+                for row in rows(args.single_rows):
+                    add_one(row)
+            reset_tables(app, model)
+            with timed(timings, "bulk"):
+                inserted, errors = model.bulk_add(rows(args.rows), chunk_size=args.chunk_size)
+            assert inserted == args.rows and not errors
+
+            single_rate = args.single_rows / timings["single"]
+            bulk_rate = args.rows / timings["bulk"]
+            table.append((label, "one commit per row", args.single_rows, f"{single_rate:,.0f}", ""))
+            table.append(
+                (label, f"bulk_add chunk={args.chunk_size}", args.rows, f"{bulk_rate:,.0f}",
+                 f"{bulk_rate / single_rate:.1f}x")
+            )
+
+    print_table(table, ("table", "path", "rows", "rows/sec", "speedup"))
+    remove_db(app)
+
+
+if __name__ == "__main__":
+    main()
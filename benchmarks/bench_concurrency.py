@@ -0,0 +1,117 @@
+"""
+Gleichzeitige Lese-/Schreiblast auf Customer/Lead: SQLite-Standard vs. db_config-Tuning.
+
+Startet mehrere Prozesse (wie Gunicorn-Worker) gegen dieselbe Datenbankdatei:
+Leser holen Listen-Seiten und Einzeldatensätze, Schreiber legen Kunden/Leads
+an und ändern Kunden. Gemessen werden Operationen pro Sekunde und die Zahl
+der "database is locked"-Fehler – einmal mit SQLite-Standardeinstellungen
+(Rollback-Journal), einmal mit WAL & Co. aus db_config.
+
+    python -m benchmarks.bench_concurrency --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import multiprocessing
+import random
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks._common import make_app, print_table, remove_db
+from benchmarks.seed import customer_rows, lead_rows
+from models import Customer, Lead, db
+
+SEED_ROWS = 5000
+
+
+def _reader(db_path, pragmas, seconds, results):
+    app = make_app(db_path, sqlite_pragmas=pragmas)
+    rng = random.Random()
+    ops = errors = 0
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        while time.monotonic() < deadline:
+            try:
+                Customer.get_customers_page(after=rng.randrange(SEED_ROWS), limit=50)
+                Lead.get_lead_by_id(rng.randrange(1, SEED_ROWS))
+                ops += 2
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            db.session.remove()
+    results.put(("read", ops, errors))
+
+
+def _writer(db_path, pragmas, seconds, results):
+    app = make_app(db_path, sqlite_pragmas=pragmas)
+    rng = random.Random()
+    rows = customer_rows(10 ** 6, seed=rng.randrange(10 ** 6))
+    leads = lead_rows(10 ** 6, seed=rng.randrange(10 ** 6))
+    ops = errors = 0
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        while time.monotonic() < deadline:
+            try:
+                row = next(rows)
+                Customer.add_customer(**row)
+                Lead.add_lead(**next(leads))
+                Customer.update_customer(rng.randrange(1, SEED_ROWS), **row)
+                ops += 3
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            db.session.remove()
+    results.put(("write", ops, errors))
+
+
+def run(label, pragmas, args):
+    app = make_app(sqlite_pragmas=pragmas)
+    db_path = app.config["BENCH_DB_PATH"]
+    with app.app_context():
+        Customer.bulk_add(customer_rows(SEED_ROWS))
+        Lead.bulk_add(lead_rows(SEED_ROWS))
+        db.engine.dispose()
+
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_reader, args=(db_path, pragmas, args.seconds, results))
+        for _ in range(args.readers)
+    ] + [
+        multiprocessing.Process(target=_writer, args=(db_path, pragmas, args.seconds, results))
+        for _ in range(args.writers)
+    ]
+    for proc in procs:
+        proc.start()
+    totals = {"read": [0, 0], "write": [0, 0]}
+    for _ in procs:
+        kind, ops, errors = results.get()
+        totals[kind][0] += ops
+        totals[kind][1] += errors
+    for proc in procs:
+        proc.join()
+    remove_db(app)
+
+    return (
+        label,
+        f"{totals['read'][0] / args.seconds:,.0f}",
+        f"{totals['write'][0] / args.seconds:,.0f}",
+        totals["read"][1] + totals["write"][1],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    table = [
+        # {} = keine PRAGMAs, also das bisherige Verhalten der App
+        run("sqlite defaults (rollback journal)", {}, args),
+        run("db_config (WAL, NORMAL, busy_timeout)", None, args),
+    ]
+    print_table(table, ("configuration", "reads/s", "writes/s", "lock errors"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Lead-Umwandlung: mengenbasierte Blöcke vs. ein Lead nach dem anderen.
+
+Vergleicht den naiven Weg (pro Lead `Customer.add_customer` und
+`Lead.delete_lead`, zwei Commits je Lead) mit `Lead.convert_leads`
+(INSERT ... SELECT und UPDATE/DELETE je Block, ein Commit pro Block)
+bei verschiedenen Blockgrößen, in umgewandelten Leads pro Sekunde.
+
+    python -m benchmarks.bench_convert --leads 50000
+"""
+import argparse
+
+import dedup  # noqa: F401  (Dublettenschlüssel werden auf beiden Wegen gepflegt)
+from benchmarks._common import make_app, print_table, remove_db, reset_tables, timed
+from benchmarks.seed import lead_rows
+from models import Customer, Lead, db
+
+
+def _seed(app, n):
+    reset_tables(app, Customer, Lead, dedup.MatchKey)
+    inserted, errors = Lead.bulk_add(lead_rows(n))
+    assert inserted == n and not errors
+    return db.session.scalars(db.select(Lead.id).order_by(Lead.id)).all()
+
+
+def _naive(ids):
+    for lead_id in ids:
+        lead = Lead.get_lead_by_id(lead_id)
+        Customer.add_customer(lead.name, lead.email, lead.company, '', 'active')
+        Lead.delete_lead(lead_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--leads", type=int, default=20000, help="Leads für die Block-Pfade")
+    parser.add_argument(
+        "--naive-leads",
+        type=int,
+        default=2000,
+        help="Leads für den naiven Pfad (langsam, daher kleiner)",
+    )
+    parser.add_argument("--chunk-sizes", default="100,1000,5000")
+    args = parser.parse_args()
+
+    app = make_app()
+    timings = {}
+    table = []
+    with app.app_context():
+        ids = _seed(app, args.naive_leads)
+        with timed(timings, "naive"):
+            _naive(ids)
+        naive_rate = len(ids) / timings["naive"]
+        table.append(("add_customer + delete_lead", "–", len(ids), f"{naive_rate:,.0f}", "1.0x"))
+
+        for chunk_size in (int(size) for size in args.chunk_sizes.split(",")):
+            for delete in (False, True):
+                ids = _seed(app, args.leads)
+                with timed(timings, "convert"):
+                    conversions, skipped = Lead.convert_leads(
+                        ids, delete=delete, chunk_size=chunk_size
+                    )
+                assert len(conversions) == len(ids) and not skipped
+                assert db.session.scalar(db.select(db.func.count()).select_from(Customer)) == len(ids)
+                rate = len(ids) / timings["convert"]
+                path = "convert_leads" + (" (delete)" if delete else "")
+                table.append((path, chunk_size, len(ids), f"{rate:,.0f}", f"{rate / naive_rate:.1f}x"))
+
+    print_table(table, ("path", "chunk", "leads", "leads/sec", "speedup"))
+    remove_db(app)
+
+
+if __name__ == "__main__":
+    main()
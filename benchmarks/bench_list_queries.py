@@ -0,0 +1,75 @@
+"""
+Filter-, Such- und Sortierabfragen der Kunden-/Lead-Listen.
+
+Befüllt die Tabellen in mehreren Größen, zeigt für jede typische Abfrage
+den SQLite-Ausführungsplan (EXPLAIN QUERY PLAN) und misst die Laufzeit
+einer Seite (limit=50). Mit Index bleibt die Laufzeit über die
+Tabellengrößen hinweg annähernd konstant.
+
+    python -m benchmarks.bench_list_queries --sizes 10000 100000
+"""
+import argparse
+import time
+
+from benchmarks._common import make_app, print_table, remove_db
+from benchmarks.seed import customer_rows, lead_rows
+from models import Customer, Lead, _list_statement, db
+
+# (Modell, Beschreibung, Filter, Sortierung)
+CASES = [
+    (Customer, "status=active", {"status": "active"}, None),
+    (Customer, "company prefix", {"company": "acme nova"}, None),
+    (Customer, "q prefix search", {"q": "anna"}, None),
+    (Customer, "sort by name", {}, "name"),
+    (Lead, "status=new", {"status": "new"}, None),
+    (Lead, "source + value range", {"source": "Referral", "min_value": 240000}, None),
+    (Lead, "value range", {"min_value": 99000, "max_value": 99500}, None),
+    (Lead, "sort by -value", {}, "-value"),
+]
+
+PAGE_SIZE = 50
+REPEAT = 20
+
+
+def explain(stmt):
+    """EXPLAIN QUERY PLAN für ein SQLAlchemy-Statement als einzeiligen Text."""
+    compiled = stmt.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    app = make_app()
+    table = []
+    plans = {}
+    with app.app_context():
+        loaded = 0
+        for size in sorted(args.sizes):
+            # Tabellen inkrementell bis zur nächsten Größe auffüllen
+            Customer.bulk_add(customer_rows(size - loaded))
+            Lead.bulk_add(lead_rows(size - loaded))
+            loaded = size
+            db.session.execute(db.text("ANALYZE"))
+
+            for model, label, filters, sort in CASES:
+                stmt = _list_statement(model, db.select(model), filters, sort).limit(PAGE_SIZE)
+                plans[(model.__tablename__, label)] = explain(stmt)
+                start = time.perf_counter()
+                for _ in range(REPEAT):
+                    db.session.scalars(stmt).all()
+                elapsed_ms = (time.perf_counter() - start) / REPEAT * 1000
+                table.append((size, model.__tablename__, label, f"{elapsed_ms:.2f}"))
+
+    print_table(table, ("rows", "table", "query", "ms/page"))
+    print()
+    for (tablename, label), plan in plans.items():
+        print(f"{tablename:9}  {label:22}  {plan}")
+    remove_db(app)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Login-Durchsatz je Hash-Verfahren und Latenz paralleler normaler Requests.
+
+Mehrere Threads melden sich in einer Schleife über POST /login an (jeweils
+mit frischem Test-Client), während ein weiterer Thread eine leichte Seite
+abruft. Gemessen werden Logins pro Sekunde, mit 503 abgelehnte Logins
+(Hashing-Pool voll) und p50/p95 der normalen Requests – je Verfahren aus
+passwords.py.
+
+    python -m benchmarks.bench_login --threads 8 --seconds 5
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks._common import crm_app, percentile, print_table, remove_db
+from models import User, db
+from passwords import password_hasher
+
+METHODS = (
+    "pbkdf2:sha256:600000",
+    "scrypt",
+)
+
+
+def _login_worker(app, deadline, counts, lock):
+    ok = busy = 0
+    while time.monotonic() < deadline:
+        client = app.test_client()
+        resp = client.post("/login", data={"username": "admin", "password": "admin"})
+        if resp.status_code == 302:
+            ok += 1
+        elif resp.status_code == 503:
+            busy += 1
+    with lock:
+        counts["ok"] += ok
+        counts["busy"] += busy
+
+
+def _page_worker(app, deadline, latencies):
+    client = app.test_client()
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        client.get("/login")
+        latencies.append(time.perf_counter() - start)
+
+
+def run(app, method, args):
+    password_hasher.configure(
+        method, password_hasher.salt_length, args.workers, args.queue_limit,
+        password_hasher.timeout,
+    )
+    with app.app_context():
+        admin = User.get_by_username("admin")
+        admin.set_password("admin")
+        db.session.commit()
+
+    # Referenz: Seitenlatenz ohne Login-Last
+    idle = []
+    _page_worker(app, time.monotonic() + 1, idle)
+
+    counts = {"ok": 0, "busy": 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=_login_worker, args=(app, deadline, counts, lock))
+        for _ in range(args.threads)
+    ] + [threading.Thread(target=_page_worker, args=(app, deadline, latencies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return (
+        method,
+        f"{counts['ok'] / args.seconds:,.1f}",
+        counts["busy"],
+        f"{statistics.median(idle) * 1000:.1f}",
+        f"{percentile(latencies, 0.5) * 1000:.1f}",
+        f"{percentile(latencies, 0.95) * 1000:.1f}",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-limit", type=int, default=4)
+    args = parser.parse_args()
+
+    app = crm_app()
+    try:
+        table = [run(app, method, args) for method in METHODS]
+    finally:
+        app.session_interface.close()
+        remove_db(app)
+    print_table(table, (
+        "method", "logins/s", "503 rejects",
+        "page ms (idle)", "page p50 ms", "page p95 ms",
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Schema-Migrationen: Dauer und Schreib-Latenz der App während des Backfills.
+
+Ausgangslage ist eine Datenbank wie vor Einführung der Migrationen:
+--customers Kunden ohne row_version, ohne Volltextindex und ohne
+Dublettenschlüssel. Gemessen wird migrator.upgrade()
+- blockweise (MIGRATION_BATCH_SIZE Zeilen pro Transaktion) und
+- "ein Block" (batch_size größer als die Tabelle, wie früher init_db),
+während ein zweiter Thread laufend Kunden anlegt (Customer.add_customer).
+Die Latenz dieser Schreibzugriffe zeigt, wie lange die App blockiert ist.
+Dazu ein abgebrochener Lauf (nach der Hälfte von Migration 2), der danach
+fortgesetzt wird – ohne bereits erledigte Blöcke zu wiederholen.
+
+    python -m benchmarks.bench_migrations --customers 200000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks._common import make_app, percentile, print_table
+from benchmarks.seed import seed_database
+from dedup import MatchKey
+from migrations import SchemaVersion, migrator
+from models import Customer, db
+
+
+class Interrupted(Exception):
+    """Simulierter Abbruch (z.B. Deployment abgebrochen, Prozess beendet)."""
+
+
+def _copy(template, path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.copyfile(template, path)
+
+
+def _writer(app, stop, latencies, errors):
+    """Legt bis zum Stopp-Signal Kunden an und misst die Dauer jedes Commits."""
+    n = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        with app.app_context():
+            try:
+                Customer.add_customer(f"Writer {n}", f"writer{n}@example.com", "Bench GmbH", "555", "active")
+            except OperationalError:
+                db.session.rollback()
+                errors.append(n)
+        latencies.append(time.perf_counter() - start)
+        n += 1
+        time.sleep(0.005)
+
+
+def _run(app, batch_size):
+    """upgrade() mit parallelem Schreiber; gibt (Sekunden, Latenzen, Fehler) zurück."""
+    migrator.batch_size = batch_size
+    stop = threading.Event()
+    latencies, errors = [], []
+    thread = threading.Thread(target=_writer, args=(app, stop, latencies, errors))
+    thread.start()
+    start = time.perf_counter()
+    with app.app_context():
+        migrator.upgrade()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.02, help="Pause nach jedem Block (s)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-migrations-")
+    template = os.path.join(workdir, "template.db")
+    app = make_app(template)
+    with app.app_context():
+        seed_database(args.customers, 0)
+        # Stand vor den Migrationen 2–4 herstellen
+        db.session.execute(db.update(Customer).values(row_version=None))
+        db.session.execute(db.delete(MatchKey))
+        db.session.execute(db.delete(SchemaVersion))
+        db.session.commit()
+        db.session.connection().exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.engine.dispose()
+
+    migrator.batch_pause = args.pause
+    table = []
+    for label, batch_size in (("batched", args.batch_size), ("one block", 10 ** 9)):
+        path = os.path.join(workdir, f"{label.replace(' ', '-')}.db")
+        _copy(template, path)
+        elapsed, latencies, errors = _run(make_app(path), batch_size)
+        latencies.sort()
+        table.append((
+            label, f"{elapsed:.1f}", len(latencies),
+            f"{percentile(latencies, 0.5) * 1000:.1f}", f"{percentile(latencies, 0.99) * 1000:.1f}",
+            f"{latencies[-1] * 1000:.0f}", len(errors),
+        ))
+    print_table(table, ("mode", "migrate s", "writes", "p50 ms", "p99 ms", "max ms", "locked"))
+
+    # Abbruch mitten in Migration 2, dann fortsetzen
+    path = os.path.join(workdir, "resume.db")
+    _copy(template, path)
+    app = make_app(path)
+    migrator.batch_size = args.batch_size
+
+    def interrupt(version, label, done, total):
+        if version == 2 and done and done >= total // 2:
+            raise Interrupted()
+
+    with app.app_context():
+        try:
+            migrator.upgrade(progress=interrupt)
+        except Interrupted:
+            pass
+        before = db.session.get(SchemaVersion, 2)
+        done_before, status = before.rows_done, before.status
+        start = time.perf_counter()
+        migrator.upgrade()
+        resumed = time.perf_counter() - start
+        after = db.session.get(SchemaVersion, 2, populate_existing=True)
+        missing = db.session.scalar(
+            db.select(db.func.count()).select_from(Customer).where(Customer.row_version.is_(None))
+        )
+    print(f"\ninterrupted migration 2 at {done_before:,} rows ({status}); resumed run took {resumed:.1f}s, "
+          f"processed {after.rows_done - done_before:,} more rows "
+          f"(total {after.rows_done:,} of {args.customers:,}), rows without row_version: {missing}")
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
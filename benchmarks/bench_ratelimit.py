@@ -0,0 +1,98 @@
+"""
+Kosten einer Rate-Limit-/Lastbegrenzungs-Entscheidung (ratelimit.py).
+
+Misst pro Entscheidung:
+- Token-Bucket im Speicher und in der gemeinsamen SQLite-Datei, jeweils
+  für einen heißen Schlüssel und reihum über viele Schlüssel (viele Clients)
+- Belegen/Freigeben eines Platzes im ConcurrencyLimiter
+- Mehrkosten pro Request über den Flask-Test-Client (ohne Limits, memory, sqlite)
+
+    python -m benchmarks.bench_ratelimit --decisions 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from benchmarks._common import print_table
+from ratelimit import ConcurrencyLimiter, Limit, MemoryBackend, RateLimiter, SqliteBackend
+
+# So großzügig, dass jede Entscheidung "erlaubt" ist (gemessen wird der Weg, nicht das Ablehnen)
+RATE, BURST = 1e9, 1e9
+
+
+def _per_call(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n
+
+
+def _app(backend, db_path):
+    app = Flask(__name__)
+    app.config.update(
+        RATE_LIMIT_BACKEND=backend,
+        RATE_LIMIT_DB=db_path,
+        RATE_LIMITS={"ping": (RATE, BURST)},
+    )
+    RateLimiter().init_app(app)
+    app.add_url_rule("/ping", "ping", lambda: "ok")
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--decisions", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=10000, help="Schlüssel im Reihum-Fall")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(prefix="crm-bench-ratelimit-", suffix=".db")
+    os.close(fd)
+    keys = [f"api.api_get_customers|ip:10.0.{i // 256}.{i % 256}" for i in range(args.keys)]
+    table = []
+    n = args.decisions
+    for label, backend, count in (
+        ("memory", MemoryBackend(), n),
+        ("sqlite", SqliteBackend(db_path), n // 10),
+    ):
+        hot = _per_call(lambda i: backend.consume(keys[0], RATE, BURST), count)
+        spread = _per_call(lambda i: backend.consume(keys[i % len(keys)], RATE, BURST), count)
+        table.append((f"token bucket ({label}), one key", f"{hot * 1e6:.2f}"))
+        table.append((f"token bucket ({label}), {len(keys):,} keys", f"{spread * 1e6:.2f}"))
+
+    limiter = RateLimiter()
+    limiter.backend = MemoryBackend()
+    limit = Limit(RATE, BURST)
+    decide = _per_call(lambda i: limiter.hit(keys[i % len(keys)], limit), n)
+    table.append(("RateLimiter.hit (memory)", f"{decide * 1e6:.2f}"))
+
+    admission = ConcurrencyLimiter(max_active=16)
+
+    def admit(_):
+        admission.acquire()
+        admission.release()
+
+    table.append(("ConcurrencyLimiter acquire+release", f"{_per_call(admit, n) * 1e6:.2f}"))
+
+    # Gesamtkosten eines Requests mit und ohne Limiter (Differenz = Overhead)
+    baseline = None
+    for backend in ("off", "memory", "sqlite"):
+        client = _app(backend, db_path).test_client()
+        per_request = _per_call(lambda i: client.get("/ping"), args.requests)
+        baseline = baseline or per_request
+        table.append(
+            (f"request via test client ({backend})",
+             f"{per_request * 1e6:.1f} (+{(per_request - baseline) * 1e6:.1f})")
+        )
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    print_table(table, ("decision", "µs per call"))
+
+
+if __name__ == "__main__":
+    main()
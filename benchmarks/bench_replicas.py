@@ -0,0 +1,138 @@
+"""
+Read-Replica (replicas.py): Lesedurchsatz unter gleichzeitiger Schreiblast.
+
+Mehrere Leser-Threads fragen Kundenseiten der API ab (GET /api/customers
+mit zufälligem Keyset-Cursor und GET /api/search mit Vor- und Nachname), während
+Schreiber-Threads laufend Kunden anlegen (POST /api/customers). Gemessen
+werden Lese-Requests pro Sekunde, p50/p99 der Lese-Latenz und die erreichten
+Schreibvorgänge – einmal alles auf der primären Engine (READ_REPLICA=off),
+einmal mit Snapshot-Replica (READ_REPLICA=snapshot).
+
+    python -m benchmarks.bench_replicas --customers 100000 --seconds 10
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks._common import make_app, percentile, print_table
+from benchmarks.seed import FIRST_NAMES, LAST_NAMES, customer_rows, seed_database
+
+ADMIN_LOGIN = {"username": "admin", "password": "admin"}
+
+
+def _crm_app(db_path, replica, refresh):
+    from app import create_app
+
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "READ_REPLICA": replica,
+        "READ_REPLICA_REFRESH": refresh,
+        "READ_REPLICA_DIR": os.path.join(os.path.dirname(db_path), "replica"),
+        "RATE_LIMIT_BACKEND": "off",
+        "MAX_CONCURRENT_REQUESTS": 0,
+        "JOB_WORKERS": 0,
+    })
+
+
+def _reader(app, stop, max_id, latencies, rng):
+    client = app.test_client()
+    client.post("/login", data=ADMIN_LOGIN)
+    while not stop.is_set():
+        if rng.random() < 0.5:
+            path = f"/api/customers?limit=50&after={rng.randrange(max_id)}"
+        else:
+            path = f"/api/search?q={rng.choice(FIRST_NAMES)}+{rng.choice(LAST_NAMES)}"
+        start = time.perf_counter()
+        response = client.get(path)
+        response.close()
+        latencies.append(time.perf_counter() - start)
+
+
+def _writer(app, stop, rows, counter):
+    client = app.test_client()
+    client.post("/login", data=ADMIN_LOGIN)
+    for row in rows:
+        if stop.is_set():
+            return
+        response = client.post("/api/customers", data=json.dumps(row), content_type="application/json")
+        response.close()
+        counter.append(response.status_code)
+
+
+def _measure(app, args, max_id):
+    stop = threading.Event()
+    read_latencies = [[] for _ in range(args.readers)]
+    writes = []
+    threads = [
+        threading.Thread(target=_reader, args=(app, stop, max_id, read_latencies[i], random.Random(i)))
+        for i in range(args.readers)
+    ]
+    for i in range(args.writers):
+        rows = customer_rows(10 ** 6, seed=1000 + i)
+        unique = ({**row, "email": f"w{i}.{n}.{row['email']}"} for n, row in enumerate(rows))
+        threads.append(threading.Thread(target=_writer, args=(app, stop, unique, writes)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies = sorted(value for values in read_latencies for value in values)
+    return latencies, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--refresh", type=float, default=5.0, help="READ_REPLICA_REFRESH (s)")
+    args = parser.parse_args()
+
+    logging.getLogger("crm.slow_query").setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix="crm-bench-replicas-")
+    template = os.path.join(workdir, "template.db")
+    seed_app = make_app(template)
+    with seed_app.app_context():
+        seed_database(args.customers, 0)
+
+    table = []
+    for replica in ("off", "snapshot"):
+        for writers in (0, args.writers):
+            db_path = os.path.join(workdir, f"{replica}-{writers}.db")
+            shutil.copyfile(template, db_path)
+            app = _crm_app(db_path, replica, args.refresh)
+            from database import init_db
+            from replicas import read_router
+
+            init_db(app)
+            client = app.test_client()
+            client.get("/login")  # startet den Snapshot-Thread
+            while replica == "snapshot" and read_router.replica.current()[0] is None:
+                time.sleep(0.05)
+            run_args = argparse.Namespace(**{**vars(args), "writers": writers})
+            replica_before = read_router.replica_requests
+            latencies, writes = _measure(app, run_args, args.customers)
+            failed = sum(1 for status in writes if status >= 400)
+            table.append((
+                replica, writers, f"{len(latencies) / args.seconds:,.0f}",
+                f"{percentile(latencies, 0.5) * 1000:.1f}", f"{percentile(latencies, 0.99) * 1000:.1f}",
+                f"{len(writes) / args.seconds:,.0f}", failed, read_router.replica_requests - replica_before,
+            ))
+            if read_router.replica is not None:
+                read_router.replica.close()
+                read_router.replica = None
+    print_table(table, ("replica", "writers", "reads/s", "read p50 ms", "read p99 ms", "writes/s",
+                        "failed writes", "replica reads"))
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Type-ahead-Suche: FTS5-Index vs. Scan über alle Kunden.
+
+Misst die Latenz von Präfix-Suchen, wie sie beim Tippen entstehen
+("a", "ac", "acm", ...), einmal über /api/search (FTS5 + bm25) und
+einmal als bisheriger Weg: alle Kunden laden und in Python filtern.
+
+    python -m benchmarks.bench_search --rows 100000
+"""
+import argparse
+import time
+
+from benchmarks._common import make_app, print_table, remove_db
+from benchmarks.seed import customer_rows, lead_rows
+from models import Customer, Lead
+from search import init_search_index, search
+
+QUERIES = ["a", "ac", "acm", "acme gmbh", "anna mü", "schnei", "zimmermann wolf"]
+
+
+def scan(text):
+    """Bisheriger Weg: komplette Tabelle laden und in Python durchsuchen."""
+    text = text.lower()
+    return [
+        c for c in Customer.get_all_customers()
+        if text in c.name.lower() or text in c.email.lower() or text in c.company.lower()
+    ][:10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    table = []
+    with app.app_context():
+        init_search_index()
+        start = time.perf_counter()
+        Customer.bulk_add(customer_rows(args.rows))
+        Lead.bulk_add(lead_rows(args.rows))
+        print(f"loaded {2 * args.rows:,} rows incl. index in {time.perf_counter() - start:.1f}s")
+
+        for text in QUERIES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                hits, _ = search(text, limit=10)
+            fts_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+            start = time.perf_counter()
+            scan(text)
+            scan_ms = (time.perf_counter() - start) * 1000
+            table.append((text, len(hits), f"{fts_ms:.2f}", f"{scan_ms:.1f}"))
+
+    print_table(table, ("query", "hits", "fts5 ms", "scan ms"))
+    remove_db(app)
+
+
+if __name__ == "__main__":
+    main()
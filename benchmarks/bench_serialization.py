@@ -0,0 +1,77 @@
+"""
+Serialisierung großer API-Listen: bisheriger Weg vs. Tupel + schneller Encoder.
+
+Vergleicht für N Kunden die Zeit für Laden + Kodieren und die Body-Größe:
+- bisher:   ORM-Objekte → to_dict() → jsonify
+- json:     API-Spalten als Tupel → Dicts → orjson (falls installiert)
+- columnar: API-Spalten als Tupel → Spalten-Arrays → orjson
+- csv / arrow (arrow nur mit pyarrow)
+
+    python -m benchmarks.bench_serialization --rows 100000
+"""
+import argparse
+import time
+
+from flask import jsonify
+
+import serializers
+from benchmarks._common import make_app, print_table, remove_db
+from benchmarks.seed import customer_rows
+from models import Customer, db
+
+
+def _old_path():
+    items = [obj.to_dict() for obj in Customer.get_all_customers()]
+    return jsonify(items).get_data()
+
+
+def _new_path(fmt):
+    def run():
+        rows = Customer.get_customer_rows()
+        return serializers.render_rows(fmt, Customer.API_FIELDS, rows).get_data()
+    return run
+
+
+def _measure(fn, repeat):
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        # Identity-Map leeren, sonst misst der bisherige Weg ab Runde 2 nur Cache-Treffer
+        db.session.expunge_all()
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = make_app()
+    cases = [("jsonify(to_dict) (old)", _old_path)]
+    cases += [(f"tuples + {fmt}", _new_path(fmt)) for fmt in ("json", "columnar", "csv")]
+    if serializers.HAVE_PYARROW:
+        cases.append(("tuples + arrow", _new_path("arrow")))
+
+    table = []
+    with app.test_request_context():
+        Customer.bulk_add(customer_rows(args.rows))
+        baseline = None
+        for label, fn in cases:
+            seconds, size = _measure(fn, args.repeat)
+            baseline = baseline or seconds
+            table.append((
+                label, f"{seconds * 1000:,.0f}", f"{baseline / seconds:.1f}x", f"{size / 1024:,.0f}",
+            ))
+    remove_db(app)
+
+    encoder = "orjson" if serializers.orjson is not None else "json (stdlib)"
+    print(f"{args.rows:,} customers, JSON encoder: {encoder}")
+    print_table(table, ("path", "ms", "speedup", "KiB"))
+
+
+if __name__ == "__main__":
+    main()
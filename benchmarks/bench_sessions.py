@@ -0,0 +1,119 @@
+"""
+Requests pro Sekunde je Session-Backend.
+
+Misst zwei Fälle über den Flask-Test-Client mit bestehender Session:
+- read:  Request liest nur aus der Session (typischer Seitenaufruf)
+- write: Request ändert die Session (z.B. Flash-Nachricht)
+Zum Vergleich läuft – falls installiert – das bisherige Flask-Session-
+Backend "sqlalchemy", das bei jedem Request liest und schreibt.
+
+    python -m benchmarks.bench_sessions --requests 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask, session
+
+from benchmarks._common import make_app, print_table, remove_db
+from session_store import create_session_interface
+
+
+def _add_routes(app):
+    @app.route("/login")
+    def login():
+        session["_user_id"] = "1"
+        session["counter"] = 0
+        return "ok"
+
+    @app.route("/read")
+    def read():
+        return session.get("_user_id", "-")
+
+    @app.route("/write")
+    def write():
+        session["counter"] = session.get("counter", 0) + 1
+        return "ok"
+
+
+def _measure(app, requests):
+    client = app.test_client()
+    client.get("/login")
+    rates = {}
+    for path in ("/read", "/write"):
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        rates[path] = requests / (time.perf_counter() - start)
+    return rates
+
+
+def _crm_app(backend, **config):
+    app = make_app()
+    app.secret_key = "bench"
+    app.config.update(config)
+    app.session_interface = create_session_interface(app, backend)
+    _add_routes(app)
+    return app
+
+
+def _legacy_app():
+    """Bisheriges Setup: Flask-Session mit SQLAlchemy-Backend (eigene DB-Instanz)."""
+    try:
+        from flask_session import Session
+    except ImportError:
+        return None
+    from flask_sqlalchemy import SQLAlchemy
+
+    fd, path = tempfile.mkstemp(prefix="crm-bench-", suffix=".db")
+    os.close(fd)
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    legacy_db = SQLAlchemy()
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}",
+        SESSION_TYPE="sqlalchemy",
+        SESSION_SQLALCHEMY=legacy_db,
+        SESSION_SQLALCHEMY_TABLE="sessions",
+        SESSION_PERMANENT=True,
+    )
+    legacy_db.init_app(app)
+    Session(app)
+    with app.app_context():
+        legacy_db.create_all()
+    _add_routes(app)
+    app.config["BENCH_DB_PATH"] = path
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = [
+        ("cached (write-behind)", _crm_app("cached")),
+        ("cached (write-through)", _crm_app("cached", SESSION_WRITE_BEHIND_INTERVAL=0)),
+        ("filesystem", _crm_app("filesystem", SESSION_FILE_DIR=tempfile.mkdtemp())),
+        ("cookie", _crm_app("cookie")),
+    ]
+    legacy = _legacy_app()
+    if legacy is not None:
+        cases.insert(0, ("flask-session sqlalchemy (old)", legacy))
+
+    table = []
+    for label, app in cases:
+        rates = _measure(app, args.requests)
+        table.append((label, f"{rates['/read']:,.0f}", f"{rates['/write']:,.0f}"))
+        if hasattr(app.session_interface, "close"):
+            app.session_interface.close()
+        if label.startswith("flask-session"):
+            os.remove(app.config["BENCH_DB_PATH"])
+        else:
+            remove_db(app)
+    print_table(table, ("backend", "read req/s", "write req/s"))
+
+
+if __name__ == "__main__":
+    main()
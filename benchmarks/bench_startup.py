@@ -0,0 +1,115 @@
+"""
+Kaltstart eines Workers: Import, create_app, erster Request, erste API-Doku.
+
+Jede Messung läuft in einem frischen Python-Prozess (sonst wären die Module
+schon geladen) gegen eine vorab angelegte SQLite-Datei:
+- import app:           Module laden (mit -X importtime die teuersten Module)
+- create_app():         Konfiguration, Erweiterungen, Blueprints, Views
+- erster Request:       GET /login über den Test-Client
+- erste /apidocs-Seite: flasgger laden und die Spezifikation erzeugen bzw.
+                        aus der Cache-Datei lesen
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks._common import print_table
+
+# Läuft im Kindprozess; gibt die Zeitpunkte der einzelnen Phasen als JSON aus
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({"APISPEC_CACHE_FILE": sys.argv[1]})
+created = time.perf_counter()
+client = app.test_client()
+assert client.get("/login").status_code == 200
+first = time.perf_counter()
+docs = None
+if sys.argv[2] == "docs":
+    assert client.get("/apispec_1.json").status_code == 200
+    docs = time.perf_counter() - first
+print(json.dumps({"import": imported - start, "create_app": created - imported,
+                  "first_request": first - created, "apidocs": docs,
+                  "modules": len(sys.modules)}))
+"""
+
+
+def _run(env, *args):
+    result = subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+    return result
+
+
+def _probe(env, spec_file, docs):
+    output = _run(env, "-c", PROBE, spec_file, "docs" if docs else "-").stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _import_profile(env, top):
+    """Teuerste direkte Importe von app.py laut -X importtime (kumulierte Zeit in µs)."""
+    stderr = _run(env, "-X", "importtime", "-c", "import app").stderr
+    imports = []
+    for line in stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", zwei Leerzeichen je Ebene
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        if len(name) - len(name.lstrip()) == 3:  # von app.py direkt importiert
+            imports.append((name.strip(), int(fields[1])))
+    return sorted(imports, key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Prozesse pro Messung (bester Wert zählt)")
+    parser.add_argument("--top", type=int, default=10, help="teuerste Importe in der Liste")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-startup-")
+    db_path = os.path.join(workdir, "crm.db")
+    spec_file = os.path.join(workdir, "apispec.json")
+    env = dict(
+        os.environ,
+        CRM_DATABASE_URL=f"sqlite:///{db_path}",
+        CRM_RATE_LIMIT_BACKEND="off",
+        CRM_JINJA_CACHE_DIR=os.path.join(workdir, "jinja-cache"),
+    )
+    # Schema und Beispieldaten einmal anlegen (wie beim Deployment)
+    _run(env, "-m", "flask", "--app", "app", "init-db")
+
+    runs = [_probe(env, spec_file, docs=False) for _ in range(args.runs)]
+    table = []
+    for phase in ("import", "create_app", "first_request"):
+        best = min(run[phase] for run in runs)
+        table.append((phase, f"{best * 1000:.1f}"))
+    table.append(("import + create_app + first request",
+                  f"{min(r['import'] + r['create_app'] + r['first_request'] for r in runs) * 1000:.1f}"))
+
+    # Erster Doku-Aufruf: ohne Cache-Datei (Spezifikation erzeugen), dann mit
+    cold = _probe(env, spec_file, docs=True)["apidocs"]
+    cached = min(_probe(env, spec_file, docs=True)["apidocs"] for _ in range(args.runs))
+    table.append(("first /apispec_1.json, spec built", f"{cold * 1000:.1f}"))
+    table.append(("first /apispec_1.json, spec from cache file", f"{cached * 1000:.1f}"))
+    print_table(table, ("phase", "ms (best)"))
+    print(f"\nmodules loaded after first request: {runs[0]['modules']}")
+
+    print_table(
+        [(name, f"{micros / 1000:.1f}") for name, micros in _import_profile(env, args.top)],
+        ("imported by app.py", "ms (cumulative)"),
+    )
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Listenseiten: Render-Zeit mit Paginierung, Fragment- und Bytecode-Cache.
+
+Misst für die Kundenliste bei --rows Kunden (Standard 1000 und 10000):
+- alt:    alle Kunden als ORM-Objekte, pro Zeile current_user.is_admin()
+          und drei url_for-Aufrufe (bisheriges customers.html)
+- rows:   alle Kunden als Tupel mit _customer_rows.html (is_admin und
+          URL-Präfix einmal pro Seite)
+- Seite:  eine Seite (LIST_PAGE_SIZE Zeilen) über GET /customers, ohne
+          Fragment im Cache und mit Treffer
+Dazu die Kaltstart-Kosten, alle Templates zu laden: neu kompiliert vs. aus
+dem Jinja-Bytecode-Cache.
+
+    python -m benchmarks.bench_templates --rows 1000,10000
+"""
+import argparse
+import tempfile
+import time
+
+from flask_login import current_user, login_user
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from benchmarks._common import crm_app, print_table, remove_db
+from benchmarks.seed import customer_rows
+from models import Customer, User, db
+from templating import fragment_cache
+
+# Schleife der bisherigen Kundenliste (vor Paginierung und Fragment-Cache)
+LEGACY_ROWS = """
+{% for c in customers %}
+<tr>
+    <td>{{ c.name }}</td><td>{{ c.email }}</td><td>{{ c.company }}</td>
+    <td>{{ c.phone }}</td><td>{{ c.status }}</td>
+    <td>
+        <a href="{{ url_for('customer_detail', customer_id=c.id) }}" class="btn btn-sm btn-primary">View</a>
+        {% if current_user.is_admin() %}
+        <a href="{{ url_for('edit_customer', customer_id=c.id) }}" class="btn btn-sm btn-primary">Edit</a>
+        <form method="POST" action="{{ url_for('delete_customer', customer_id=c.id) }}" style="display:inline">
+            <button type="submit" class="btn btn-sm btn-danger" onclick="return confirm('Delete?')">Delete</button>
+        </form>
+        {% endif %}
+    </td>
+</tr>
+{% endfor %}
+"""
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _compile_all(template_dir, bytecode_dir):
+    """Alle Templates in einer frischen Umgebung laden (wie ein neuer Worker)."""
+    env = Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir) if bytecode_dir else None,
+    )
+    for name in env.list_templates():
+        env.get_template(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="1000,10000", help="Kundenzahlen, kommagetrennt")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = crm_app()
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "admin"})
+    table = []
+    with app.app_context():
+        seeded = 0
+        for size in (int(n) for n in args.rows.split(",")):
+            Customer.bulk_add(customer_rows(size - seeded, seed=size))
+            seeded = size
+            count = db.session.scalar(db.select(db.func.count()).select_from(Customer))
+            legacy = app.jinja_env.from_string(LEGACY_ROWS)
+            rows_template = app.jinja_env.get_template("_customer_rows.html")
+
+            with app.test_request_context("/customers"):
+                login_user(db.session.scalar(db.select(User).where(User.username == "admin")))
+                customers = Customer.find_customers()
+                rows = Customer.get_customer_rows()
+                old = _best(
+                    lambda: legacy.render(customers=customers, current_user=current_user), args.repeat
+                )
+                new = _best(lambda: rows_template.render(rows=rows, is_admin=True), args.repeat)
+                db.session.expunge_all()
+
+            def page():
+                response = client.get("/customers")
+                assert response.status_code == 200
+
+            def cold_page():
+                fragment_cache.clear()
+                page()
+
+            cold = _best(cold_page, args.repeat)
+            hit = _best(page, args.repeat)
+            table.append((count, "legacy loop, all rows", f"{old * 1000:.1f}"))
+            table.append((count, "_customer_rows.html, all rows", f"{new * 1000:.1f}"))
+            table.append((count, "GET /customers page, fragment miss", f"{cold * 1000:.1f}"))
+            table.append((count, "GET /customers page, fragment hit", f"{hit * 1000:.1f}"))
+
+    template_dir = app.jinja_loader.searchpath[0]
+    bytecode_dir = tempfile.mkdtemp(prefix="crm-bench-jinja-")
+    # Erster Lauf füllt den Bytecode-Cache
+    _compile_all(template_dir, bytecode_dir)
+    compile_cold = _best(lambda: _compile_all(template_dir, None), args.repeat)
+    compile_cached = _best(lambda: _compile_all(template_dir, bytecode_dir), args.repeat)
+    table.append(("–", "load all templates, compiled", f"{compile_cold * 1000:.1f}"))
+    table.append(("–", "load all templates, bytecode cache", f"{compile_cached * 1000:.1f}"))
+
+    app.session_interface.close()
+    remove_db(app)
+    print_table(table, ("customers", "case", "ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Mandanten (tenancy.py): Kosten von Listen und Zählungen pro Team.
+
+Ein großes und ein kleines Team teilen sich eine Datenbank (--customers
+Kunden und Leads, davon --small-share beim kleinen Team). Gemessen wird
+p50 je Abfrage und Team:
+- Zählung aller Kunden, Zählung nach Status, erste Seite (50) nach Status,
+  Präfix-Suche (q) und Top-Firmen der Pipeline
+- einmal mit den Indizes ohne tenant_id vorne (Stand vor den Mandanten,
+  der Filter muss dann die Zeilen aller Teams prüfen), einmal mit den
+  Indizes mit tenant_id vorne (Standard) und einmal mit einer SQLite-Datei
+  pro Mandant (TENANT_STORAGE=files).
+
+    python -m benchmarks.bench_tenants --customers 200000 --small-share 0.01
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks._common import percentile, print_table
+from benchmarks.seed import seed_database
+
+LARGE, SMALL = 2, 3
+
+
+def _crm_app(db_path, storage):
+    from app import create_app
+
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "TENANT_STORAGE": storage,
+        "TENANT_DIR": os.path.join(os.path.dirname(db_path), "tenants"),
+        "RATE_LIMIT_BACKEND": "off",
+        "JOB_WORKERS": 0,
+        "ACTIVITY_LOG": False,
+    })
+
+
+def _seed(app, counts):
+    from models import Tenant, db
+    from tenancy import tenant_router
+
+    with app.app_context():
+        for tenant_id in counts:
+            db.session.add(Tenant(id=tenant_id, name=f"Team {tenant_id}"))
+        db.session.commit()
+        for tenant_id, n in counts.items():
+            with tenant_router.context(tenant_id):
+                seed_database(n, n, seed=tenant_id)
+
+
+def _queries():
+    from analytics import _sql_report, lead_analytics
+    from models import Customer, db, parse_list_args
+
+    active, _ = parse_list_args(Customer, {"status": "active"})
+    search, _ = parse_list_args(Customer, {"q": "sophie"})
+    return {
+        "count": lambda: db.session.scalar(db.select(db.func.count()).select_from(Customer)),
+        "count status": lambda: db.session.scalar(
+            db.select(db.func.count()).select_from(Customer).where(Customer.status == "active")
+        ),
+        "page status": lambda: Customer.get_customer_rows(limit=50, filters=active),
+        "page q": lambda: Customer.get_customer_rows(limit=50, filters=search),
+        "pipeline": lambda: _sql_report(lead_analytics, 10),
+    }
+
+
+def _measure(app, runs):
+    from models import db
+    from tenancy import tenant_router
+
+    results = {}
+    with app.app_context():
+        for tenant_id in (LARGE, SMALL):
+            with tenant_router.context(tenant_id):
+                for label, query in _queries().items():
+                    latencies = []
+                    for _ in range(runs):
+                        start = time.perf_counter()
+                        query()
+                        latencies.append(time.perf_counter() - start)
+                        db.session.rollback()
+                    results[tenant_id, label] = percentile(latencies, 0.5)
+    return results
+
+
+def _use_pre_tenant_indexes(app):
+    """Indizes wie vor den Mandanten: dieselben Spalten, ohne tenant_id vorne."""
+    from sqlalchemy.schema import CreateIndex
+
+    from models import Customer, Lead, db
+
+    with app.app_context(), db.engine.begin() as conn:
+        for model in (Customer, Lead):
+            for index in model.__table__.indexes:
+                if "_tenant_" not in index.name:
+                    continue
+                sql = str(CreateIndex(index).compile(dialect=conn.dialect))
+                conn.exec_driver_sql(f"DROP INDEX {index.name}")
+                if index.name.endswith("_tenant_id"):
+                    continue
+                conn.exec_driver_sql(
+                    sql.replace(index.name, index.name.replace("_tenant", "")).replace("(tenant_id, ", "(")
+                )
+        conn.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=200000, help="Kunden und Leads insgesamt")
+    parser.add_argument("--small-share", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.getLogger("crm.slow_query").setLevel(logging.ERROR)
+    small = max(1, int(args.customers * args.small_share))
+    counts = {LARGE: args.customers - small, SMALL: small}
+    workdir = tempfile.mkdtemp(prefix="crm-bench-tenants-")
+    from database import init_db
+
+    variants = {}
+    for label, storage in (("tenant_id indexes", "shared"), ("one file per tenant", "files")):
+        db_path = os.path.join(workdir, f"{storage}.db")
+        app = _crm_app(db_path, storage)
+        init_db(app)
+        _seed(app, counts)
+        variants[label] = _measure(app, args.runs)
+        if storage == "shared":
+            _use_pre_tenant_indexes(app)
+            variants["indexes without tenant_id"] = _measure(app, args.runs)
+
+    labels = list(_queries())
+    table = []
+    for variant in ("indexes without tenant_id", "tenant_id indexes", "one file per tenant"):
+        results = variants[variant]
+        for tenant_id in (LARGE, SMALL):
+            table.append((variant, f"{counts[tenant_id]:,}", *(
+                f"{results[tenant_id, label] * 1000:.2f}" for label in labels
+            )))
+    print_table(table, ("storage", "team rows", *(f"{label} ms" for label in labels)))
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Lasttest der echten CRM-App über Test-Client und lokalen WSGI-Server.
+
+Befüllt eine eigene SQLite-Datei deterministisch (benchmarks/seed.py) und
+schickt dann je Szenario eine feste Zahl Requests an die App – einmal
+in-process über den Flask-Test-Client, einmal über HTTP an einen lokalen
+wsgiref-Server (mit Threads). Gemessen werden p50/p95/p99, Requests pro
+Sekunde und der bisher höchste RSS des Prozesses. Die Ergebnisse werden als
+JSON gespeichert; mit --compare werden sie einer früheren Messung
+gegenübergestellt.
+
+    python -m benchmarks.load_test --customers 100000 --leads 100000
+    python -m benchmarks.load_test --compare benchmarks/results/<ältere Datei>.json
+
+Für große Datenmengen die Datei einmal mit `python -m benchmarks.seed`
+erzeugen und per --db wiederverwenden (wird dann nicht gelöscht).
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import count
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks._common import crm_app, peak_rss_mb, percentile, print_table, remove_db
+from benchmarks.seed import customer_rows, lead_rows, seed_database
+from models import Customer, Lead
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ADMIN_LOGIN = {"username": "admin", "password": "admin"}
+
+# Name → (Methode, Pfad, Body-Fabrik oder None, eingeloggt?, erwartete Statuscodes)
+SCENARIOS = {
+    "customers_html": ("GET", "/customers", None, True, (200,)),
+    "leads_html": ("GET", "/leads", None, True, (200,)),
+    "api_customers": ("GET", "/api/customers?limit=100", None, True, (200,)),
+    "api_leads": ("GET", "/api/leads?limit=100", None, True, (200,)),
+    "login": ("POST", "/login", "login", False, (302,)),
+    "create_customer": ("POST", "/api/customers", "customer", True, (201,)),
+    "create_lead": ("POST", "/api/leads", "lead", True, (201,)),
+}
+TRANSPORTS = ("client", "wsgi")
+
+
+class _BodyFactory:
+    """Thread-sichere, reproduzierbare Request-Bodies für die POST-Szenarien."""
+
+    def __init__(self, seed):
+        self._lock = threading.Lock()
+        self._customers = customer_rows(10 ** 9, seed=seed + 1000)
+        self._leads = lead_rows(10 ** 9, seed=seed + 2000)
+        self._ids = count()
+
+    def __call__(self, kind):
+        """(Content-Type, Body-Bytes) für das Szenario liefern."""
+        if kind == "login":
+            return "application/x-www-form-urlencoded", urlencode(ADMIN_LOGIN).encode()
+        with self._lock:
+            row = next(self._customers if kind == "customer" else self._leads)
+            # Eindeutige E-Mails, damit spätere Duplikatprüfungen nicht greifen
+            row["email"] = f"load{next(self._ids)}.{row['email']}"
+        return "application/json", json.dumps(row).encode()
+
+
+# -----------------------
+# Transporte
+# -----------------------
+class _ClientTransport:
+    """In-process über den Flask-Test-Client (ohne Netzwerk/Server-Overhead)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, logged_in):
+        """Sende-Funktion mit eingeloggter Session bzw. ohne Cookies (neuer Client je Request)."""
+        client = self.app.test_client()
+        if logged_in:
+            client.post("/login", data=ADMIN_LOGIN)
+
+        def send(method, path, content_type=None, body=None):
+            target = client if logged_in else self.app.test_client()
+            resp = target.open(path, method=method, data=body, content_type=content_type)
+            resp.close()
+            return resp.status_code
+
+        return send
+
+    def close(self):
+        pass
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _WsgiTransport:
+    """HTTP gegen einen lokalen wsgiref-Server in einem Hintergrund-Thread."""
+
+    def __init__(self, app):
+        self.server = make_server(
+            "127.0.0.1", 0, app,
+            server_class=_ThreadingWSGIServer, handler_class=_QuietHandler,
+        )
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _request(self, method, path, headers, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            return resp
+        finally:
+            conn.close()
+
+    def session(self, logged_in):
+        headers = {}
+        if logged_in:
+            resp = self._request(
+                "POST", "/login",
+                {"Content-Type": "application/x-www-form-urlencoded"},
+                urlencode(ADMIN_LOGIN).encode(),
+            )
+            cookies = [c.split(";", 1)[0] for c in resp.headers.get_all("Set-Cookie") or ()]
+            headers["Cookie"] = "; ".join(cookies)
+
+        def send(method, path, content_type=None, body=None):
+            request_headers = dict(headers)
+            if content_type:
+                request_headers["Content-Type"] = content_type
+            return self._request(method, path, request_headers, body).status
+
+        return send
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# -----------------------
+# Messung
+# -----------------------
+def run_scenario(transport, name, requests, concurrency, bodies):
+    method, path, body_kind, logged_in, expected = SCENARIOS[name]
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(send, n):
+        local, failed = [], 0
+        for _ in range(n):
+            content_type, body = bodies(body_kind) if body_kind else (None, None)
+            start = time.perf_counter()
+            status = send(method, path, content_type, body)
+            local.append(time.perf_counter() - start)
+            failed += status not in expected
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    # Sessions (inkl. Login) vor dem Start der Zeitmessung anlegen
+    threads = [
+        threading.Thread(target=worker, args=(transport.session(logged_in), n))
+        for n in per_worker if n
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors[0],
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results, baseline_path):
+    """Tabelle mit Veränderung von req/s und p95 gegenüber einer früheren Messung."""
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    before = {(r["transport"], r["scenario"]): r for r in baseline["results"]}
+    table = []
+    for result in results:
+        old = before.get((result["transport"], result["scenario"]))
+        if old is None:
+            continue
+        table.append((
+            result["transport"], result["scenario"],
+            f"{old['rps']:,.1f} → {result['rps']:,.1f}",
+            f"{(result['rps'] / old['rps'] - 1) * 100:+.1f}%",
+            f"{old['p95_ms']:.1f} → {result['p95_ms']:.1f}",
+            f"{(result['p95_ms'] / old['p95_ms'] - 1) * 100:+.1f}%" if old["p95_ms"] else "",
+        ))
+    print(f"\nVergleich mit {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print_table(table, ("transport", "scenario", "req/s", "Δ req/s", "p95 ms", "Δ p95"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--leads", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="vorhandene/neue SQLite-Datei statt einer temporären")
+    parser.add_argument("--requests", type=int, default=200, help="Requests pro Szenario")
+    parser.add_argument("--login-requests", type=int, default=50,
+                        help="Requests für das Login-Szenario (Hashing ist teuer)")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallele Clients")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--transports", default=",".join(TRANSPORTS))
+    parser.add_argument("--output", help="JSON-Datei (Standard: benchmarks/results/<Zeit>-<Commit>.json)")
+    parser.add_argument("--compare", help="frühere JSON-Datei zum Vergleich")
+    args = parser.parse_args()
+
+    keep_db = bool(args.db) and os.path.exists(args.db)
+    app = crm_app(args.db)
+    with app.app_context():
+        if not keep_db:
+            seed_database(args.customers, args.leads, args.seed)
+        rows = {"customers": Customer.query.count(), "leads": Lead.query.count()}
+
+    bodies = _BodyFactory(args.seed)
+    results = []
+    try:
+        for transport_name in args.transports.split(","):
+            transport = _ClientTransport(app) if transport_name == "client" else _WsgiTransport(app)
+            try:
+                for name in args.scenarios.split(","):
+                    requests = args.login_requests if name == "login" else args.requests
+                    result = run_scenario(transport, name, requests, args.concurrency, bodies)
+                    result["transport"] = transport_name
+                    results.append(result)
+            finally:
+                transport.close()
+    finally:
+        app.session_interface.close()
+        if not args.db:
+            remove_db(app)
+
+    print_table(
+        [(r["transport"], r["scenario"], r["requests"], r["errors"], f"{r['rps']:,.1f}",
+          r["p50_ms"], r["p95_ms"], r["p99_ms"], r["peak_rss_mb"]) for r in results],
+        ("transport", "scenario", "requests", "errors", "req/s",
+         "p50 ms", "p95 ms", "p99 ms", "peak RSS MiB"),
+    )
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "customers": rows["customers"],
+            "leads": rows["leads"],
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nErgebnisse gespeichert: {output}")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
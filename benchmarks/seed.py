@@ -0,0 +1,103 @@
+"""
+Deterministische Testdaten für Benchmarks und Lasttests.
+
+Gleicher Seed → gleiche Zeilen, damit Messungen zwischen Commits
+vergleichbar bleiben. Namen, E-Mail-Domains und Firmen stammen aus kleinen
+Wortlisten, so wiederholen sich Tokens wie in echten Daten (wichtig für
+Indizes und Volltextsuche).
+
+    python -m benchmarks.seed --customers 100000 --leads 100000 --db /tmp/crm-100k.db
+"""
+import argparse
+import random
+import time
+
+from models import Customer, Lead
+
+
+FIRST_NAMES = [
+    "Anna", "Ben", "Clara", "David", "Emma", "Felix", "Greta", "Hannah", "Jonas", "Julia",
+    "Karl", "Lena", "Lukas", "Maria", "Max", "Mia", "Noah", "Paul", "Sophie", "Tom",
+]
+LAST_NAMES = [
+    "Bauer", "Becker", "Fischer", "Hoffmann", "Koch", "Meyer", "Müller", "Richter",
+    "Schmidt", "Schneider", "Schulz", "Wagner", "Weber", "Wolf", "Zimmermann",
+]
+COMPANY_WORDS = [
+    "Acme", "Alpha", "Apex", "Blue", "Delta", "Global", "Nova", "Nord", "Orbit",
+    "Prime", "Quantum", "Rhein", "Silver", "Summit", "Vertex",
+]
+COMPANY_SUFFIXES = ["GmbH", "AG", "Corp", "Inc", "Ltd", "Solutions", "Systems"]
+
+
+def _person(rng):
+    """Zufällige, aber reproduzierbare Kontaktdaten (Name, E-Mail, Firma)."""
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    company_word = rng.choice(COMPANY_WORDS)
+    company = f"{company_word} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+    email = f"{first}.{last}@{company_word}.example".lower()
+    return f"{first} {last}", email, company
+
+
+def customer_rows(n, seed=1):
+    rng = random.Random(seed)
+    for i in range(n):
+        name, email, company = _person(rng)
+        yield {
+            "name": name,
+            "email": email,
+            "company": company,
+            "phone": f"555-{i:06d}",
+            "status": rng.choice(("prospect", "active", "inactive")),
+        }
+
+
+def lead_rows(n, seed=2):
+    rng = random.Random(seed)
+    for _ in range(n):
+        name, email, company = _person(rng)
+        yield {
+            "name": name,
+            "email": email,
+            "company": company,
+            "value": float(rng.randrange(1000, 250000, 500)),
+            "source": rng.choice(("Website", "Referral", "Event", "Cold Call")),
+        }
+
+
+def seed_database(customers, leads, seed=0, chunk_size=5000):
+    """
+    Kunden und Leads per bulk_add einfügen (innerhalb eines App-Kontexts).
+    Gibt die Anzahl eingefügter Kunden und Leads zurück.
+    """
+    inserted_customers, errors = Customer.bulk_add(
+        customer_rows(customers, seed=seed * 2 + 1), chunk_size=chunk_size
+    )
+    assert not errors, errors[:3]
+    inserted_leads, errors = Lead.bulk_add(
+        lead_rows(leads, seed=seed * 2 + 2), chunk_size=chunk_size
+    )
+    assert not errors, errors[:3]
+    return inserted_customers, inserted_leads
+
+
+def main():
+    from benchmarks._common import make_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--leads", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", required=True, help="Pfad der SQLite-Datei (wird angelegt)")
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    start = time.perf_counter()
+    with app.app_context():
+        customers, leads = seed_database(args.customers, args.leads, args.seed)
+    print(f"{customers:,} customers, {leads:,} leads in {time.perf_counter() - start:.1f}s → {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
-from models import db, Customer, Lead, User, ROLE_ADMIN, ROLE_USER
+from migrations import migrator
+from models import db, Customer, Lead, User, ROLE_ADMIN, ROLE_USER, DEFAULT_TENANT_ID
+from tenancy import tenant_router
 
 
-def init_db(app):
+def init_db(app, progress=None):
     """
     Initialisiert die Datenbank:
-    - erstellt alle Tabellen über SQLAlchemy (db.create_all)
+    - führt ausstehende Migrationen aus (Tabellen, Spalten, Indizes,
+      Volltextindex und Dublettenschlüssel, siehe migrations.py)
     - legt Demo-User und Demodaten an, falls die Tabellen leer sind
+      (Demodaten gehören dem Standard-Mandanten)
+    progress(version, label, done, total) erhält den Fortschritt der Migrationen.
     """
     # app.app_context() stellt sicher, dass SQLAlchemy die aktuelle Flask-App kennt
     with app.app_context():
-        # Erzeugt alle Tabellen, die in 'models.py' definiert sind
-        db.create_all()
+        migrator.upgrade(progress=progress)
 
         # Falls noch kein User existiert: Admin- und Standard-User anlegen
         if User.query.count() == 0:
@@ -26,32 +30,33 @@ def init_db(app):
             db.session.commit()
 
         # Falls noch keine Kunden/Leads existieren: Beispiel-Datensätze anlegen
-        if Customer.query.count() == 0 and Lead.query.count() == 0:
-            Customer.add_customer(
-                "John Doe", "john@example.com", "Acme Corp", "555-0001", "active"
-            )
-            Customer.add_customer(
-                "Jane Smith",
-                "jane@example.com",
-                "Tech Solutions",
-                "555-0002",
-                "prospect",
-            )
-            Customer.add_customer(
-                "Bob Wilson",
-                "bob@example.com",
-                "Global Industries",
-                "555-0003",
-                "inactive",
-            )
-            Lead.add_lead(
-                "Alice Brown", "alice@example.com", "StartUp Inc", 50000, "Website"
-            )
-            Lead.add_lead(
-                "Charlie Davis",
-                "charlie@example.com",
-                "Enterprise Ltd",
-                100000,
-                "Referral",
-            )
+        with tenant_router.context(DEFAULT_TENANT_ID):
+            if Customer.query.count() == 0 and Lead.query.count() == 0:
+                Customer.add_customer(
+                    "John Doe", "john@example.com", "Acme Corp", "555-0001", "active"
+                )
+                Customer.add_customer(
+                    "Jane Smith",
+                    "jane@example.com",
+                    "Tech Solutions",
+                    "555-0002",
+                    "prospect",
+                )
+                Customer.add_customer(
+                    "Bob Wilson",
+                    "bob@example.com",
+                    "Global Industries",
+                    "555-0003",
+                    "inactive",
+                )
+                Lead.add_lead(
+                    "Alice Brown", "alice@example.com", "StartUp Inc", 50000, "Website"
+                )
+                Lead.add_lead(
+                    "Charlie Davis",
+                    "charlie@example.com",
+                    "Enterprise Ltd",
+                    100000,
+                    "Referral",
+                )
 
@@ -0,0 +1,108 @@
+"""
+Datenbank-Konfiguration: Verbindungs-URI, Connection-Pool und SQLite-Tuning.
+
+- Die URI kommt aus der Umgebung (CRM_DATABASE_URL oder DATABASE_URL),
+  sonst wird die lokale SQLite-Datei crm.db verwendet. PostgreSQL-URIs
+  (postgres://… bzw. postgresql://…) werden ebenfalls unterstützt.
+- Für SQLite werden auf jeder neuen Verbindung PRAGMAs gesetzt: WAL-Modus
+  (Leser blockieren Schreiber nicht mehr), synchronous=NORMAL, busy_timeout
+  (warten statt sofort "database is locked") sowie Page-Cache und mmap.
+- Der Connection-Pool wird passend zur Anzahl Threads pro Worker dimensioniert.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+
+from models import db
+
+DEFAULT_DATABASE_URI = "sqlite:///crm.db"
+
+# PRAGMAs, die auf jeder SQLite-Verbindung gesetzt werden
+DEFAULT_SQLITE_PRAGMAS = {
+    # Write-Ahead-Log: Leser sehen einen konsistenten Snapshot, während geschrieben wird
+    "journal_mode": "WAL",
+    # Im WAL-Modus sicher: fsync nur beim Checkpoint statt bei jedem Commit
+    "synchronous": "NORMAL",
+    # Millisekunden, die auf eine Schreibsperre gewartet wird
+    "busy_timeout": 5000,
+    # Negativ = Größe in KiB → 64 MiB Page-Cache pro Verbindung
+    "cache_size": -64000,
+    # Datenbankdatei bis 256 MiB per mmap lesen (spart read()-Syscalls)
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Standardwerte für den Connection-Pool (je Worker-Prozess)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_OVERFLOW = 20
+DEFAULT_POOL_TIMEOUT = 30
+
+
+def database_uri_from_env(environ=os.environ):
+    """Datenbank-URI aus der Umgebung lesen (mit Fallback auf die lokale SQLite-Datei)."""
+    uri = environ.get("CRM_DATABASE_URL") or environ.get("DATABASE_URL") or DEFAULT_DATABASE_URI
+    # Viele Hoster liefern noch das alte Schema "postgres://", das SQLAlchemy nicht kennt
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def _is_sqlite(uri):
+    return uri.startswith("sqlite:")
+
+
+def _is_sqlite_memory(uri):
+    return _is_sqlite(uri) and uri in ("sqlite://", "sqlite:///:memory:")
+
+
+def configure_database(app):
+    """
+    Datenbank-Einstellungen in die App-Konfiguration schreiben (vor db.init_app).
+    Bereits gesetzte Werte (z.B. aus Tests) werden nicht überschrieben.
+    """
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", database_uri_from_env())
+    app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
+    app.config.setdefault("SQLITE_PRAGMAS", dict(DEFAULT_SQLITE_PRAGMAS))
+
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    engine_options = {}
+    if not _is_sqlite_memory(uri):
+        # In-Memory-SQLite nutzt einen eigenen Pool (eine Verbindung pro Thread)
+        engine_options.update(
+            pool_size=int(os.environ.get("CRM_DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+            max_overflow=int(os.environ.get("CRM_DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)),
+            pool_timeout=DEFAULT_POOL_TIMEOUT,
+        )
+    if not _is_sqlite(uri):
+        # Server-Datenbanken: tote Verbindungen erkennen und regelmäßig erneuern
+        engine_options.update(pool_pre_ping=True, pool_recycle=1800)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options)
+
+
+def init_database(app):
+    """Konfiguration setzen, SQLAlchemy mit der App verbinden und SQLite-Tuning aktivieren."""
+    configure_database(app)
+    db.init_app(app)
+    pragmas = app.config["SQLITE_PRAGMAS"]
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite" and pragmas:
+                event.listen(engine, "connect", sqlite_pragma_listener(pragmas))
+
+
+def sqlite_pragma_listener(pragmas):
+    """Connect-Listener, der die PRAGMAs auf jeder neuen DBAPI-Verbindung setzt."""
+    statements = [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return set_pragmas
@@ -0,0 +1,440 @@
+"""
+Dublettenerkennung für Kunden.
+
+Jeder Kunde bekommt in der Tabelle customer_match_keys einige kurze
+Schlüssel (Primärschlüssel key + customer_id, also nach key indiziert):
+- e:<hash>                normalisierte E-Mail (klein, ohne +Tag, bei Gmail
+                          ohne Punkte), als 64-Bit-BLAKE2-Hash
+- b:<firma>:<namens-präfix> Blocking-Schlüssel: normalisierte Firma (ohne
+                          Rechtsform, "ACME Corporation" → "acme") plus die
+                          ersten drei Buchstaben je Namensbestandteil
+
+Prüfung eines neuen Kunden (find_duplicates): seine Schlüssel werden per
+Index nachgeschlagen, nur die so gefundenen Kandidaten (höchstens
+MAX_CANDIDATES) werden verglichen – Aufwand unabhängig von der Tabellengröße.
+Gleiche E-Mail zählt als sichere Dublette (score 1.0), sonst entscheidet die
+Ähnlichkeit der Namen (Dice-Koeffizient über Buchstaben-Trigramme).
+
+Bericht über die ganze Tabelle (report): die Datenbank gruppiert die
+Schlüssel (Indexscan, O(n log n)) und liefert nur Schlüssel, die mehrere
+Kunden teilen; verglichen wird nur innerhalb dieser Blöcke, nie jeder mit
+jedem. Sehr große Blöcke (mehr als MAX_BLOCK_SIZE Kunden, z.B. sehr häufige
+Namen in einer großen Firma) werden übersprungen und gezählt.
+
+Die Schlüssel werden über Mapper-Events (Einzel-Schreibzugriffe) bzw. das
+Signal rows_flushed (Bulk-Import) in derselben Transaktion gepflegt wie der
+Kunde selbst. rebuild_index() baut sie komplett neu auf.
+
+Die Schlüssel selbst kennen keinen Mandanten; Kandidaten (vor dem Limit)
+und Berichtsblöcke werden über die Kundentabelle auf den Mandanten
+eingeschränkt.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from itertools import groupby
+from operator import itemgetter
+
+from models import Customer, TableVersion, current_tenant_id, db, rows_flushed, tenant_clause
+
+# Verhalten beim Anlegen: nicht prüfen, anlegen + warnen, oder ablehnen
+POLICIES = ("off", "warn", "reject")
+DEFAULT_POLICY = "warn"
+# Mindestähnlichkeit der Namen (0–1) bei gleicher normalisierter Firma
+DEFAULT_THRESHOLD = 0.7
+# Obergrenze für verglichene Kandidaten je Prüfung
+MAX_CANDIDATES = 200
+# Blöcke mit mehr Kunden werden im Bericht übersprungen
+MAX_BLOCK_SIZE = 50
+DEFAULT_REPORT_LIMIT = 100
+MAX_REPORT_LIMIT = 1000
+
+# Rechtsformen und Füllwörter, die bei Firmennamen ignoriert werden
+LEGAL_SUFFIXES = frozenset((
+    "ag", "and", "bv", "co", "company", "corp", "corporation", "gmbh", "group",
+    "inc", "incorporated", "kg", "limited", "llc", "ltd", "plc", "sa", "srl", "the",
+))
+
+_WORD_RE = re.compile(r"[^\W_]+")
+# Schlüssel sind höchstens so lang (Spaltenbreite)
+_MAX_KEY_LENGTH = 100
+
+
+class MatchKey(db.Model):
+    """Such-/Blocking-Schlüssel eines Kunden (siehe Modul-Docstring)."""
+    __tablename__ = 'customer_match_keys'
+    # SQLite: Tabelle ist selbst der Primärschlüssel-Index (kein zusätzlicher B-Baum)
+    __table_args__ = {'sqlite_with_rowid': False}
+    key = db.Column(db.String(_MAX_KEY_LENGTH), primary_key=True)
+    customer_id = db.Column(db.Integer, primary_key=True, index=True)
+
+
+# -----------------------
+# Normalisierung
+# -----------------------
+def _words(text):
+    """Kleingeschriebene Wörter ohne Akzente und Satzzeichen ("Zoë-Ann" → zoe, ann)."""
+    folded = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return _WORD_RE.findall(folded.lower())
+
+
+def normalize_email(email):
+    """E-Mail vergleichbar machen: klein, ohne +Tag, Gmail ohne Punkte im lokalen Teil."""
+    email = str(email or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at:
+        return email
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def email_hash(email):
+    return hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def normalize_company(company):
+    """Firmenname ohne Rechtsform und Satzzeichen ("ACME Corporation" → "acme")."""
+    words = _words(company)
+    core = [word for word in words if word not in LEGAL_SUFFIXES]
+    return " ".join(core or words)
+
+
+def normalize_name(name):
+    return " ".join(_words(name))
+
+
+def _email_key(email):
+    return f"e:{email_hash(email)}"
+
+
+def match_keys(name, email, company):
+    """Alle Schlüssel eines Kunden (ohne Wiederholungen)."""
+    keys = {_email_key(email)}
+    company_key = normalize_company(company)[:_MAX_KEY_LENGTH - 8]
+    for word in _words(name):
+        if len(word) >= 2:
+            keys.add(f"b:{company_key}:{word[:3]}")
+    return keys
+
+
+def _trigrams(normalized_name):
+    grams = set()
+    for word in normalized_name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _dice(grams_a, grams_b):
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def name_similarity(a, b):
+    """Dice-Koeffizient der Trigramme zweier normalisierter Namen (0–1)."""
+    return _dice(_trigrams(a), _trigrams(b))
+
+
+def _compare(a, b, threshold):
+    """(score, Grund) für zwei Kunden-Dicts oder None, falls keine Dublette."""
+    if a["_email"] == b["_email"]:
+        return 1.0, "email"
+    if a["_company"] != b["_company"]:
+        return None
+    score = _dice(a["_grams"], b["_grams"])
+    return (round(score, 3), "name+company") if score >= threshold else None
+
+
+def _prepare(customer_id, name, email, company):
+    """Kunden-Dict samt normalisierter Vergleichswerte (Schlüssel mit "_")."""
+    normalized_name = normalize_name(name)
+    return {
+        "id": customer_id,
+        "name": name,
+        "email": email,
+        "company": company,
+        "_email": normalize_email(email),
+        "_company": normalize_company(company),
+        "_name": normalized_name,
+        "_grams": _trigrams(normalized_name),
+    }
+
+
+def _public(customer):
+    return {key: value for key, value in customer.items() if not key.startswith("_")}
+
+
+class DuplicateDetector:
+    """Dublettenprüfung beim Anlegen und gecachter Bericht über die ganze Tabelle."""
+
+    def __init__(self, policy=DEFAULT_POLICY, threshold=DEFAULT_THRESHOLD):
+        self.policy = policy
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # (Tabellenversion, limit) → Bericht; nur der zuletzt berechnete
+        self._report = None
+        self.checks = 0
+        self.matches = 0
+
+    def init_app(self, app):
+        """Verhalten und Schwellwert aus der App-Konfiguration übernehmen."""
+        self.policy = app.config.get("CUSTOMER_DUPLICATE_POLICY", DEFAULT_POLICY)
+        if self.policy not in POLICIES:
+            raise ValueError(f"CUSTOMER_DUPLICATE_POLICY must be one of: {', '.join(POLICIES)}.")
+        self.threshold = app.config.get("CUSTOMER_DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD)
+
+    # -----------------------
+    # Prüfung einzelner Kunden
+    # -----------------------
+    def find_duplicates(self, name, email, company, exclude_id=None, limit=5):
+        """
+        Mögliche Dubletten eines (neuen) Kunden, beste zuerst: Liste von
+        Dicts mit id, name, email, company, score und reason.
+        """
+        email_key = _email_key(email)
+        blocking_keys = match_keys(name, email, company) - {email_key}
+        # Join auf die Kunden: der Mandantenfilter der Session greift schon
+        # vor dem LIMIT, Kunden anderer Teams verdrängen keine Kandidaten
+        candidates = db.select(MatchKey.customer_id).join(
+            Customer, Customer.id == MatchKey.customer_id
+        )
+        # Gleiche E-Mail immer prüfen, Blocking-Kandidaten nur bis MAX_CANDIDATES
+        ids = set(db.session.scalars(candidates.where(MatchKey.key == email_key)))
+        ids.update(db.session.scalars(
+            candidates.where(MatchKey.key.in_(blocking_keys))
+            .distinct()
+            .limit(MAX_CANDIDATES)
+        ))
+        ids.discard(exclude_id)
+        stmt = db.select(Customer.id, Customer.name, Customer.email, Customer.company).where(
+            Customer.id.in_(ids)
+        )
+
+        new = _prepare(None, name, email, company)
+        matches = []
+        for row in db.session.execute(stmt):
+            candidate = _prepare(*row)
+            result = _compare(new, candidate, self.threshold)
+            if result is not None:
+                matches.append(dict(_public(candidate), score=result[0], reason=result[1]))
+        matches.sort(key=lambda match: (-match["score"], match["id"]))
+        with self._lock:
+            self.checks += 1
+            self.matches += bool(matches)
+        return matches[:limit]
+
+    # -----------------------
+    # Bericht
+    # -----------------------
+    def report(self, limit=DEFAULT_REPORT_LIMIT):
+        """
+        Dublettengruppen aller Kunden des Mandanten (größte zuerst), gecacht
+        pro Mandant und Version der Kundentabelle. Gruppen entstehen
+        transitiv aus allen Paaren über dem Schwellwert.
+        """
+        version = TableVersion.get_versions([Customer.__tablename__])[Customer.__tablename__][0]
+        key = (current_tenant_id(), version, limit, self.threshold)
+        with self._lock:
+            if self._report is not None and self._report[0] == key:
+                return self._report[1]
+        report = self._build_report(limit)
+        report["version"] = version
+        with self._lock:
+            self._report = (key, report)
+        return report
+
+    def _build_report(self, limit):
+        # Explizit gefiltert: in Unterabfragen greift der Mandantenfilter der Session nicht
+        block_sizes = (
+            db.select(MatchKey.key)
+            .join(Customer, Customer.id == MatchKey.customer_id)
+            .where(tenant_clause(Customer))
+            .group_by(MatchKey.key)
+            .having(db.func.count() > 1)
+        )
+        shared = block_sizes.having(db.func.count() <= MAX_BLOCK_SIZE).subquery()
+        skipped = db.session.execute(
+            db.select(db.func.count()).select_from(
+                block_sizes.having(db.func.count() > MAX_BLOCK_SIZE).subquery()
+            )
+        ).scalar()
+        rows = db.session.execute(
+            db.select(MatchKey.key, Customer.id, Customer.name, Customer.email, Customer.company)
+            .join(shared, shared.c.key == MatchKey.key)
+            .join(Customer, Customer.id == MatchKey.customer_id)
+            .order_by(MatchKey.key, Customer.id)
+        )
+
+        customers = {}
+        parent = {}
+        best = {}
+
+        def find(customer_id):
+            while parent[customer_id] != customer_id:
+                parent[customer_id] = parent[parent[customer_id]]
+                customer_id = parent[customer_id]
+            return customer_id
+
+        def link(a, b, score, reason):
+            for customer in (a, b):
+                parent.setdefault(customer["id"], customer["id"])
+                old_score, reasons = best.get(customer["id"], (0.0, set()))
+                reasons.add(reason)
+                best[customer["id"]] = (max(old_score, score), reasons)
+            root_a, root_b = find(a["id"]), find(b["id"])
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        compared = set()
+        similarities = {}
+        blocks = 0
+        for _, members in groupby(rows, key=itemgetter(0)):
+            blocks += 1
+            # Gleiche E-Mail bzw. gleicher Name bei gleicher Firma sind ohne
+            # Vergleich Dubletten; paarweise verglichen werden nur die übrigen
+            # Vertreter – bei vielen identischen Einträgen bleibt der Block klein
+            by_email, by_signature = {}, {}
+            for row in members:
+                customer = customers.get(row.id)
+                if customer is None:
+                    customer = customers[row.id] = _prepare(*row[1:])
+                first = by_email.setdefault(customer["_email"], customer)
+                if first is not customer:
+                    link(first, customer, 1.0, "email")
+                first = by_signature.setdefault((customer["_company"], customer["_name"]), customer)
+                if first is not customer:
+                    link(first, customer, 1.0, "name+company")
+            # Namen vergleichen nur innerhalb derselben normalisierten Firma
+            by_company = {}
+            for (company, _), customer in by_signature.items():
+                by_company.setdefault(company, []).append(customer)
+            for representatives in by_company.values():
+                for i, a in enumerate(representatives):
+                    for b in representatives[i + 1:]:
+                        if (a["id"], b["id"]) in compared:
+                            continue
+                        compared.add((a["id"], b["id"]))
+                        # Häufige Namen kommen in vielen Firmen vor → Ähnlichkeit je Namenspaar merken
+                        names = (a["_name"], b["_name"])
+                        score = similarities.get(names)
+                        if score is None:
+                            score = similarities[names] = _dice(a["_grams"], b["_grams"])
+                        if score >= self.threshold:
+                            link(a, b, round(score, 3), "name+company")
+
+        groups = {}
+        for customer_id in parent:
+            groups.setdefault(find(customer_id), []).append(customer_id)
+        ordered = sorted(groups.values(), key=lambda ids: (-len(ids), min(ids)))
+        result = []
+        for ids in ordered[:limit]:
+            ids.sort()
+            reasons = set().union(*(best[customer_id][1] for customer_id in ids))
+            result.append({
+                "customers": [_public(customers[customer_id]) for customer_id in ids],
+                "score": max(best[customer_id][0] for customer_id in ids),
+                "reasons": sorted(reasons),
+            })
+        return {
+            "groups": result,
+            "total_groups": len(groups),
+            "duplicate_customers": len(parent),
+            "blocks_compared": blocks,
+            "pairs_compared": len(compared),
+            "blocks_skipped": skipped,
+        }
+
+    # -----------------------
+    # Index-Pflege
+    # -----------------------
+    def rebuild_index(self, batch_size=5000):
+        """Alle Schlüssel aus der Kundentabelle neu berechnen (eigene Transaktion)."""
+        db.session.execute(db.delete(MatchKey))
+        stmt = db.select(Customer.id, Customer.name, Customer.email, Customer.company)
+        batch = []
+        for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+            batch.extend(_key_rows(row.id, row.name, row.email, row.company))
+            if len(batch) >= batch_size:
+                db.session.execute(db.insert(MatchKey), batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(MatchKey), batch)
+        db.session.commit()
+        with self._lock:
+            self._report = None
+
+    def index_missing(self, lower, upper):
+        """
+        Schlüssel für Kunden lower < id <= upper anlegen, die noch keine haben
+        (in der laufenden Transaktion; Backfill in Migration 4).
+        """
+        has_keys = db.select(MatchKey.customer_id).where(MatchKey.customer_id == Customer.id).exists()
+        rows = db.session.execute(
+            db.select(Customer.id, Customer.name, Customer.email, Customer.company)
+            .where(Customer.id > lower, Customer.id <= upper, ~has_keys)
+        ).all()
+        keys = [key for row in rows for key in _key_rows(row.id, row.name, row.email, row.company)]
+        if keys:
+            db.session.execute(db.insert(MatchKey), keys)
+        with self._lock:
+            self._report = None
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            return {"checks": self.checks, "checks_with_matches": self.matches}
+
+
+# Prozessweite Instanz
+duplicate_detector = DuplicateDetector()
+
+
+# -----------------------
+# Pflege der Schlüssel
+# -----------------------
+def _key_rows(customer_id, name, email, company):
+    return [{"key": key, "customer_id": customer_id} for key in match_keys(name, email, company)]
+
+
+def _after_insert(mapper, connection, target):
+    connection.execute(
+        db.insert(MatchKey), _key_rows(target.id, target.name, target.email, target.company)
+    )
+
+
+def _after_update(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in ("name", "email", "company")):
+        return
+    connection.execute(db.delete(MatchKey).where(MatchKey.customer_id == target.id))
+    _after_insert(mapper, connection, target)
+
+
+def _after_delete(mapper, connection, target):
+    connection.execute(db.delete(MatchKey).where(MatchKey.customer_id == target.id))
+
+
+db.event.listen(Customer, 'after_insert', _after_insert)
+db.event.listen(Customer, 'after_update', _after_update)
+db.event.listen(Customer, 'after_delete', _after_delete)
+
+
+@rows_flushed.connect_via(Customer)
+def _on_rows_flushed(model, rows, **extra):
+    # Bulk-Insert liefert keine IDs → über die im Block vergebenen row_versions nachschlagen
+    versions = [row["row_version"] for row in rows]
+    ids = dict(db.session.execute(
+        db.select(Customer.row_version, Customer.id)
+        .where(Customer.tenant_id == rows[0]["tenant_id"],
+               Customer.row_version.between(min(versions), max(versions)))
+    ).all())
+    key_rows = []
+    for row in rows:
+        key_rows.extend(_key_rows(ids[row["row_version"]], row["name"], row["email"], row["company"]))
+    # Sortiert einfügen: benachbarte Schlüssel landen auf denselben Indexseiten
+    key_rows.sort(key=itemgetter("key"))
+    db.session.execute(db.insert(MatchKey), key_rows)
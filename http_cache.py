@@ -0,0 +1,144 @@
+"""
+Conditional GET (ETag / Last-Modified) auf Basis der Tabellenversionen.
+
+Jede Schreibmethode in models.py erhöht die Version ihrer Tabelle
+(TableVersion). Daraus entsteht pro Request ein starker ETag:
+- Tabellenversionen + Pfad mit Query-String (Filter/Paging ändern den Body)
+- Mandant des Requests (gleiche URL, andere Zeilen; schützt auch den Body-Cache)
+- bei HTML-Seiten zusätzlich User-ID und Rolle (Navigation ist personalisiert)
+Stimmt If-None-Match bzw. If-Modified-Since, antwortet die App mit 304,
+ohne die Zeilen zu laden oder zu serialisieren. Optional werden fertig
+serialisierte JSON-Bodies im Speicher gehalten (Schlüssel: ETag), sodass
+auch Clients ohne eigenen Cache nur einmal pro Version serialisieren lassen.
+
+Unter SQLite/WAL liest die Versionsabfrage im selben Lese-Snapshot wie die
+anschließenden Datenabfragen des Requests – ETag und Body passen zusammen.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+from flask import Response, make_response, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+from models import TableVersion, current_tenant_id
+
+# Anzahl gecachter JSON-Bodies (0 = Body-Cache aus)
+DEFAULT_BODY_CACHE_SIZE = 64
+# Bodies darüber werden nicht gecacht (Bytes)
+DEFAULT_BODY_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+
+class BodyCache:
+    """LRU-Cache: ETag → (Body-Bytes, Mimetype)."""
+
+    def __init__(self, max_entries=DEFAULT_BODY_CACHE_SIZE, max_bytes=DEFAULT_BODY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Größe aus der App-Konfiguration übernehmen."""
+        self.max_entries = app.config.get("HTTP_BODY_CACHE_SIZE", DEFAULT_BODY_CACHE_SIZE)
+        self.max_bytes = app.config.get("HTTP_BODY_CACHE_MAX_BYTES", DEFAULT_BODY_CACHE_MAX_BYTES)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        if not self.max_entries or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = (body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "bytes": sum(len(body) for body, _ in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Prozessweite Instanz
+body_cache = BodyCache()
+
+
+def _etag(tables, versions, per_user):
+    parts = [request.full_path]
+    parts.extend(f"{name}:{versions[name][0]}" for name in tables)
+    parts.append(f"tenant:{current_tenant_id()}")
+    if per_user:
+        parts.append(f"user:{current_user.get_id()}:{getattr(current_user, 'role', '')}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _last_modified(versions):
+    stamps = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    if not stamps:
+        return None
+    return max(stamps).replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def conditional_response(tables, build, per_user=False, cache_body=False):
+    """
+    Antwort mit ETag/Last-Modified erzeugen; bei passendem If-None-Match /
+    If-Modified-Since direkt 304 ohne `build()` aufzurufen.
+
+    tables:     Tabellen, deren Inhalt im Body steckt
+    build:      Funktion, die die eigentliche Antwort liefert
+    per_user:   Body hängt vom eingeloggten User ab (HTML-Seiten)
+    cache_body: serialisierten Body im BodyCache ablegen (nur bei 200, nicht gestreamt)
+    """
+    versions = TableVersion.get_versions(tables)
+    etag = _etag(tables, versions, per_user)
+    last_modified = _last_modified(versions)
+
+    # Offene Flash-Nachrichten müssen gerendert werden – dann nie 304
+    if "_flashes" not in session and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+    else:
+        cached = body_cache.get(etag) if cache_body else None
+        if cached is not None:
+            body, mimetype = cached
+            response = Response(body, mimetype=mimetype)
+        else:
+            response = make_response(build())
+            if (cache_body and response.status_code == 200
+                    and not response.is_streamed and not response.headers.get("Set-Cookie")):
+                body_cache.put(etag, response.get_data(), response.mimetype)
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients dürfen speichern, müssen aber bei jedem Abruf revalidieren
+    response.headers["Cache-Control"] = "private, no-cache" if per_user else "no-cache"
+    if per_user:
+        response.vary.add("Cookie")
+    return response
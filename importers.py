@@ -0,0 +1,91 @@
+"""Einlesen von Import-Daten (JSON-Array, NDJSON, CSV) für die Bulk-Endpunkte und Import-Jobs."""
+import codecs
+import csv
+import json
+
+# Content-Types, die die Bulk-Endpunkte verstehen
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+class UnsupportedFormat(ValueError):
+    """Der Request-Body hat ein Format, das nicht importiert werden kann."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        # 400 = Body kaputt, 415 = Content-Type wird nicht unterstützt
+        self.status_code = status_code
+
+
+def iter_records(req):
+    """
+    Datensätze aus dem Body eines Flask-Requests lesen.
+    Gibt einen Iterator über Dicts zurück; NDJSON und CSV werden dabei
+    zeilenweise direkt vom Eingabestrom gelesen, sodass auch sehr große
+    Uploads nicht komplett im Speicher landen.
+    Nicht lesbare NDJSON-Zeilen werden als None geliefert, damit sie im
+    Fehlerbericht mit ihrer Zeilennummer auftauchen.
+    """
+    check_mimetype(req.mimetype)
+    if req.mimetype in JSON_TYPES:
+        return _json_array(req.get_json(silent=True))
+    return _iter_stream(req.mimetype, req.stream)
+
+
+def iter_file_records(fh, mimetype):
+    """Wie iter_records, aber aus einer binär geöffneten Datei (z.B. Import-Job)."""
+    check_mimetype(mimetype)
+    if mimetype in JSON_TYPES:
+        try:
+            payload = json.load(codecs.getreader("utf-8-sig")(fh))
+        except ValueError:
+            payload = None
+        return _json_array(payload)
+    return _iter_stream(mimetype, fh)
+
+
+def check_mimetype(mimetype):
+    """UnsupportedFormat (415), wenn der Content-Type nicht importiert werden kann."""
+    if mimetype not in JSON_TYPES + NDJSON_TYPES + CSV_TYPES:
+        raise UnsupportedFormat(
+            "Content-Type must be application/json, application/x-ndjson or text/csv.",
+            status_code=415,
+        )
+
+
+def _json_array(payload):
+    if not isinstance(payload, list):
+        raise UnsupportedFormat("JSON body must be an array of objects.")
+    return iter(payload)
+
+
+def _iter_stream(mimetype, stream):
+    if mimetype in NDJSON_TYPES:
+        return _iter_ndjson(_text_lines(stream))
+    return csv.DictReader(_text_lines(stream))
+
+
+def _text_lines(stream):
+    """Einen binären Eingabestrom zeilenweise als UTF-8-Text dekodieren."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for block in iter(lambda: stream.read(64 * 1024), b""):
+        pending += decoder.decode(block)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _iter_ndjson(lines):
+    """NDJSON-Zeilen parsen; Leerzeilen werden übersprungen."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
@@ -0,0 +1,311 @@
+"""
+Performance-Messung pro Request, Slow-Query-Log und Prometheus-Endpunkt.
+
+Erfasst je Endpoint:
+- Request-Latenz (Histogramm) und Anzahl Requests je Statuscode
+- Anzahl und Gesamtdauer der SQL-Abfragen pro Request
+  (SQLAlchemy-Events before/after_cursor_execute auf allen Engines)
+- Render-Zeit der Templates (Flask-Signale before_render_template/template_rendered)
+
+Abfragen über SLOW_QUERY_THRESHOLD_MS landen mit Parametern und
+EXPLAIN-Plan im Logger "crm.slow_query". Die Zahlen stehen unter /metrics
+im Prometheus-Textformat bereit; jede Antwort bekommt zusätzlich einen
+Server-Timing-Header (app, db, tpl) für die Browser-Devtools.
+
+Die Werte gelten pro Prozess – bei mehreren Workern summiert Prometheus
+beim Scrapen der einzelnen Instanzen.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from flask import (
+    Response,
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+
+from models import db
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (wie prometheus_client)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+DEFAULT_SLOW_QUERY_MS = 100
+# Letzte langsame Abfragen, die im Speicher gehalten werden
+SLOW_QUERY_HISTORY = 100
+
+slow_query_log = logging.getLogger("crm.slow_query")
+
+
+class Histogram:
+    """Kumulatives Histogramm je Label-Kombination (Prometheus-Semantik)."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            # [Zähler je Bucket + "+Inf", Summe]
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _format_labels(("le",), (_format_bound(bound),))
+                lines.append(f"{self.name}_bucket{_merge_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monoton steigender Zähler je Label-Kombination."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = defaultdict(float)
+
+    def inc(self, label_values=(), amount=1):
+        self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _merge_labels(labels, extra):
+    if not labels:
+        return extra
+    return labels[:-1] + "," + extra[1:]
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+class Instrumentation:
+    """Sammelt Request-, SQL- und Template-Metriken einer Flask-App."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = Histogram(
+            "crm_http_request_duration_seconds", "Request latency per endpoint.",
+            ("endpoint", "method"), LATENCY_BUCKETS,
+        )
+        self.requests = Counter(
+            "crm_http_requests_total", "Requests per endpoint and status code.",
+            ("endpoint", "method", "status"),
+        )
+        self.request_queries = Histogram(
+            "crm_http_request_sql_queries", "SQL queries per request.",
+            ("endpoint",), QUERY_COUNT_BUCKETS,
+        )
+        self.request_sql_time = Histogram(
+            "crm_http_request_sql_duration_seconds", "SQL time per request.",
+            ("endpoint",), LATENCY_BUCKETS,
+        )
+        self.template_time = Histogram(
+            "crm_template_render_duration_seconds", "Template render time.",
+            ("template",), LATENCY_BUCKETS,
+        )
+        self.queries = Counter("crm_sql_queries_total", "SQL statements executed.")
+        self.slow_queries = Counter(
+            "crm_sql_slow_queries_total", "SQL statements over the slow-query threshold."
+        )
+        self.recent_slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+        # Name → Funktion, die ein Dict mit Zahlenwerten liefert (z.B. Cache-Statistik)
+        self._collectors = {}
+        self.slow_query_seconds = DEFAULT_SLOW_QUERY_MS / 1000
+        self.explain_slow_queries = True
+        self.server_timing = True
+
+    def init_app(self, app):
+        """Hooks, SQL-Events und die /metrics-Route registrieren."""
+        self.slow_query_seconds = app.config.get("SLOW_QUERY_THRESHOLD_MS", DEFAULT_SLOW_QUERY_MS) / 1000
+        self.explain_slow_queries = app.config.get("SLOW_QUERY_EXPLAIN", True)
+        self.server_timing = app.config.get("SERVER_TIMING_HEADER", True)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+    def instrument_engine(self, engine):
+        """SQL-Zeiten und Slow-Query-Log für eine Engine (auch spätere, z.B. Read-Replicas)."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def register_collector(self, name, collect):
+        """Zusätzliche Kennzahlen (Dict → Gauges crm_<name>_<key>) für /metrics."""
+        self._collectors[name] = collect
+
+    # -----------------------
+    # Request-Hooks
+    # -----------------------
+    def _before_request(self):
+        g._perf = {"start": time.perf_counter(), "queries": 0, "sql": 0.0, "tpl": 0.0, "tpl_stack": []}
+
+    def _after_request(self, response):
+        perf = g.pop("_perf", None)
+        if perf is None:
+            return response
+        elapsed = time.perf_counter() - perf["start"]
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            self.request_latency.observe((endpoint, request.method), elapsed)
+            self.requests.inc((endpoint, request.method, response.status_code))
+            self.request_queries.observe((endpoint,), perf["queries"])
+            self.request_sql_time.observe((endpoint,), perf["sql"])
+        if self.server_timing:
+            response.headers.add(
+                "Server-Timing",
+                f"app;dur={elapsed * 1000:.1f}, "
+                f'db;dur={perf["sql"] * 1000:.1f};desc="{perf["queries"]} queries", '
+                f'tpl;dur={perf["tpl"] * 1000:.1f}',
+            )
+        return response
+
+    def _before_render(self, app, template, context, **extra):
+        perf = g.get("_perf") if has_request_context() else None
+        if perf is not None:
+            perf["tpl_stack"].append(time.perf_counter())
+
+    def _after_render(self, app, template, context, **extra):
+        perf = g.get("_perf") if has_request_context() else None
+        if perf is None or not perf["tpl_stack"]:
+            return
+        elapsed = time.perf_counter() - perf["tpl_stack"].pop()
+        # Bei verschachteltem render_template nur die äußere Zeit zählen
+        if not perf["tpl_stack"]:
+            perf["tpl"] += elapsed
+        with self._lock:
+            self.template_time.observe((template.name or "<string>",), elapsed)
+
+    # -----------------------
+    # SQL-Events
+    # -----------------------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Startzeit am Ausführungskontext statt als Stapel in conn.info: schlägt
+        # das Statement fehl, bleibt so nichts liegen (after_cursor_execute entfällt)
+        context._perf_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._perf_query_start
+        if has_request_context():
+            perf = g.get("_perf")
+            if perf is not None:
+                perf["queries"] += 1
+                perf["sql"] += elapsed
+        with self._lock:
+            self.queries.inc()
+        if elapsed >= self.slow_query_seconds:
+            self._log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+    def _log_slow_query(self, conn, statement, parameters, executemany, elapsed):
+        plan = None
+        if self.explain_slow_queries and not executemany:
+            plan = _explain(conn, statement, parameters)
+        entry = {
+            "duration_ms": round(elapsed * 1000, 1),
+            "statement": statement,
+            "parameters": repr(parameters)[:500],
+            "plan": plan,
+            "endpoint": request.endpoint if has_request_context() else None,
+        }
+        with self._lock:
+            self.slow_queries.inc()
+            self.recent_slow_queries.append(entry)
+        slow_query_log.warning(
+            "slow query (%.1f ms, endpoint=%s): %s\nparameters: %s\nplan:\n%s",
+            entry["duration_ms"], entry["endpoint"], statement, entry["parameters"],
+            plan or "-",
+        )
+
+    # -----------------------
+    # /metrics
+    # -----------------------
+    def render_metrics(self):
+        with self._lock:
+            lines = []
+            for metric in (
+                self.request_latency, self.requests, self.request_queries,
+                self.request_sql_time, self.template_time, self.queries, self.slow_queries,
+            ):
+                lines.extend(metric.render())
+        for name, collect in sorted(self._collectors.items()):
+            for key, value in sorted(collect().items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"crm_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        """Prometheus-Textformat (Version 0.0.4)."""
+        return Response(self.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def _explain(conn, statement, parameters):
+    """EXPLAIN-Plan einer SELECT-Abfrage über einen eigenen DBAPI-Cursor (ohne Events)."""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as exc:  # Plan ist nur Zusatzinfo – niemals den Request stören
+        return f"EXPLAIN failed: {exc}"
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail) → detail
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+
+# Prozessweite Instanz
+instrumentation = Instrumentation()
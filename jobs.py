@@ -0,0 +1,575 @@
+"""
+Hintergrund-Jobs für lang laufende Arbeiten (Import, Export, Index-Neuaufbau).
+
+- Jobs liegen persistent in der Tabelle 'jobs' und überstehen damit
+  Neustarts; jeder Worker-Prozess startet beim ersten Request JOB_WORKERS
+  Threads, die wartende Jobs per bedingtem UPDATE für sich beanspruchen
+  (funktioniert auch mit mehreren Prozessen auf derselben Datenbank).
+- Fehlgeschlagene Jobs werden bis JOB_MAX_ATTEMPTS mal mit exponentiellem
+  Backoff wiederholt. Der Worker schreibt während der Ausführung
+  regelmäßig einen Heartbeat (auch wenn der Handler keinen Fortschritt
+  meldet). Jobs, deren Worker abgestürzt ist (kein Heartbeat seit
+  JOB_STALE_AFTER Sekunden), werden erneut eingeplant – oder als
+  fehlgeschlagen markiert, wenn keine Versuche mehr übrig sind (z.B.
+  Importe, die nicht wiederholt werden dürfen).
+- Fortschritt (erledigt/gesamt) wird während der Ausführung gespeichert
+  und kann über /api/jobs/<id> abgefragt werden; Ergebnisdateien (Exporte)
+  liegen in JOB_RESULT_DIR und werden nach JOB_RESULT_TTL Sekunden gelöscht.
+- Ein Job gehört dem Mandanten seines Auftraggebers und läuft in dessen
+  Kontext; /api/jobs zeigt nur Jobs des eigenen Mandanten. Wartungs-Jobs
+  (Index-Neuaufbau, Migrationen) laufen ohne Mandantenfilter.
+"""
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from flask import g
+from sqlalchemy.exc import OperationalError
+
+import search
+import serializers
+from dedup import duplicate_detector
+from importers import iter_file_records
+from migrations import migrator
+from models import (
+    BULK_CHUNK_SIZE,
+    MAX_BULK_CHUNK_SIZE,
+    Customer,
+    Lead,
+    TenantScoped,
+    db,
+    parse_list_args,
+    unscoped,
+    utcnow,
+)
+from tenancy import tenant_router
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+# Höchstens so viele wartende Jobs, danach lehnt submit() ab
+DEFAULT_QUEUE_LIMIT = 100
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_STALE_AFTER = 300
+DEFAULT_RESULT_TTL = 24 * 3600
+# Fortschritt höchstens alle x Sekunden in die Datenbank schreiben
+PROGRESS_INTERVAL = 0.5
+# Heartbeat laufender Jobs: so viele Schreibvorgänge pro JOB_STALE_AFTER
+HEARTBEATS_PER_STALE_PERIOD = 4
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "json": ("application/json", ".json"),
+}
+# model-Parameter → Modell und Zeilen-Generator
+JOB_MODELS = {
+    "customers": (Customer, Customer.iter_customer_rows),
+    "leads": (Lead, Lead.iter_lead_rows),
+}
+
+
+class JobRejected(ValueError):
+    """Job kann nicht angenommen werden (ungültige Parameter oder Warteschlange voll)."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Job(TenantScoped, db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    type = db.Column(db.String(40), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    params = db.Column(db.Text, nullable=False, default='{}')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=DEFAULT_MAX_ATTEMPTS)
+    progress_done = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    result_path = db.Column(db.String(500))
+    input_path = db.Column(db.String(500))
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    run_after = db.Column(db.DateTime, nullable=False, default=utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+        db.Index('ix_jobs_tenant_created', 'tenant_id', 'created_at'),
+        # Warteschlange für alle Mandanten in der primären Datenbank
+        {'info': {'shared': True}},
+    )
+
+    def to_dict(self):
+        """Status eines Jobs für die API."""
+        percent = None
+        if self.progress_total:
+            percent = round(100.0 * self.progress_done / self.progress_total, 1)
+        elif self.status == 'succeeded':
+            percent = 100.0
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "params": json.loads(self.params),
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "progress": {"done": self.progress_done, "total": self.progress_total, "percent": percent},
+            "error": self.error,
+            "result": json.loads(self.result) if self.result else None,
+            "has_file": bool(self.result_path) and self.status == 'succeeded',
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+        }
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+class JobContext:
+    """Wird an Job-Handler übergeben: Parameter, Dateipfade und Fortschritt."""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job.id
+        self.params = json.loads(job.params)
+        self.input_path = job.input_path
+        self._last_progress = 0.0
+
+    def result_path(self, suffix):
+        return os.path.join(self.queue.result_dir, f"{self.id}{suffix}")
+
+    def progress(self, done, total=None, force=False):
+        """Fortschritt melden (gedrosselt; zählt auch als Heartbeat)."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        values = {"progress_done": done, "heartbeat_at": utcnow()}
+        if total is not None:
+            values["progress_total"] = total
+        try:
+            self.queue._update(self.id, **values)
+        except OperationalError:
+            # Fortschritt ist nur Information – eine gesperrte DB darf den Job nicht abbrechen
+            pass
+
+
+class JobQueue:
+    """Persistente Job-Warteschlange mit Thread-Pool pro Prozess."""
+
+    def __init__(self):
+        self._handlers = {}
+        self._app = None
+        self._threads = []
+        self._threads_pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.workers = DEFAULT_WORKERS
+        self.max_attempts = DEFAULT_MAX_ATTEMPTS
+        self.queue_limit = DEFAULT_QUEUE_LIMIT
+        self.poll_interval = DEFAULT_POLL_INTERVAL
+        self.stale_after = DEFAULT_STALE_AFTER
+        self.result_ttl = DEFAULT_RESULT_TTL
+        self.result_dir = None
+        self._last_maintenance = 0.0
+
+    def init_app(self, app):
+        """Konfiguration übernehmen; Worker starten beim ersten Request des Prozesses."""
+        self._app = app
+        self.workers = app.config.get("JOB_WORKERS", DEFAULT_WORKERS)
+        self.max_attempts = app.config.get("JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        self.queue_limit = app.config.get("JOB_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT)
+        self.poll_interval = app.config.get("JOB_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)
+        self.stale_after = app.config.get("JOB_STALE_AFTER", DEFAULT_STALE_AFTER)
+        self.result_ttl = app.config.get("JOB_RESULT_TTL", DEFAULT_RESULT_TTL)
+        self.result_dir = app.config.get(
+            "JOB_RESULT_DIR", os.path.join(app.instance_path, "job-results")
+        )
+        os.makedirs(self.result_dir, exist_ok=True)
+        app.before_request(self.ensure_workers)
+
+    def handler(self, job_type, admin_only=False, prepare=None, retry=True, scoped=True):
+        """
+        Decorator: Funktion (JobContext) → Ergebnis-Dict als Job-Typ registrieren.
+        prepare(params) prüft/ergänzt die Parameter beim Einreichen (ValueError → 400).
+        retry=False für Jobs, die bei Wiederholung doppelt schreiben würden.
+        scoped=False für Wartung über die Daten aller Mandanten.
+        """
+        def register(fn):
+            self._handlers[job_type] = (fn, admin_only, prepare, retry, scoped)
+            return fn
+        return register
+
+    @property
+    def job_types(self):
+        return tuple(self._handlers)
+
+    def requires_admin(self, job_type):
+        return job_type in self._handlers and self._handlers[job_type][1]
+
+    # -----------------------
+    # Einreichen / Abfragen
+    # -----------------------
+    def submit(self, job_type, params=None, input_stream=None, user_id=None, tenant_id=None):
+        """
+        Job anlegen und die Worker wecken. input_stream (z.B. Upload eines
+        Imports) wird vorher in eine Datei im Ergebnisordner kopiert. Ohne
+        tenant_id läuft der Job im aktuellen Mandanten.
+        """
+        if job_type not in self._handlers:
+            raise JobRejected(f"type must be one of: {', '.join(self._handlers)}.")
+        params = dict(params or {})
+        _, _, prepare, retry, _ = self._handlers[job_type]
+        if prepare is not None:
+            try:
+                params = prepare(params)
+            except ValueError as exc:
+                raise JobRejected(str(exc)) from None
+
+        # Grenze gilt für die gemeinsame Warteschlange, nicht pro Mandant
+        with unscoped():
+            queued = db.session.execute(
+                db.select(db.func.count()).select_from(Job).where(Job.status == 'queued')
+            ).scalar()
+        if queued >= self.queue_limit:
+            raise JobRejected("Too many queued jobs, please retry later.", status_code=503)
+
+        job = Job(
+            id=uuid.uuid4().hex, type=job_type, params=json.dumps(params),
+            max_attempts=self.max_attempts if retry else 1, created_by=user_id,
+        )
+        if tenant_id is not None:
+            job.tenant_id = tenant_id
+        if input_stream is not None:
+            job.input_path = os.path.join(self.result_dir, f"{job.id}.input")
+            with open(job.input_path, "wb") as fh:
+                for block in iter(lambda: input_stream.read(64 * 1024), b""):
+                    fh.write(block)
+        db.session.add(job)
+        db.session.commit()
+        self.ensure_workers()
+        self._wakeup.set()
+        return job
+
+    @staticmethod
+    def get(job_id):
+        return db.session.get(Job, job_id)
+
+    @staticmethod
+    def recent(limit=50, status=None):
+        stmt = db.select(Job).order_by(Job.created_at.desc()).limit(limit)
+        if status:
+            stmt = stmt.where(Job.status == status)
+        return db.session.scalars(stmt).all()
+
+    # -----------------------
+    # Worker
+    # -----------------------
+    def ensure_workers(self):
+        """Worker-Threads in diesem Prozess starten (Threads überleben kein fork())."""
+        if self._threads_pid == os.getpid() or not self.workers or self._app is None:
+            return
+        with self._lock:
+            if self._threads_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._threads_pid = os.getpid()
+
+    def stop(self, timeout=5):
+        """Worker beenden (laufende Jobs werden noch abgeschlossen)."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads_pid = None
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                with self._app.app_context(), unscoped():
+                    self._maintenance()
+                    job = self._claim_next()
+                    if job is not None:
+                        self._run(job)
+                        continue
+            except OperationalError:
+                # z.B. Datenbank kurz gesperrt – beim nächsten Durchlauf erneut versuchen
+                pass
+            if self._wakeup.wait(self.poll_interval):
+                self._wakeup.clear()
+
+    def _claim_next(self):
+        """
+        Ältesten fälligen Job per bedingtem UPDATE für diesen Worker beanspruchen.
+        Gibt eine Zeile mit den für die Ausführung nötigen Spalten zurück (oder None).
+        """
+        now = utcnow()
+        candidates = db.session.scalars(
+            db.select(Job.id)
+            .where(Job.status == 'queued', Job.run_after <= now)
+            .order_by(Job.run_after, Job.created_at)
+            .limit(5)
+        ).all()
+        db.session.rollback()
+        for job_id in candidates:
+            with db.engine.begin() as conn:
+                claimed = conn.execute(
+                    db.update(Job.__table__)
+                    .where(Job.__table__.c.id == job_id, Job.__table__.c.status == 'queued')
+                    .values(status='running', started_at=now, heartbeat_at=now,
+                            attempts=Job.__table__.c.attempts + 1)
+                ).rowcount
+                if claimed:
+                    return conn.execute(
+                        db.select(Job.id, Job.type, Job.params, Job.input_path, Job.created_by,
+                                  Job.tenant_id, Job.attempts, Job.max_attempts).where(Job.id == job_id)
+                    ).one()
+        return None
+
+    def _run(self, job):
+        handler, _, _, _, scoped = self._handlers.get(job.type, (None, False, None, True, True))
+        context = JobContext(self, job)
+        # Änderungen des Jobs im Aktivitätsprotokoll dem Auftraggeber zuordnen
+        g.activity_user_id = job.created_by
+        try:
+            if handler is None:
+                raise RuntimeError(f"Unknown job type {job.type!r}.")
+            with self._heartbeat(job.id), tenant_router.context(job.tenant_id, scoped=scoped):
+                result = handler(context) or {}
+        except Exception as exc:
+            db.session.rollback()
+            if job.attempts < job.max_attempts:
+                # Exponentieller Backoff: 2, 4, 8, … Sekunden
+                self._update(job.id, status='queued', error=str(exc),
+                             run_after=utcnow() + timedelta(seconds=2 ** job.attempts))
+            else:
+                self._update(job.id, status='failed', error=str(exc), finished_at=utcnow())
+            return
+        finally:
+            db.session.remove()
+
+        result_path = result.pop("_path", None)
+        self._update(
+            job.id, status='succeeded', error=None, finished_at=utcnow(),
+            result=json.dumps(result), result_path=result_path,
+        )
+        if job.input_path and os.path.exists(job.input_path):
+            os.remove(job.input_path)
+
+    @contextmanager
+    def _heartbeat(self, job_id):
+        """
+        Während des Blocks heartbeat_at regelmäßig aus einem eigenen Thread
+        erneuern: lange Handler ohne Fortschrittsmeldung (Index-Neuaufbau)
+        gelten sonst als abgestürzt und liefen ein zweites Mal.
+        """
+        stop = threading.Event()
+        interval = max(1.0, self.stale_after / HEARTBEATS_PER_STALE_PERIOD)
+
+        def beat():
+            with self._app.app_context():
+                while not stop.wait(interval):
+                    try:
+                        self._update(job_id, heartbeat_at=utcnow())
+                    except OperationalError:
+                        # Datenbank kurz gesperrt – der nächste Heartbeat kommt rechtzeitig
+                        pass
+
+        thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _update(self, job_id, **values):
+        # Eigene Transaktion, unabhängig von der Session des Job-Handlers
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Job.__table__).where(Job.__table__.c.id == job_id).values(**values))
+
+    def _maintenance(self):
+        """
+        Abgestürzte Jobs neu einplanen (bzw. ohne verbleibende Versuche als
+        fehlgeschlagen markieren) und abgelaufene Ergebnisse löschen (selten).
+        """
+        now = time.monotonic()
+        if now - self._last_maintenance < 60:
+            return
+        self._last_maintenance = now
+        table = Job.__table__
+        stale = utcnow() - timedelta(seconds=self.stale_after)
+        expired = utcnow() - timedelta(seconds=self.result_ttl)
+        with db.engine.begin() as conn:
+            # Ohne verbleibende Versuche nicht erneut starten: ein abgebrochener
+            # Import (max_attempts=1) würde seine Zeilen sonst doppelt einfügen
+            conn.execute(
+                table.update()
+                .where(table.c.status == 'running', table.c.heartbeat_at < stale,
+                       table.c.attempts >= table.c.max_attempts)
+                .values(status='failed', error='The worker running this job stopped responding.',
+                        finished_at=utcnow())
+            )
+            conn.execute(
+                table.update()
+                .where(table.c.status == 'running', table.c.heartbeat_at < stale)
+                .values(status='queued', run_after=utcnow())
+            )
+            old = conn.execute(
+                db.select(table.c.id, table.c.result_path, table.c.input_path).where(
+                    table.c.status.in_(('succeeded', 'failed')), table.c.finished_at < expired
+                )
+            ).all()
+            for row in old:
+                for path in (row.result_path, row.input_path):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            if old:
+                conn.execute(table.delete().where(table.c.id.in_([row.id for row in old])))
+
+
+# Prozessweite Instanz
+job_queue = JobQueue()
+
+
+# -----------------------
+# Job-Typen
+# -----------------------
+def _prepare_model_params(params):
+    if params.get("model") not in JOB_MODELS:
+        raise ValueError(f"model must be one of: {', '.join(JOB_MODELS)}.")
+    return params
+
+
+def _prepare_export(params):
+    _prepare_model_params(params)
+    params.setdefault("format", "csv")
+    if params["format"] not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
+    # Filter/Sortierung schon beim Einreichen prüfen (ValueError → 400)
+    parse_list_args(JOB_MODELS[params["model"]][0], params)
+    return params
+
+
+@job_queue.handler("export", prepare=_prepare_export)
+def export_job(ctx):
+    """Kunden/Leads (mit Filtern/Sortierung wie die Listen-API) als Datei exportieren."""
+    model, iter_rows = JOB_MODELS[ctx.params["model"]]
+    fmt = ctx.params["format"]
+    filters, sort = parse_list_args(model, ctx.params)
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(model)
+    ).scalar() if not filters else None
+    mimetype, suffix = EXPORT_FORMATS[fmt]
+    path = ctx.result_path(suffix)
+
+    written = 0
+    with open(path, "wb") as fh:
+        if fmt == "csv":
+            fh.write((",".join(model.API_FIELDS) + "\r\n").encode("utf-8"))
+        elif fmt == "json":
+            fh.write(b"[")
+        for row in iter_rows(filters=filters, sort=sort):
+            if fmt == "csv":
+                fh.write(_csv_line(row[field] for field in model.API_FIELDS))
+            elif fmt == "json":
+                fh.write((b"," if written else b"") + serializers.dumps(row))
+            else:
+                fh.write(serializers.dumps(row) + b"\n")
+            written += 1
+            ctx.progress(written, total)
+        if fmt == "json":
+            fh.write(b"]")
+    ctx.progress(written, written, force=True)
+    return {"rows": written, "mimetype": mimetype,
+            "filename": f"{ctx.params['model']}{suffix}", "_path": path}
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(list(values))
+    return buffer.getvalue().encode("utf-8")
+
+
+def _prepare_import(params):
+    _prepare_model_params(params)
+    if not params.get("mimetype"):
+        raise ValueError("Content-Type is required for imports.")
+    # Wie bei /api/*/bulk schon beim Einreichen prüfen, nicht erst im Worker
+    raw = params.get("chunk_size") or BULK_CHUNK_SIZE
+    try:
+        params["chunk_size"] = int(raw)
+    except ValueError:
+        raise ValueError("chunk_size must be an integer.") from None
+    if not 1 <= params["chunk_size"] <= MAX_BULK_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_BULK_CHUNK_SIZE}.")
+    return params
+
+
+# Keine automatische Wiederholung: bereits importierte Blöcke würden doppelt eingefügt
+@job_queue.handler("import", admin_only=True, prepare=_prepare_import, retry=False)
+def import_job(ctx):
+    """Hochgeladene Datei (JSON-Array, NDJSON, CSV) per bulk_add importieren."""
+    model = JOB_MODELS[ctx.params["model"]][0]
+    size = os.path.getsize(ctx.input_path)
+    with open(ctx.input_path, "rb") as fh:
+        def rows():
+            # Fortschritt = gelesene Bytes der Eingabedatei
+            for row in iter_file_records(fh, ctx.params["mimetype"]):
+                ctx.progress(fh.tell(), size)
+                yield row
+
+        inserted, errors = model.bulk_add(rows(), chunk_size=int(ctx.params.get("chunk_size", BULK_CHUNK_SIZE)))
+    ctx.progress(size, size, force=True)
+    # Fehlerliste begrenzen, damit der Job-Datensatz klein bleibt
+    return {"inserted": inserted, "failed": len(errors), "errors": errors[:100]}
+
+
+@job_queue.handler("rebuild_search_index", admin_only=True, scoped=False)
+def rebuild_search_index_job(ctx):
+    """Volltextindex neu aufbauen."""
+    if not search.is_available():
+        raise RuntimeError("Full-text search is not available on this database.")
+    search.rebuild_search_index()
+    return {}
+
+
+@job_queue.handler("rebuild_duplicate_index", admin_only=True, scoped=False)
+def rebuild_duplicate_index_job(ctx):
+    """Schlüssel der Dublettenprüfung neu aufbauen."""
+    duplicate_detector.rebuild_index()
+    return {}
+
+
+# Wird bei Fehlern wiederholt: jeder Lauf setzt hinter dem letzten committeten Block fort
+@job_queue.handler("migrate", admin_only=True, scoped=False)
+def migrate_job(ctx):
+    """Ausstehende Schema-Migrationen ausführen, während die App weiterläuft."""
+    def progress(version, label, done, total):
+        if done is not None:
+            ctx.progress(done, total)
+
+    applied = migrator.upgrade(progress=progress)
+    return {"applied": applied, "schema_version": migrator.current_version()}
@@ -0,0 +1,547 @@
+"""
+Versionierte Schema-Migrationen mit Backfills in kleinen Transaktionen.
+
+db.create_all() legt nur fehlende Tabellen an – neue Spalten, Indizes und
+Datenänderungen an bestehenden Tabellen laufen über Migrationen. Jede
+Migration hat eine fortlaufende Nummer; ihr Stand steht in der Tabelle
+schema_version (running → applied, nach Fehler/Abbruch interrupted).
+
+- Backfills laufen blockweise über den Primärschlüssel (ctx.batches,
+  MIGRATION_BATCH_SIZE Zeilen pro Transaktion). Nach jedem Block wird
+  committet und MIGRATION_BATCH_PAUSE Sekunden pausiert, damit die App
+  zwischendurch schreiben kann – SQLite lässt nur einen Schreiber zu, ein
+  UPDATE über eine Million Zeilen würde alle Requests sekundenlang sperren.
+- Schritt und letzte ID werden in derselben Transaktion wie der Block
+  gespeichert. Ein abgebrochener Lauf setzt beim nächsten Aufruf hinter
+  dem letzten committeten Block fort; Code außerhalb von ctx.batches läuft
+  dann erneut und muss idempotent sein.
+- Zeilen, die nach dem Start eines Backfills entstehen, muss der laufende
+  Code bereits richtig schreiben (erst Code/Trigger, dann Backfill).
+- DDL-Schritte sind idempotent. ALTER TABLE ADD COLUMN ändert in SQLite
+  nur das Schema (sofort fertig); CREATE INDEX sperrt Schreiber für die
+  Dauer des Aufbaus, Leser laufen im WAL-Modus weiter.
+- Ein Prozess beansprucht eine Migration per bedingtem UPDATE (wie Jobs).
+  Läuft sie woanders (Heartbeat jünger als MIGRATION_STALE_AFTER), bricht
+  ein zweiter Aufruf mit MigrationLocked ab.
+- Migrationen laufen ohne Mandantenfilter über alle Zeilen. Mit
+  TENANT_STORAGE=files hat jede Mandanten-Datei ihren eigenen Stand; sie
+  wird beim ersten Öffnen migriert (siehe tenancy.py).
+
+    flask --app app migrate            # ausstehende Migrationen ausführen
+    flask --app app migrate --status   # Stand aller Migrationen
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+import search
+from dedup import duplicate_detector
+from models import (
+    DEFAULT_TENANT_ID,
+    DEFAULT_TENANT_NAME,
+    Customer,
+    Lead,
+    Tenant,
+    data_engine,
+    db,
+    next_change_seq,
+    unscoped,
+    utcnow,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_BATCH_PAUSE = 0.02
+DEFAULT_STALE_AFTER = 120
+# Fortschritt höchstens alle x Sekunden melden
+PROGRESS_INTERVAL = 0.5
+
+MIGRATION_STATUSES = ("running", "interrupted", "applied")
+
+
+class MigrationError(RuntimeError):
+    """Migration kann nicht ausgeführt werden."""
+
+
+class MigrationLocked(MigrationError):
+    """Die Migration läuft gerade in einem anderen Prozess."""
+
+
+class SchemaVersion(db.Model):
+    """Stand einer Migration; cursor/step erlauben das Fortsetzen eines Backfills."""
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    # Nummer des laufenden ctx.batches-Schritts und letzte erledigte ID darin
+    step = db.Column(db.Integer, nullable=False, default=0)
+    cursor = db.Column(db.Integer)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    owner = db.Column(db.String(32))
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    heartbeat_at = db.Column(db.DateTime)
+    applied_at = db.Column(db.DateTime)
+
+
+def _table(model):
+    return getattr(model, "__table__", model)
+
+
+class MigrationContext:
+    """Wird an Migrationen übergeben: DDL-Helfer und blockweise Backfills."""
+
+    def __init__(self, migrator, record, owner, progress):
+        self.migrator = migrator
+        self.version = record.version
+        self.owner = owner
+        self._resume_step = record.step
+        self._resume_cursor = record.cursor
+        self._rows_done = record.rows_done
+        self._step = 0
+        self._progress = progress
+        self._last_progress = 0.0
+
+    # -----------------------
+    # DDL (idempotent)
+    # -----------------------
+    def create_table(self, model):
+        """Tabelle anlegen, falls sie fehlt (inkl. ihrer Indizes)."""
+        self.report(f"create table {_table(model).name}")
+        _table(model).create(data_engine(), checkfirst=True)
+
+    def add_column(self, model, name):
+        """
+        Spalte des Modells per ALTER TABLE ergänzen, falls sie fehlt (nullable
+        Spalten oder NOT NULL mit server_default für bestehende Zeilen).
+        """
+        table = _table(model)
+        column = table.columns[name]
+        with data_engine().begin() as conn:
+            existing = {info["name"] for info in db.inspect(conn).get_columns(table.name)}
+            if name in existing:
+                return
+            if not column.nullable and column.server_default is None:
+                raise MigrationError(
+                    f"Cannot add NOT NULL column {table.name}.{name} to an existing table."
+                )
+            self.report(f"add column {table.name}.{name}")
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+    def create_index(self, index):
+        """Index anlegen (IF NOT EXISTS – SQLAlchemy erkennt Ausdrucksindizes nicht per Reflection)."""
+        with data_engine().begin() as conn:
+            if conn.dialect.name == "sqlite":
+                exists = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index.name,)
+                ).first()
+                if exists:
+                    return
+            self.report(f"create index {index.name}")
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+    def drop_index(self, name):
+        """Index löschen, falls vorhanden (z.B. nachdem ein Ersatz angelegt ist)."""
+        with data_engine().begin() as conn:
+            if conn.dialect.name == "sqlite":
+                exists = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+                ).first()
+                if not exists:
+                    return
+            self.report(f"drop index {name}")
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    # -----------------------
+    # Backfills
+    # -----------------------
+    def batches(self, model, label=None):
+        """
+        ID-Bereiche (lower, upper] der Tabelle in Blöcken zu batch_size Zeilen
+        liefern. Der Aufrufer führt im Block seine Statements über db.session
+        aus; danach werden Block und Fortschritt gemeinsam committet. Zeilen
+        mit IDs über dem Maximum beim Start gehören nicht mehr dazu.
+        """
+        step = self._step
+        self._step += 1
+        if step < self._resume_step:
+            return  # in einem früheren Lauf abgeschlossen
+        table = _table(model)
+        pk = table.primary_key.columns.values()[0]
+        label = label or f"backfill {table.name}"
+        cursor = self._resume_cursor if step == self._resume_step and self._resume_cursor else 0
+        last = db.session.scalar(db.select(db.func.max(pk)))
+        total = db.session.scalar(db.select(db.func.count()).select_from(table).where(pk > cursor))
+        db.session.rollback()
+        done = 0
+        if total:
+            self.report(label, done, total, force=True)
+        while last is not None and cursor < last:
+            upper = db.session.scalar(
+                db.select(pk).where(pk > cursor).order_by(pk)
+                .offset(self.migrator.batch_size - 1).limit(1)
+            )
+            upper = last if upper is None or upper > last else upper
+            yield cursor, upper
+            rows = max(0, min(self.migrator.batch_size, total - done))
+            self._save(step=step, cursor=upper, rows_done=self._rows_done + rows)
+            db.session.commit()
+            cursor = upper
+            done += rows
+            self._rows_done += rows
+            self.report(label, done, total)
+            if self.migrator.batch_pause and cursor < last:
+                # Schreibsperre ist frei – wartende Requests kommen jetzt dran
+                time.sleep(self.migrator.batch_pause)
+        self._save(step=step + 1, cursor=None)
+        db.session.commit()
+        if total:
+            self.report(label, done, total, force=True)
+
+    def backfill(self, model, values, where=None, label=None):
+        """
+        UPDATE model SET values [WHERE where] blockweise ausführen.
+        values: Dict oder Funktion (lower, upper) → Dict für den Block.
+        Gibt die Anzahl geänderter Zeilen zurück.
+        """
+        table = _table(model)
+        pk = table.primary_key.columns.values()[0]
+        changed = 0
+        for lower, upper in self.batches(model, label):
+            stmt = db.update(table).where(pk > lower, pk <= upper)
+            if where is not None:
+                stmt = stmt.where(where)
+            block_values = values(lower, upper) if callable(values) else values
+            if block_values:
+                changed += db.session.execute(stmt.values(block_values)).rowcount
+        return changed
+
+    # -----------------------
+    # Fortschritt
+    # -----------------------
+    def report(self, label, done=None, total=None, force=False):
+        """Fortschritt an den Aufrufer melden (gedrosselt) und ins Log schreiben."""
+        now = time.monotonic()
+        if done is not None and not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        logger.info("Migration %s: %s %s/%s", self.version, label, done, total)
+        if self._progress is not None:
+            self._progress(self.version, label, done, total)
+
+    def _save(self, **values):
+        """Stand in der laufenden Transaktion speichern (nur solange uns die Migration gehört)."""
+        result = db.session.execute(
+            db.update(SchemaVersion)
+            .where(SchemaVersion.version == self.version, SchemaVersion.owner == self.owner)
+            .values(heartbeat_at=utcnow(), **values)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise MigrationLocked(f"Migration {self.version} was taken over by another process.")
+
+
+class Migrator:
+    """Registry der Migrationen und Ausführung (prozessweite Instanz `migrator`)."""
+
+    def __init__(self):
+        self._migrations = {}
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.batch_pause = DEFAULT_BATCH_PAUSE
+        self.stale_after = DEFAULT_STALE_AFTER
+
+    def init_app(self, app):
+        """Konfiguration übernehmen und den CLI-Befehl `migrate` registrieren."""
+        self.batch_size = app.config.get("MIGRATION_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.batch_pause = app.config.get("MIGRATION_BATCH_PAUSE", DEFAULT_BATCH_PAUSE)
+        self.stale_after = app.config.get("MIGRATION_STALE_AFTER", DEFAULT_STALE_AFTER)
+        app.cli.add_command(migrate_command)
+
+    def migration(self, version, name):
+        """Decorator: Funktion (MigrationContext) als Migration `version` registrieren."""
+        def register(fn):
+            if version in self._migrations:
+                raise ValueError(f"Duplicate migration version {version}.")
+            self._migrations[version] = (name, fn)
+            return fn
+        return register
+
+    @property
+    def versions(self):
+        return tuple(sorted(self._migrations))
+
+    # -----------------------
+    # Stand
+    # -----------------------
+    def status(self):
+        """Alle registrierten Migrationen mit ihrem Stand (Liste von Dicts, nach Version)."""
+        SchemaVersion.__table__.create(data_engine(), checkfirst=True)
+        records = {record.version: record for record in db.session.scalars(db.select(SchemaVersion))}
+        db.session.rollback()
+        rows = []
+        for version in self.versions:
+            record = records.get(version)
+            rows.append({
+                "version": version,
+                "name": self._migrations[version][0],
+                "status": record.status if record else "pending",
+                "rows_done": record.rows_done if record else 0,
+                "error": record.error if record else None,
+                "applied_at": record.applied_at if record else None,
+            })
+        return rows
+
+    def current_version(self):
+        """Höchste Version, bis zu der alle Migrationen angewendet sind (0 = keine)."""
+        current = 0
+        for row in self.status():
+            if row["status"] != "applied":
+                break
+            current = row["version"]
+        return current
+
+    def pending(self):
+        return [row for row in self.status() if row["status"] != "applied"]
+
+    # -----------------------
+    # Ausführen
+    # -----------------------
+    def upgrade(self, target=None, progress=None):
+        """
+        Ausstehende Migrationen in Versionsreihenfolge ausführen (innerhalb eines
+        App-Kontexts), abgebrochene fortsetzen. progress(version, label, done,
+        total) erhält den Fortschritt. Gibt die angewendeten Versionen zurück.
+        """
+        with unscoped():
+            return self._upgrade(target, progress)
+
+    def _upgrade(self, target, progress):
+        SchemaVersion.__table__.create(data_engine(), checkfirst=True)
+        owner = uuid.uuid4().hex
+        applied = []
+        for version in self.versions:
+            if target is not None and version > target:
+                break
+            name, fn = self._migrations[version]
+            record = self._claim(version, name, owner)
+            if record is None:
+                continue
+            resumed = " (resumed)" if record.step or record.cursor else ""
+            logger.info("Migration %s: %s%s", version, name, resumed)
+            ctx = MigrationContext(self, record, owner, progress)
+            start = time.perf_counter()
+            try:
+                fn(ctx)
+                ctx._save(status="applied", applied_at=utcnow(), cursor=None, error=None)
+                db.session.commit()
+            except BaseException as exc:
+                db.session.rollback()
+                self._interrupt(version, owner, exc)
+                raise
+            logger.info("Migration %s applied in %.1fs", version, time.perf_counter() - start)
+            applied.append(version)
+        return applied
+
+    def _claim(self, version, name, owner):
+        """Migration für diesen Lauf beanspruchen; None, wenn schon angewendet."""
+        now = utcnow()
+        record = db.session.get(SchemaVersion, version)
+        if record is None:
+            db.session.add(SchemaVersion(
+                version=version, name=name, status="running", owner=owner,
+                started_at=now, heartbeat_at=now,
+            ))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                raise MigrationLocked(f"Migration {version} is running in another process.")
+        elif record.status == "applied":
+            db.session.rollback()
+            return None
+        else:
+            stale = now - timedelta(seconds=self.stale_after)
+            claimed = db.session.execute(
+                db.update(SchemaVersion)
+                .where(
+                    SchemaVersion.version == version,
+                    db.or_(SchemaVersion.status == "interrupted", SchemaVersion.heartbeat_at < stale),
+                )
+                .values(status="running", owner=owner, heartbeat_at=now, error=None)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                raise MigrationLocked(f"Migration {version} is running in another process.")
+        record = db.session.get(SchemaVersion, version, populate_existing=True)
+        db.session.rollback()
+        return record
+
+    def _interrupt(self, version, owner, exc):
+        """Migration als unterbrochen markieren (Stand bleibt zum Fortsetzen erhalten)."""
+        try:
+            db.session.execute(
+                db.update(SchemaVersion)
+                .where(SchemaVersion.version == version, SchemaVersion.owner == owner)
+                .values(status="interrupted", error=f"{type(exc).__name__}: {exc}"[:2000])
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Could not mark migration %s as interrupted.", version)
+
+
+# Prozessweite Instanz
+migrator = Migrator()
+
+
+# -----------------------
+# CLI
+# -----------------------
+def echo_progress(version, label, done, total):
+    """Fortschritt für die Kommandozeile formatieren."""
+    if done is None:
+        click.echo(f"[{version}] {label}")
+    else:
+        percent = f" ({done / total:.0%})" if total else ""
+        click.echo(f"[{version}] {label}: {done:,}/{total:,}{percent}")
+
+
+@click.command("migrate")
+@click.option("--status", "show_status", is_flag=True, help="Show migration status and exit.")
+@click.option("--to", "target", type=int, help="Stop after this version.")
+@click.option("--batch-size", type=int, help="Rows per backfill transaction.")
+@click.option("--pause", type=float, help="Seconds to pause between backfill batches.")
+@with_appcontext
+def migrate_command(show_status, target, batch_size, pause):
+    """Apply pending schema migrations (resumes interrupted backfills)."""
+    if show_status:
+        for row in migrator.status():
+            detail = f", {row['rows_done']:,} rows" if row["rows_done"] else ""
+            error = f" – {row['error']}" if row["error"] else ""
+            click.echo(f"{row['version']:>4}  {row['status']:<11} {row['name']}{detail}{error}")
+        return
+    if batch_size:
+        migrator.batch_size = batch_size
+    if pause is not None:
+        migrator.batch_pause = pause
+    try:
+        applied = migrator.upgrade(target=target, progress=echo_progress)
+    except MigrationError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Applied {len(applied)} migration(s); schema version {migrator.current_version()}.")
+
+
+# -----------------------
+# Migrationen
+# -----------------------
+# Nur anhängen, nie bestehende ändern: Datenbanken mit angewendeter Version
+# führen sie nicht erneut aus.
+
+@migrator.migration(1, "Basisschema: fehlende Tabellen, Spalten und Indizes")
+def _baseline(ctx):
+    # Bringt Datenbanken jedes älteren Stands auf das Schema bei Einführung
+    # der Migrationen (vorher hat init_db das bei jedem Start nachgezogen)
+    db.metadata.create_all(data_engine())
+    for table in db.metadata.sorted_tables:
+        for column in table.columns:
+            ctx.add_column(table, column.name)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            ctx.create_index(index)
+
+
+@migrator.migration(2, "row_version für Kunden und Leads von vor dem Änderungs-Feed")
+def _backfill_row_versions(ctx):
+    # Neue Zeilen bekommen ihre Nummer beim Schreiben; pro Block werden so viele
+    # Nummern reserviert, wie der ID-Bereich umfasst, und base + id vergeben
+    for model in (Customer, Lead):
+        def values(lower, upper, model=model):
+            missing = db.session.scalar(
+                db.select(db.func.count()).select_from(model)
+                .where(model.id > lower, model.id <= upper, model.row_version.is_(None))
+            )
+            if not missing:
+                return None
+            base = next_change_seq(upper - lower) - upper
+            return {
+                "row_version": base + model.id,
+                "updated_at": db.func.coalesce(model.updated_at, utcnow()),
+            }
+
+        ctx.backfill(model, values, where=model.row_version.is_(None),
+                     label=f"row_version {model.__tablename__}")
+
+
+@migrator.migration(3, "Volltextindex für Kunden und Leads")
+def _search_index(ctx):
+    # Trigger zuerst: ab hier landen neue/geänderte Zeilen direkt im Index
+    if not search.init_search_index(backfill=False):
+        return
+    for table, offset in search.KINDS.values():
+        for lower, upper in ctx.batches(db.metadata.tables[table], label=f"search index {table}"):
+            search.index_rows(table, offset, lower, upper)
+
+
+@migrator.migration(4, "Dublettenschlüssel für bestehende Kunden")
+def _duplicate_keys(ctx):
+    for lower, upper in ctx.batches(Customer, label="duplicate keys customers"):
+        duplicate_detector.index_missing(lower, upper)
+
+
+# Indizes von vor der Einführung der Mandanten (ersetzt durch tenant_id-Indizes)
+_PRE_TENANT_INDEXES = (
+    "ix_customers_status_id", "ix_customers_company_lower", "ix_customers_name_lower",
+    "ix_customers_email_lower", "ix_customers_row_version",
+    "ix_leads_status_id", "ix_leads_source_value", "ix_leads_value", "ix_leads_status_source_value",
+    "ix_leads_company_value", "ix_leads_company_lower", "ix_leads_name_lower", "ix_leads_email_lower",
+    "ix_leads_row_version", "ix_tombstones_row_version",
+)
+
+
+@migrator.migration(5, "Mandanten: Tabelle tenants, tenant_id und Indizes mit tenant_id vorne")
+def _tenants(ctx):
+    ctx.create_table(Tenant)
+    if db.session.get(Tenant, DEFAULT_TENANT_ID) is None:
+        db.session.add(Tenant(id=DEFAULT_TENANT_ID, name=DEFAULT_TENANT_NAME))
+    db.session.commit()
+    # NOT NULL mit server_default: bestehende Zeilen gehören ohne Backfill dem Standard-Mandanten
+    tables = [db.metadata.tables[name] for name in ("users", "customers", "leads", "tombstones", "jobs")]
+    for table in tables:
+        ctx.add_column(table, "tenant_id")
+    # Erst die neuen Indizes, dann die alten löschen – Abfragen haben immer einen
+    for table in tables:
+        for index in table.indexes:
+            ctx.create_index(index)
+    for name in _PRE_TENANT_INDEXES:
+        ctx.drop_index(name)
+    # Monats-Partitionen des Aktivitätsprotokolls (eigene Metadaten, siehe activity.py)
+    with data_engine().begin() as conn:
+        inspector = db.inspect(conn)
+        for name in inspector.get_table_names():
+            if not name.startswith("activity_log_"):
+                continue
+            if "tenant_id" not in {info["name"] for info in inspector.get_columns(name)}:
+                ctx.report(f"add column {name}.tenant_id")
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {name} ADD COLUMN tenant_id INTEGER DEFAULT {DEFAULT_TENANT_ID}"
+                )
+
+
+@migrator.migration(6, "Volltextindex mit Mandanten-Spalte")
+def _search_index_tenant(ctx):
+    # FTS5 kennt kein ALTER TABLE: alten Index samt Triggern löschen, neu
+    # anlegen und blockweise füllen (Suche liefert bis dahin weniger Treffer)
+    search.drop_index_without_tenant()
+    if not search.init_search_index(backfill=False):
+        return
+    for table, offset in search.KINDS.values():
+        for lower, upper in ctx.batches(db.metadata.tables[table], label=f"search index {table}"):
+            search.index_rows(table, offset, lower, upper)
@@ -1,15 +1,546 @@
+import math
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from blinker import Namespace
+from flask import g, has_app_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+
+from passwords import password_hasher
+
+
+class RoutingSession(Session):
+    """
+    Session mit Lese- und Mandanten-Routing:
+    - Hat der Request eine Read-Engine bekommen (g._read_engine, siehe
+      replicas.py), laufen seine Abfragen dort. Flushes und
+      INSERT/UPDATE/DELETE bleiben auf der primären Engine.
+    - Liegen die Daten des Mandanten in einer eigenen Datei
+      (g._tenant_engine, siehe tenancy.py), geht alles dorthin – außer
+      Tabellen mit info={'shared': True} (users, tenants, jobs).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if not self._flushing and has_request_context():
+                engine = g.get("_read_engine")
+                if engine is not None and not getattr(clause, "is_dml", False):
+                    return engine
+            engine = g.get("_tenant_engine")
+            if engine is not None and not _is_shared(mapper, clause):
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_shared(mapper, clause):
+    """True für Tabellen, die auch bei einer Datei pro Mandant in der primären Datenbank liegen."""
+    if mapper is not None:
+        table = mapper.local_table
+    else:
+        table = getattr(clause, "table", None)
+        if table is None and hasattr(clause, "get_final_froms"):
+            froms = clause.get_final_froms()
+            table = froms[0] if froms else None
+    return getattr(table, "info", {}).get("shared", False)
+
+
+def _mark_write(*args):
+    # Nach dem ersten Schreibzugriff liest der Request primär (sieht eigene Änderungen)
+    if has_request_context():
+        g._read_engine = None
+        g._db_wrote = True
+
+
+event.listen(RoutingSession, "after_flush", _mark_write)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _on_orm_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        _mark_write()
+    tenant_id = current_tenant_id()
+    if tenant_id is None or state.is_insert or not state.is_orm_statement:
+        return
+    if state.is_select and (state.is_column_load or state.is_relationship_load):
+        return
+    # Mandantenfilter für jedes TenantScoped-Modell im Statement (FROM, Joins,
+    # get(), ORM-UPDATE/-DELETE); tenant_id wird als Parameter gebunden
+    state.statement = state.statement.options(with_loader_criteria(
+        TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True,
+    ))
+
 
 # Zentrale SQLAlchemy-Instanz für die ganze Flask‑App
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # Rollen-Konstanten für einfache Rollenprüfung (z.B. is_admin)
 ROLE_USER = 'user'
 ROLE_ADMIN = 'admin'
 
 
+# -----------------------
+# Mandanten (Teams)
+# -----------------------
+# Alle Daten von vor der Einführung der Mandanten gehören dem Standard-Mandanten
+DEFAULT_TENANT_ID = 1
+DEFAULT_TENANT_NAME = 'Default'
+# Mandant anonymer Requests: gibt es nicht, der Filter trifft keine Zeile
+NO_TENANT_ID = 0
+
+
+def current_tenant_id():
+    """
+    Mandant des laufenden Requests/Jobs (g.tenant_id, gesetzt von tenancy.py).
+    Ohne Kontext (CLI, Skripte) gilt der Standard-Mandant; None heißt
+    ausdrücklich ohne Filter (siehe unscoped).
+    """
+    if not has_app_context():
+        return DEFAULT_TENANT_ID
+    return g.get("tenant_id", DEFAULT_TENANT_ID)
+
+
+def _tenant_for_insert():
+    # Default für tenant_id neuer Zeilen
+    tenant_id = current_tenant_id()
+    return DEFAULT_TENANT_ID if tenant_id is None else tenant_id
+
+
+@contextmanager
+def unscoped():
+    """Ohne Mandantenfilter ausführen (Migrationen, Wartungs-Jobs, Job-Worker)."""
+    previous = current_tenant_id()
+    g.tenant_id = None
+    try:
+        yield
+    finally:
+        g.tenant_id = previous
+
+
+def tenant_clause(model):
+    """
+    Mandantenfilter als Bedingung für Statements, die der automatische Filter
+    nicht erreicht (Core über connection(), Zählung über Unterabfragen).
+    """
+    tenant_id = current_tenant_id()
+    return db.true() if tenant_id is None else model.tenant_id == tenant_id
+
+
+def data_engine():
+    """Engine der Mandantendaten im aktuellen Kontext (bei TENANT_STORAGE=files die Datei des Mandanten)."""
+    engine = g.get("_tenant_engine") if has_app_context() else None
+    return engine if engine is not None else db.engine
+
+
+class TenantScoped:
+    """
+    Mixin für Tabellen mit Daten eines Mandanten: ORM-Abfragen, -UPDATEs und
+    -DELETEs sehen nur Zeilen von current_tenant_id() (siehe _on_orm_execute),
+    neue Zeilen bekommen ihn als Default. Bestehende Zeilen gehören dem
+    Standard-Mandanten (server_default).
+    """
+    tenant_id = db.Column(
+        db.Integer, nullable=False, default=_tenant_for_insert,
+        server_default=db.text(str(DEFAULT_TENANT_ID)),
+    )
+
+
+# -----------------------
+# Signale für Schreibzugriffe
+# -----------------------
+# Die Schreibmethoden der Modelle senden nach jedem erfolgreichen Commit ein
+# Signal (Sender = Modellklasse). Andere Module (z.B. Dashboard-Statistik)
+# hängen sich hier ein, ohne dass die Modelle sie kennen müssen.
+# Zeilen werden als einfache Dicts (Spaltenname → Wert) übergeben.
+model_signals = Namespace()
+row_added = model_signals.signal('row-added')        # row=dict
+row_updated = model_signals.signal('row-updated')    # before=dict, after=dict
+row_deleted = model_signals.signal('row-deleted')    # row=dict
+rows_imported = model_signals.signal('rows-imported')  # rows=list[dict] (ein Bulk-Block)
+rows_updated = model_signals.signal('rows-updated')    # before=list[dict], after=list[dict]
+rows_deleted = model_signals.signal('rows-deleted')    # rows=list[dict]
+# Ausnahme: wird beim Bulk-Import VOR dem Commit des Blocks gesendet, damit
+# Empfänger abgeleitete Daten in derselben Transaktion schreiben können.
+# Die Dicts enthalten row_version, aber keine ID (executemany liefert keine).
+rows_flushed = model_signals.signal('rows-flushed')  # rows=list[dict] (ein Bulk-Block)
+
+
+def _snapshot(obj):
+    """Aktuelle Spaltenwerte eines ORM-Objekts als Dict (für Signale)."""
+    return {attr.key: getattr(obj, attr.key) for attr in db.inspect(obj).mapper.column_attrs}
+
+
+# -----------------------
+# Änderungsversionen pro Tabelle
+# -----------------------
+class TableVersion(db.Model):
+    """
+    Zähler pro Tabelle, den jede Schreibmethode in derselben Transaktion
+    erhöht. ETags/Last-Modified der API (siehe http_cache.py) bauen darauf
+    auf, sodass unveränderte Listen ohne Zugriff auf die Zeilen erkannt werden.
+    """
+    __tablename__ = 'table_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    @classmethod
+    def get_versions(cls, names):
+        """Dict Tabellenname → (Version, updated_at); nie geänderte Tabellen → (0, None)."""
+        rows = db.session.execute(
+            db.select(cls.name, cls.version, cls.updated_at).where(cls.name.in_(names))
+        ).all()
+        versions = {name: (0, None) for name in names}
+        versions.update((row.name, (row.version, row.updated_at)) for row in rows)
+        return versions
+
+
+def utcnow():
+    # Naiv in UTC speichern (SQLite kennt keine Zeitzonen)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bump_table_version(name, n=1, connection=None):
+    """
+    Version der Tabelle `name` um n erhöhen und die neue Version zurückgeben
+    (UPSERT in der laufenden Transaktion; sichtbar erst mit dem Commit der
+    eigentlichen Änderung). `connection` erlaubt den Aufruf aus Mapper-Events.
+    """
+    executor = connection if connection is not None else db.session
+    dialect = (connection or db.session.get_bind()).dialect.name
+    table = TableVersion.__table__
+    values = {'name': name, 'version': n, 'updated_at': utcnow()}
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={'version': table.c.version + n, 'updated_at': stmt.excluded.updated_at},
+        ).returning(table.c.version)
+        return executor.execute(stmt).scalar_one()
+    result = executor.execute(
+        table.update()
+        .where(table.c.name == name)
+        .values(version=table.c.version + n, updated_at=values['updated_at'])
+    )
+    if result.rowcount == 0:
+        executor.execute(table.insert().values(values))
+    return executor.execute(
+        db.select(table.c.version).where(table.c.name == name)
+    ).scalar_one()
+
+
+# -----------------------
+# Änderungs-Feed (Delta-Sync)
+# -----------------------
+# Globale, monoton steigende Änderungsnummer über Kunden, Leads und
+# Löschungen. Jede eingefügte/geänderte Zeile bekommt in `row_version` eine
+# neue Nummer, jede Löschung einen Tombstone mit eigener Nummer. Die Nummer
+# wird in der schreibenden Transaktion vergeben; da der Zähler dabei gesperrt
+# ist (SQLite: ein Schreiber, PostgreSQL: Zeilensperre), entspricht die
+# Reihenfolge der Nummern der Commit-Reihenfolge.
+CHANGE_SEQUENCE = '_changes'
+
+
+def next_change_seq(n=1, connection=None):
+    """n neue Änderungsnummern reservieren; gibt die höchste zurück (Bereich end-n+1 … end)."""
+    return bump_table_version(CHANGE_SEQUENCE, n, connection)
+
+
+class Tombstone(TenantScoped, db.Model):
+    """Gelöschte Kunden/Leads für den Änderungs-Feed (siehe get_changes)."""
+    __tablename__ = 'tombstones'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    row_version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    @classmethod
+    def record(cls, table_name, row_id):
+        """Tombstone für eine gelöschte Zeile in der laufenden Transaktion anlegen."""
+        db.session.add(cls(table_name=table_name, row_id=row_id, row_version=next_change_seq()))
+
+
+def _stamp_change(mapper, connection, target):
+    # before_insert/before_update: neue Änderungsnummer für die Zeile vergeben
+    target.row_version = next_change_seq(connection=connection)
+
+
+# Standard-Blockgröße für Bulk-Imports (Zeilen pro Transaktion)
+BULK_CHUNK_SIZE = 1000
+# Obergrenze für die Blockgröße bei Bulk-Imports (?chunk_size=..., API und Jobs)
+MAX_BULK_CHUNK_SIZE = 10000
+# Leads pro Transaktion bei der Umwandlung in Kunden (siehe Lead.convert_leads)
+CONVERT_CHUNK_SIZE = 1000
+# Status eines Leads nach der Umwandlung
+LEAD_STATUS_CONVERTED = 'converted'
+
+
+def _bulk_insert(model, rows, clean_row, chunk_size):
+    """
+    Viele Datensätze auf einmal einfügen:
+    - jede Zeile wird mit `clean_row` validiert/normalisiert
+    - gültige Zeilen werden gesammelt und blockweise per executemany
+      (ein INSERT-Statement, viele Parameter-Sätze) geschrieben
+    - pro Block gibt es genau einen Commit statt einem Commit pro Zeile
+    - tenant_id steht in jeder Zeile, damit Signal-Empfänger die Zeilen
+      über (tenant_id, row_version) wiederfinden
+    Gibt (Anzahl eingefügter Zeilen, Fehlerliste) zurück; die Fehlerliste
+    enthält pro ungültiger Zeile die 1-basierte Zeilennummer und die Ursache.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    inserted = 0
+    errors = []
+    chunk = []
+    stmt = db.insert(model)
+    tenant_id = _tenant_for_insert()
+
+    def flush():
+        nonlocal inserted
+        # Änderungsnummern blockweise reservieren (Core-Insert löst keine Mapper-Events aus)
+        end = next_change_seq(len(chunk))
+        for offset, values in enumerate(chunk, start=end - len(chunk) + 1):
+            values['row_version'] = offset
+        db.session.execute(stmt, chunk)
+        rows_flushed.send(model, rows=chunk)
+        bump_table_version(model.__tablename__, len(chunk))
+        db.session.commit()
+        rows_imported.send(model, rows=list(chunk))
+        inserted += len(chunk)
+        chunk.clear()
+
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": row_number, "message": "row must be an object."})
+            continue
+        try:
+            chunk.append(dict(clean_row(row), tenant_id=tenant_id))
+        except ValueError as exc:
+            errors.append({"row": row_number, "message": str(exc)})
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    return inserted, errors
+
+
+def _require_fields(row, fields):
+    """Pflichtfelder prüfen und als getrimmte Strings zurückgeben."""
+    values = {}
+    for field in fields:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ""
+        if not value:
+            raise ValueError(f"{', '.join(fields)} are required.")
+        values[field] = value
+    return values
+
+
+# Obergrenze für Werte in Range-Vergleichen beim Präfix-Suchen:
+# 'abc' <= x < 'abc' + U+10FFFF erfasst genau alle Strings, die mit 'abc' beginnen
+_PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+class InvalidCursor(ValueError):
+    """Der Pagination-Cursor verweist auf einen Datensatz, der nicht mehr existiert."""
+
+
+def _column_expression(model, field):
+    """
+    Spalte für Filter/Sortierung liefern.
+    Textspalten aus CASE_INSENSITIVE_FIELDS werden als lower(spalte) verglichen –
+    genau dieser Ausdruck ist indiziert (siehe Indizes am Dateiende).
+    """
+    column = getattr(model, field)
+    if field in model.CASE_INSENSITIVE_FIELDS:
+        return db.func.lower(column)
+    return column
+
+
+def _prefix_match(expression, prefix):
+    """
+    Präfix-Suche als Bereichsabfrage formulieren.
+    Anders als LIKE 'abc%' kann SQLite (und PostgreSQL) dafür einen
+    Index auf dem Ausdruck nutzen.
+    """
+    prefix = prefix.lower()
+    return db.and_(expression >= prefix, expression < prefix + _PREFIX_UPPER_BOUND)
+
+
+def _parse_sort(model, sort):
+    """'name' → aufsteigend, '-name' → absteigend; unbekannte Felder sind ein Fehler."""
+    sort = sort or 'id'
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    if field not in model.SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(model.SORT_FIELDS)}.")
+    return field, descending
+
+
+def _list_statement(model, stmt, filters=None, sort=None, after=None):
+    """
+    Filter, Suche, Sortierung und Keyset-Cursor auf ein SELECT anwenden.
+
+    filters (alle optional):
+    - Felder aus EQUALITY_FILTERS: exakter Vergleich
+    - Felder aus PREFIX_FILTERS:   Präfix-Suche ohne Groß-/Kleinschreibung
+    - min_<feld> / max_<feld> für Felder aus RANGE_FILTERS
+    - q: Präfix-Suche über alle SEARCH_FIELDS (ODER-verknüpft)
+
+    Sortiert wird immer zusätzlich nach ID, damit die Reihenfolge stabil ist.
+    Bei Sortierung nach einem anderen Feld als der ID wird der Sortierwert der
+    Cursor-Zeile nachgeschlagen, sodass `after` weiterhin eine einfache ID bleibt.
+    """
+    filters = filters or {}
+    for field in model.EQUALITY_FILTERS:
+        if filters.get(field):
+            stmt = stmt.where(getattr(model, field) == filters[field])
+    for field in model.PREFIX_FILTERS:
+        if filters.get(field):
+            stmt = stmt.where(_prefix_match(_column_expression(model, field), filters[field]))
+    for field in model.RANGE_FILTERS:
+        column = getattr(model, field)
+        if filters.get(f'min_{field}') is not None:
+            stmt = stmt.where(column >= filters[f'min_{field}'])
+        if filters.get(f'max_{field}') is not None:
+            stmt = stmt.where(column <= filters[f'max_{field}'])
+    if filters.get('q'):
+        stmt = stmt.where(db.or_(*(
+            _prefix_match(_column_expression(model, field), filters['q'])
+            for field in model.SEARCH_FIELDS
+        )))
+
+    field, descending = _parse_sort(model, sort)
+    if field == 'id':
+        if after is not None:
+            stmt = stmt.where(model.id < after if descending else model.id > after)
+        return stmt.order_by(model.id.desc() if descending else model.id)
+
+    # NULL ist der kleinste Wert (wie in SQLite), auch in PostgreSQL
+    expression = _column_expression(model, field)
+    if after is not None:
+        cursor_row = db.session.execute(
+            db.select(expression).where(model.id == after)
+        ).first()
+        if cursor_row is None:
+            raise InvalidCursor("after does not refer to an existing row; restart pagination.")
+        stmt = stmt.where(_beyond(expression, cursor_row[0], descending, model.id > after))
+    if descending:
+        return stmt.order_by(expression.desc().nulls_last(), model.id)
+    return stmt.order_by(expression.nulls_first(), model.id)
+
+
+def _beyond(expression, value, descending, same_value_after):
+    """Bedingung für Zeilen hinter dem Sortierwert `value` der Cursor-Zeile (auch NULL)."""
+    if value is None:
+        # NULL-Block: aufsteigend folgen danach alle Werte, absteigend nichts mehr
+        rest = expression.is_(None) & same_value_after
+        return rest if descending else db.or_(rest, expression.is_not(None))
+    if descending:
+        return db.or_(
+            expression < value, expression.is_(None), (expression == value) & same_value_after
+        )
+    return db.or_(expression > value, (expression == value) & same_value_after)
+
+
+def _find(model, filters=None, sort=None):
+    """Alle Datensätze zu Filter/Sortierung als ORM-Objekte laden (HTML-Listen)."""
+    stmt = _list_statement(model, db.select(model), filters, sort)
+    return db.session.scalars(stmt).all()
+
+
+def _keyset_page(model, after, limit, filters=None, sort=None):
+    """
+    Eine Seite per Keyset-Pagination laden:
+    statt OFFSET (muss alle übersprungenen Zeilen lesen) wird über den
+    Index direkt hinter die letzte gesehene Zeile gesprungen.
+    """
+    stmt = _list_statement(model, db.select(model), filters, sort, after)
+    return db.session.scalars(stmt.limit(limit)).all()
+
+
+def _select_rows(model, after=None, limit=None, filters=None, sort=None):
+    """
+    API-Spalten als Row-Tupel laden (Reihenfolge wie API_FIELDS).
+    Kein ORM-Objekt, keine Identity-Map – für große Listen deutlich
+    günstiger als _keyset_page + to_dict (siehe serializers.py).
+    """
+    columns = [getattr(model, field) for field in model.API_FIELDS]
+    stmt = _list_statement(model, db.select(*columns), filters, sort, after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return db.session.execute(stmt).all()
+
+
+def _iter_rows(model, after, batch_size, filters=None, sort=None):
+    """
+    Alle Zeilen eines Modells als einfache Dicts liefern (Generator).
+    Es werden nur die API-Spalten selektiert (keine ORM-Objekte) und per
+    yield_per in Blöcken vom Cursor gelesen → konstanter Speicherverbrauch.
+    Das Statement wird sofort gebaut, damit ungültige Filter/Cursor als
+    Fehler auffallen, bevor eine gestreamte Antwort begonnen hat.
+    """
+    columns = [getattr(model, field) for field in model.API_FIELDS]
+    stmt = _list_statement(model, db.select(*columns), filters, sort, after)
+    return _stream_mappings(stmt.execution_options(yield_per=batch_size))
+
+
+def _stream_mappings(stmt):
+    for row in db.session.execute(stmt).mappings():
+        yield dict(row)
+
+
+def parse_list_args(model, args):
+    """
+    Filter und Sortierung für `_list_statement` aus Query-Parametern lesen
+    (z.B. request.args). Gibt (filters, sort) zurück; ungültige Werte lösen
+    ValueError aus.
+    """
+    filters = {}
+    for field in model.EQUALITY_FILTERS + model.PREFIX_FILTERS + ('q',):
+        value = (args.get(field) or '').strip()
+        if value:
+            filters[field] = value
+    for field in model.RANGE_FILTERS:
+        for bound in ('min', 'max'):
+            key = f'{bound}_{field}'
+            raw = (args.get(key) or '').strip()
+            if not raw:
+                continue
+            try:
+                value = float(raw)
+            except ValueError:
+                value = math.nan
+            # nan/inf würden sonst als Filter an die Datenbank gehen
+            if not math.isfinite(value):
+                raise ValueError(f"{key} must be a number.")
+            filters[key] = value
+
+    sort = (args.get('sort') or '').strip() or None
+    _parse_sort(model, sort)
+    return filters, sort
+
+
+class Tenant(db.Model):
+    """Mandant (z.B. ein Vertriebsteam); Benutzer gehören genau einem Mandanten an."""
+    __tablename__ = 'tenants'
+    __table_args__ = {'info': {'shared': True}}
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
 class User(UserMixin, db.Model):
     """
     User-Modell:
@@ -17,20 +548,37 @@ class User(UserMixin, db.Model):
     - erbt von 'UserMixin' (Flask-Login stellt damit is_authenticated, get_id, etc. bereit)
     """
     __tablename__ = 'users'
+    __table_args__ = {'info': {'shared': True}}
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     # Rolle steuert Berechtigungen (z.B. admin vs. normaler User)
     role = db.Column(db.String(20), default=ROLE_USER)
+    # Mandant, dessen Kunden/Leads der Benutzer sieht (flask --app app tenants assign)
+    tenant_id = db.Column(
+        db.Integer, nullable=False, default=DEFAULT_TENANT_ID,
+        server_default=db.text(str(DEFAULT_TENANT_ID)),
+    )
 
     def set_password(self, password):
-        """Passwort sicher mit Werkzeug hashen und speichern."""
-        self.password_hash = generate_password_hash(password)
+        """Passwort mit dem konfigurierten Verfahren hashen (Thread-Pool, siehe passwords.py)."""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Plain-Text-Passwort mit gespeichertem Hash vergleichen."""
-        return check_password_hash(self.password_hash, password)
+        """Plain-Text-Passwort mit gespeichertem Hash vergleichen (Thread-Pool)."""
+        return password_hasher.verify(self.password_hash, password)
+
+    def rehash_password_if_needed(self, password):
+        """
+        Nach erfolgreichem Login: Hash neu erzeugen, falls er mit veralteten
+        Parametern erstellt wurde. Gibt True zurück, wenn neu gehasht wurde
+        (Commit übernimmt der Aufrufer).
+        """
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
 
     def is_admin(self):
         """Hilfsmethode für Admin-Checks (wird von Decorators benutzt)."""
@@ -47,7 +595,7 @@ class User(UserMixin, db.Model):
         return cls.query.filter_by(email=email).first()
 
 
-class Customer(db.Model):
+class Customer(TenantScoped, db.Model):
     __tablename__ = 'customers'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(120), nullable=False)
@@ -55,20 +603,76 @@ class Customer(db.Model):
     company = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(30), nullable=False)
     status = db.Column(db.String(30), default='prospect')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+    # Änderungsnummer der letzten Einfügung/Änderung (Delta-Sync, siehe get_changes)
+    row_version = db.Column(db.Integer)
+    # Lead, aus dem der Kunde umgewandelt wurde (siehe Lead.convert_leads)
+    source_lead_id = db.Column(db.Integer)
+
+    # Spalten, die über die API nach außen gegeben werden (Reihenfolge = JSON-Reihenfolge)
+    API_FIELDS = ('id', 'name', 'email', 'company', 'phone', 'status')
+
+    # Filter- und Sortiermöglichkeiten der Kundenliste (siehe _list_statement)
+    EQUALITY_FILTERS = ('status',)
+    PREFIX_FILTERS = ('company',)
+    RANGE_FILTERS = ()
+    SEARCH_FIELDS = ('name', 'email', 'company')
+    SORT_FIELDS = ('id', 'name', 'email', 'company', 'status')
+    CASE_INSENSITIVE_FIELDS = ('name', 'email', 'company')
+
+    def to_dict(self):
+        """Kunden als JSON-taugliches Dict für die API zurückgeben."""
+        return {field: getattr(self, field) for field in self.API_FIELDS}
 
     @classmethod
     def add_customer(cls, name, email, company, phone, status='prospect'):
         """Neuen Kunden anlegen und direkt in der Datenbank speichern."""
         customer = cls(name=name, email=email, company=company, phone=phone, status=status)
         db.session.add(customer)  # Objekt der aktuellen Session hinzufügen
+        db.session.flush()        # INSERT ausführen → ID und Defaults sind gesetzt
+        row = _snapshot(customer)
+        bump_table_version(cls.__tablename__)
         db.session.commit()       # Änderungen per SQL-Transaktion schreiben
+        row_added.send(cls, row=row)
         return customer
 
+    @classmethod
+    def bulk_add(cls, rows, chunk_size=BULK_CHUNK_SIZE):
+        """Viele Kunden (Iterable von Dicts) blockweise importieren, siehe `_bulk_insert`."""
+        return _bulk_insert(cls, rows, cls._clean_bulk_row, chunk_size)
+
+    @staticmethod
+    def _clean_bulk_row(row):
+        """Eine Import-Zeile für Kunden validieren und in Spaltenwerte umwandeln."""
+        values = _require_fields(row, ('name', 'email', 'company', 'phone'))
+        values['status'] = str(row.get('status') or 'prospect').strip()
+        return values
+
     @classmethod
     def get_all_customers(cls):
         """Alle Kunden nach ID sortiert zurückgeben."""
         return cls.query.order_by(cls.id).all()
 
+    @classmethod
+    def find_customers(cls, filters=None, sort=None):
+        """Kunden gefiltert/sortiert laden (Filter siehe _list_statement)."""
+        return _find(cls, filters, sort)
+
+    @classmethod
+    def get_customers_page(cls, after=None, limit=100, filters=None, sort=None):
+        """Keyset-Pagination: die nächsten `limit` Kunden hinter dem Cursor `after`."""
+        return _keyset_page(cls, after, limit, filters, sort)
+
+    @classmethod
+    def get_customer_rows(cls, after=None, limit=None, filters=None, sort=None):
+        """Kunden als Tupel der API_FIELDS (ohne ORM-Objekte), optional als Seite."""
+        return _select_rows(cls, after, limit, filters, sort)
+
+    @classmethod
+    def iter_customer_rows(cls, after=None, batch_size=1000, filters=None, sort=None):
+        """Alle Kunden als Dicts streamen, ohne die ganze Tabelle in den Speicher zu laden."""
+        return _iter_rows(cls, after, batch_size, filters, sort)
+
     @classmethod
     def get_customer_by_id(cls, customer_id):
         """Einzelnen Kunden per Primärschlüssel-ID laden."""
@@ -78,23 +682,31 @@ class Customer(db.Model):
     def update_customer(cls, customer_id, name, email, company, phone, status):
         customer = cls.get_customer_by_id(customer_id)
         if customer:
+            before = _snapshot(customer)
             customer.name = name
             customer.email = email
             customer.company = company
             customer.phone = phone
             customer.status = status
+            after = _snapshot(customer)
+            bump_table_version(cls.__tablename__)
             # Änderungen am bestehenden Objekt werden durch Commit gespeichert
             db.session.commit()
+            row_updated.send(cls, before=before, after=after)
 
     @classmethod
     def delete_customer(cls, customer_id):
         customer = cls.get_customer_by_id(customer_id)
         if customer:
+            row = _snapshot(customer)
             db.session.delete(customer)  # Objekt zum Löschen markieren
+            Tombstone.record(cls.__tablename__, row['id'])
+            bump_table_version(cls.__tablename__)
             db.session.commit()          # Löschung in der DB ausführen
+            row_deleted.send(cls, row=row)
 
 
-class Lead(db.Model):
+class Lead(TenantScoped, db.Model):
     __tablename__ = 'leads'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(120), nullable=False)
@@ -103,28 +715,348 @@ class Lead(db.Model):
     value = db.Column(db.Float, nullable=False)
     source = db.Column(db.String(80), nullable=False)
     status = db.Column(db.String(30), default='new')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+    # Änderungsnummer der letzten Einfügung/Änderung (Delta-Sync, siehe get_changes)
+    row_version = db.Column(db.Integer)
+    # Umwandlung in einen Kunden (siehe convert_leads); NULL = noch nicht umgewandelt
+    converted_at = db.Column(db.DateTime)
+    converted_customer_id = db.Column(db.Integer)
+
+    API_FIELDS = ('id', 'name', 'email', 'company', 'value', 'source', 'status', 'converted_customer_id')
+
+    # Filter- und Sortiermöglichkeiten der Lead-Liste (siehe _list_statement)
+    EQUALITY_FILTERS = ('status', 'source')
+    PREFIX_FILTERS = ('company',)
+    RANGE_FILTERS = ('value',)
+    SEARCH_FIELDS = ('name', 'email', 'company')
+    SORT_FIELDS = ('id', 'name', 'email', 'company', 'value', 'source', 'status')
+    CASE_INSENSITIVE_FIELDS = ('name', 'email', 'company')
+
+    def to_dict(self):
+        """Lead als JSON-taugliches Dict für die API zurückgeben."""
+        return {field: getattr(self, field) for field in self.API_FIELDS}
 
     @classmethod
     def add_lead(cls, name, email, company, value, source):
         """Neuen Lead anlegen und sofort speichern."""
         lead = cls(name=name, email=email, company=company, value=value, source=source)
         db.session.add(lead)
+        db.session.flush()
+        row = _snapshot(lead)
+        bump_table_version(cls.__tablename__)
         db.session.commit()
+        row_added.send(cls, row=row)
         return lead
 
+    @classmethod
+    def bulk_add(cls, rows, chunk_size=BULK_CHUNK_SIZE):
+        """Viele Leads (Iterable von Dicts) blockweise importieren, siehe `_bulk_insert`."""
+        return _bulk_insert(cls, rows, cls._clean_bulk_row, chunk_size)
+
+    @staticmethod
+    def _clean_bulk_row(row):
+        """Eine Import-Zeile für Leads validieren; `value` muss eine Zahl sein."""
+        values = _require_fields(row, ('name', 'email', 'company', 'value', 'source'))
+        try:
+            values['value'] = float(values['value'])
+        except ValueError:
+            raise ValueError("value must be a number.") from None
+        if not math.isfinite(values['value']):
+            raise ValueError("value must be a number.")
+        values['status'] = 'new'
+        return values
+
     @classmethod
     def get_all_leads(cls):
         """Alle Leads nach ID sortiert zurückgeben."""
         return cls.query.order_by(cls.id).all()
 
+    @classmethod
+    def find_leads(cls, filters=None, sort=None):
+        """Leads gefiltert/sortiert laden (Filter siehe _list_statement)."""
+        return _find(cls, filters, sort)
+
+    @classmethod
+    def get_leads_page(cls, after=None, limit=100, filters=None, sort=None):
+        """Keyset-Pagination: die nächsten `limit` Leads hinter dem Cursor `after`."""
+        return _keyset_page(cls, after, limit, filters, sort)
+
+    @classmethod
+    def get_lead_rows(cls, after=None, limit=None, filters=None, sort=None):
+        """Leads als Tupel der API_FIELDS (ohne ORM-Objekte), optional als Seite."""
+        return _select_rows(cls, after, limit, filters, sort)
+
+    @classmethod
+    def iter_lead_rows(cls, after=None, batch_size=1000, filters=None, sort=None):
+        """Alle Leads als Dicts streamen, ohne die ganze Tabelle in den Speicher zu laden."""
+        return _iter_rows(cls, after, batch_size, filters, sort)
+
     @classmethod
     def get_lead_by_id(cls, lead_id):
         """Einzelnen Lead per Primärschlüssel-ID laden."""
         return cls.query.get(lead_id)
 
+    @classmethod
+    def convert_lead(cls, lead_id, customer_status='active', delete=False):
+        """Einen Lead in einen Kunden umwandeln; gibt den Kunden zurück (None: fehlt/schon umgewandelt)."""
+        conversions, _ = cls.convert_leads([lead_id], customer_status=customer_status, delete=delete)
+        if not conversions:
+            return None
+        return Customer.get_customer_by_id(conversions[0][1])
+
+    @classmethod
+    def convert_leads(cls, lead_ids=None, filters=None, customer_status='active', delete=False,
+                      chunk_size=CONVERT_CHUNK_SIZE):
+        """
+        Leads blockweise in Kunden umwandeln, eine Transaktion pro Block.
+        Auswahl über `lead_ids` oder – falls None – über `filters` wie bei den
+        Listen (siehe _list_statement). Bereits umgewandelte Leads werden
+        übersprungen. Mit delete=True werden die Leads danach gelöscht
+        (Tombstones für den Änderungs-Feed), sonst bleiben sie mit Status
+        'converted', converted_at und converted_customer_id erhalten.
+        Gibt (Liste von (Lead-ID, Kunden-ID), Anzahl übersprungener IDs) zurück.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        conversions = []
+        skipped = 0
+        if lead_ids is not None:
+            lead_ids = list(dict.fromkeys(lead_ids))
+            for start in range(0, len(lead_ids), chunk_size):
+                chunk = lead_ids[start:start + chunk_size]
+                converted = _convert_chunk(chunk, customer_status, delete)
+                conversions.extend(converted)
+                skipped += len(chunk) - len(converted)
+            return conversions, skipped
+
+        # Per Filter: nächsten Block noch nicht umgewandelter Leads per Keyset holen
+        after = None
+        while True:
+            stmt = _list_statement(cls, db.select(cls.id), filters, None, after)
+            chunk = db.session.scalars(
+                stmt.where(cls.converted_at.is_(None)).limit(chunk_size)
+            ).all()
+            if not chunk:
+                return conversions, skipped
+            conversions.extend(_convert_chunk(chunk, customer_status, delete))
+            after = chunk[-1]
+
     @classmethod
     def delete_lead(cls, lead_id):
         lead = cls.get_lead_by_id(lead_id)
         if lead:
+            row = _snapshot(lead)
             db.session.delete(lead)
+            Tombstone.record(cls.__tablename__, row['id'])
+            bump_table_version(cls.__tablename__)
+            db.session.commit()
+            row_deleted.send(cls, row=row)
+
+
+# Kunden und Leads bekommen bei jedem INSERT/UPDATE über das ORM eine neue Änderungsnummer
+for _model in (Customer, Lead):
+    db.event.listen(_model, 'before_insert', _stamp_change)
+    db.event.listen(_model, 'before_update', _stamp_change)
+
+# Modelle im Änderungs-Feed: Art → Modell
+CHANGE_FEED_MODELS = {'customer': Customer, 'lead': Lead}
+
+
+def _convert_chunk(lead_ids, customer_status, delete):
+    """
+    Einen Block Leads in einer Transaktion umwandeln – mengenbasiert statt
+    Objekt für Objekt:
+    1. INSERT INTO customers ... SELECT ... FROM leads (ein Statement)
+    2. UPDATE leads SET status/converted_at/converted_customer_id (Kunden-ID
+       per Unterabfrage über customers.source_lead_id)
+    3. optional INSERT INTO tombstones ... SELECT + DELETE FROM leads
+    Änderungsnummern werden als Bereich reserviert: Kunde k bekommt
+    base + 2k - 1, sein Lead base + 2k; darüber werden Kunden und Leads des
+    Blocks einander zugeordnet. Hat eine parallele Transaktion einen Lead des
+    Blocks inzwischen umgewandelt oder gelöscht, trifft das UPDATE weniger
+    Zeilen als eingefügt wurden → Rollback und neuer Versuch mit dem Rest.
+    Kunden und Tombstones übernehmen den Mandanten des Leads.
+    Gibt die Liste (Lead-ID, Kunden-ID) des Blocks zurück.
+    """
+    candidates = db.and_(Lead.id.in_(lead_ids), Lead.converted_at.is_(None))
+    lead_columns = [getattr(Lead, field) for field in Lead.API_FIELDS]
+    customer_columns = [getattr(Customer, field) for field in Customer.API_FIELDS]
+    while True:
+        before = [dict(row) for row in db.session.execute(
+            db.select(*lead_columns).where(candidates).order_by(Lead.id)
+        ).mappings()]
+        if not before:
+            db.session.rollback()
+            return []
+        # INSERT ... SELECT bekommt keinen Mandantenfilter → nur die eben
+        # (gefiltert) gelesenen Leads umwandeln
+        pending = db.and_(Lead.id.in_([row['id'] for row in before]), Lead.converted_at.is_(None))
+
+        now = utcnow()
+        end = next_change_seq(2 * len(before))
+        base = end - 2 * len(before)
+        position = db.func.row_number().over(order_by=Lead.id)
+        # Kunde dieses Blocks zum Lead (IDs gelöschter Leads kann SQLite wiederverwenden)
+        block_customer = db.and_(
+            Customer.source_lead_id == Lead.id, Customer.row_version.between(base + 1, end)
+        )
+        try:
+            inserted = db.session.execute(
+                db.insert(Customer).from_select(
+                    ['name', 'email', 'company', 'phone', 'status', 'updated_at', 'row_version',
+                     'source_lead_id', 'tenant_id'],
+                    db.select(
+                        Lead.name, Lead.email, Lead.company, db.literal(''),
+                        db.literal(customer_status), db.literal(now, db.DateTime),
+                        base + 2 * position - 1, Lead.id, Lead.tenant_id,
+                    ).where(pending),
+                )
+            ).rowcount
+            updated = db.session.execute(
+                db.update(Lead)
+                .where(pending)
+                .values(
+                    status=LEAD_STATUS_CONVERTED,
+                    converted_at=now,
+                    updated_at=now,
+                    converted_customer_id=db.select(Customer.id)
+                    .where(block_customer).scalar_subquery(),
+                    row_version=db.select(Customer.row_version + 1)
+                    .where(block_customer).scalar_subquery(),
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if updated != inserted or inserted != len(before):
+                db.session.rollback()
+                continue
+
+            customers = [dict(row) for row in db.session.execute(
+                db.select(*customer_columns, Customer.row_version, Customer.source_lead_id,
+                          Customer.tenant_id)
+                .where(Customer.row_version.between(base + 1, end))
+                .order_by(Customer.row_version)
+            ).mappings()]
+            # Abgeleitete Daten (z.B. Dublettenschlüssel) in derselben Transaktion
+            rows_flushed.send(Customer, rows=customers)
+
+            if delete:
+                converted = Lead.row_version.between(base + 1, end)
+                db.session.execute(
+                    db.insert(Tombstone).from_select(
+                        ['table_name', 'row_id', 'row_version', 'deleted_at', 'tenant_id'],
+                        db.select(db.literal(Lead.__tablename__), Lead.id, Lead.row_version,
+                                  db.literal(now, db.DateTime), Lead.tenant_id).where(converted),
+                    )
+                )
+                db.session.execute(
+                    db.delete(Lead).where(converted).execution_options(synchronize_session=False)
+                )
+            bump_table_version(Customer.__tablename__, len(before))
+            bump_table_version(Lead.__tablename__, len(before))
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        break
+    # Objekte in der Session kennen die mengenbasierten Änderungen nicht
+    db.session.expire_all()
+
+    rows_imported.send(Customer, rows=customers)
+    customer_ids = {row['source_lead_id']: row['id'] for row in customers}
+    if delete:
+        rows_deleted.send(Lead, rows=before)
+    else:
+        after = [
+            dict(row, status=LEAD_STATUS_CONVERTED, converted_customer_id=customer_ids[row['id']])
+            for row in before
+        ]
+        rows_updated.send(Lead, before=before, after=after)
+    return [(row['id'], customer_ids[row['id']]) for row in before]
+
+
+def get_changes(since=0, limit=1000):
+    """
+    Änderungen mit Nummer > since in aufsteigender Reihenfolge (höchstens `limit`).
+    Gibt (Liste von Änderungen, höchste gelieferte Nummer, weitere vorhanden?) zurück.
+    Jede Änderung ist ein Dict mit seq, kind, op ('upsert' oder 'delete'), id
+    und – bei upsert – updated_at und den API-Feldern der Zeile in data.
+    Kosten: O(Änderungen) über die row_version-Indizes, nicht O(Tabelle).
+    """
+    changes = []
+    kinds = {model.__tablename__: kind for kind, model in CHANGE_FEED_MODELS.items()}
+    for kind, model in CHANGE_FEED_MODELS.items():
+        columns = [getattr(model, field) for field in model.API_FIELDS]
+        stmt = (
+            db.select(model.row_version, model.updated_at, *columns)
+            .where(model.row_version > since)
+            .order_by(model.row_version)
+            .limit(limit + 1)
+        )
+        for row in db.session.execute(stmt).mappings():
+            data = {field: row[field] for field in model.API_FIELDS}
+            changes.append({
+                'seq': row['row_version'],
+                'kind': kind,
+                'op': 'upsert',
+                'id': data['id'],
+                'updated_at': row['updated_at'].isoformat() if row['updated_at'] else None,
+                'data': data,
+            })
+    tombstones = db.session.execute(
+        db.select(Tombstone)
+        .where(Tombstone.row_version > since, Tombstone.table_name.in_(kinds))
+        .order_by(Tombstone.row_version)
+        .limit(limit + 1)
+    ).scalars()
+    for tombstone in tombstones:
+        changes.append({
+            'seq': tombstone.row_version,
+            'kind': kinds[tombstone.table_name],
+            'op': 'delete',
+            'id': tombstone.row_id,
+            'deleted_at': tombstone.deleted_at.isoformat(),
+        })
+
+    # Jede Quelle liefert ihre kleinsten Nummern → die ersten `limit` der
+    # zusammengeführten Liste sind global die kleinsten
+    changes.sort(key=lambda change: change['seq'])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    last_seq = changes[-1]['seq'] if changes else since
+    return changes, last_seq, has_more
+
+
+# -----------------------
+# Indizes für Filter, Suche und Sortierung
+# -----------------------
+# Alle beginnen mit tenant_id: jede Abfrage eines Teams (der Mandantenfilter
+# ist immer dabei) liest nur dessen Indexbereich – Listen und Zählungen
+# kosten proportional zu den Daten des Teams, nicht zur ganzen Tabelle.
+# (tenant_id, id): Liste nach ID bzw. Zählung aller Zeilen eines Teams
+db.Index('ix_customers_tenant_id', Customer.tenant_id, Customer.id)
+# (tenant_id, status, id): Filter nach Status, innerhalb des Status bereits nach ID sortiert
+db.Index('ix_customers_tenant_status_id', Customer.tenant_id, Customer.status, Customer.id)
+# lower(...)-Ausdrucksindizes: Präfix-Suche und Sortierung ohne Groß-/Kleinschreibung
+db.Index('ix_customers_tenant_company_lower', Customer.tenant_id, db.func.lower(Customer.company))
+db.Index('ix_customers_tenant_name_lower', Customer.tenant_id, db.func.lower(Customer.name))
+db.Index('ix_customers_tenant_email_lower', Customer.tenant_id, db.func.lower(Customer.email))
+
+db.Index('ix_leads_tenant_id', Lead.tenant_id, Lead.id)
+db.Index('ix_leads_tenant_status_id', Lead.tenant_id, Lead.status, Lead.id)
+# (tenant_id, source, value): Filter nach Quelle, optional mit Wertebereich
+db.Index('ix_leads_tenant_source_value', Lead.tenant_id, Lead.source, Lead.value)
+db.Index('ix_leads_tenant_value', Lead.tenant_id, Lead.value)
+# Abdeckende Indizes für die Pipeline-Auswertung (analytics.py): GROUP BY
+# status/source bzw. company liest nur den Index, nicht die Tabelle
+db.Index('ix_leads_tenant_status_source_value', Lead.tenant_id, Lead.status, Lead.source, Lead.value)
+db.Index('ix_leads_tenant_company_value', Lead.tenant_id, Lead.company, Lead.value)
+db.Index('ix_leads_tenant_company_lower', Lead.tenant_id, db.func.lower(Lead.company))
+db.Index('ix_leads_tenant_name_lower', Lead.tenant_id, db.func.lower(Lead.name))
+db.Index('ix_leads_tenant_email_lower', Lead.tenant_id, db.func.lower(Lead.email))
+
+# Änderungs-Feed: Zeilen eines Teams nach Änderungsnummer
+db.Index('ix_customers_tenant_row_version', Customer.tenant_id, Customer.row_version)
+db.Index('ix_leads_tenant_row_version', Lead.tenant_id, Lead.row_version)
+db.Index('ix_tombstones_tenant_row_version', Tombstone.tenant_id, Tombstone.row_version)
+# Nachschlagen Lead → Kunde bei der Umwandlung
+db.Index('ix_customers_source_lead_id', Customer.source_lead_id)
@@ -0,0 +1,137 @@
+"""
+Passwort-Hashing mit konfigurierbarem Verfahren und begrenztem Thread-Pool.
+
+- PASSWORD_HASH_METHOD wählt Algorithmus und Kosten im Werkzeug-Format,
+  z.B. "scrypt" (Standard, = scrypt:32768:8:1) oder "pbkdf2:sha256:600000".
+- Hashen und Prüfen laufen in einem eigenen Thread-Pool mit
+  PASSWORD_HASH_WORKERS Threads. Mehr als PASSWORD_HASH_QUEUE_LIMIT
+  wartende Aufträge werden sofort mit HashingBusy abgelehnt, statt dass
+  eine Login-Welle alle Worker-Threads mit CPU-lastigem Hashing blockiert.
+- needs_rehash() erkennt Hashes, die mit anderen Parametern erzeugt wurden;
+  beim nächsten erfolgreichen Login wird dann neu gehasht.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt"
+DEFAULT_SALT_LENGTH = 16
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_LIMIT = 16
+# Sekunden, die ein Request höchstens auf das Ergebnis wartet
+DEFAULT_TIMEOUT = 10
+
+
+class HashingBusy(RuntimeError):
+    """Der Hashing-Pool ist ausgelastet; der Aufruf sollte später wiederholt werden."""
+
+
+class PasswordHasher:
+    """Hashen/Prüfen von Passwörtern über einen begrenzten Thread-Pool."""
+
+    def __init__(self, method=DEFAULT_METHOD, salt_length=DEFAULT_SALT_LENGTH,
+                 workers=DEFAULT_WORKERS, queue_limit=DEFAULT_QUEUE_LIMIT,
+                 timeout=DEFAULT_TIMEOUT):
+        self._executor = None
+        self._executor_pid = None
+        self._executor_workers = None
+        self._executor_lock = threading.Lock()
+        self.configure(method, salt_length, workers, queue_limit, timeout)
+
+    def configure(self, method, salt_length, workers, queue_limit, timeout):
+        self.method = method
+        self.salt_length = salt_length
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        # Laufende + wartende Aufträge; begrenzt die Warteschlange
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._method_prefix = None
+        with self._executor_lock:
+            self.workers = workers
+            if self._executor is not None and self._executor_workers != workers:
+                # Neuer Pool mit der neuen Größe beim nächsten Auftrag; laufende
+                # Aufträge des alten Pools werden noch zu Ende gerechnet
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    @property
+    def method_prefix(self):
+        """
+        Vollständige Parameter des konfigurierten Verfahrens, wie Werkzeug sie
+        vor dem ersten '$' speichert (z.B. "scrypt:32768:8:1").
+        Wird beim ersten Zugriff einmal per Probe-Hash ermittelt.
+        """
+        if self._method_prefix is None:
+            probe = generate_password_hash("", method=self.method, salt_length=1)
+            self._method_prefix = probe.split("$", 1)[0]
+        return self._method_prefix
+
+    def init_app(self, app):
+        """Einstellungen aus der App-Konfiguration übernehmen."""
+        self.configure(
+            app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD),
+            app.config.get("PASSWORD_SALT_LENGTH", DEFAULT_SALT_LENGTH),
+            app.config.get("PASSWORD_HASH_WORKERS", DEFAULT_WORKERS),
+            app.config.get("PASSWORD_HASH_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT),
+            app.config.get("PASSWORD_HASH_TIMEOUT", DEFAULT_TIMEOUT),
+        )
+
+    def _pool(self):
+        # Pro Prozess ein eigener Pool (Threads überleben kein fork())
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+                self._executor_pid = os.getpid()
+                self._executor_workers = self.workers
+            return self._executor
+
+    def submit(self, fn, *args):
+        """
+        Auftrag an den Pool geben und ein Future zurückgeben (asynchrone Variante).
+        Ist die Warteschlange voll, wird sofort HashingBusy ausgelöst.
+        """
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingBusy("Password hashing is busy, please retry.")
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _wait(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy("Password hashing timed out, please retry.") from None
+
+    def hash_async(self, password):
+        return self.submit(
+            generate_password_hash, password, self.method, self.salt_length
+        )
+
+    def verify_async(self, pwhash, password):
+        return self.submit(check_password_hash, pwhash, password)
+
+    def hash(self, password):
+        """Passwort mit dem konfigurierten Verfahren hashen (blockiert bis fertig)."""
+        return self._wait(self.hash_async(password))
+
+    def verify(self, pwhash, password):
+        """Passwort gegen den Hash prüfen (blockiert bis fertig)."""
+        return self._wait(self.verify_async(pwhash, password))
+
+    def needs_rehash(self, pwhash):
+        """True, wenn der Hash mit anderem Verfahren/anderen Kosten erzeugt wurde."""
+        return pwhash.split("$", 1)[0] != self.method_prefix
+
+
+# Prozessweite Instanz (von User.set_password/check_password genutzt)
+password_hasher = PasswordHasher()
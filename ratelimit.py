@@ -0,0 +1,346 @@
+"""
+Rate-Limits (Token-Bucket) und Lastbegrenzung (Admission Control).
+
+RateLimiter – ein Token-Bucket je Client und Endpoint:
+- Regeln in RATE_LIMITS: Endpoint ("auth.login") oder Blueprint ("api") →
+  (Rate pro Sekunde, Burst[, Methoden]). Die spezifischste Regel gilt, der
+  Bucket ist aber immer pro Endpoint – eine Integration, die
+  /api/customers pollt, bremst nicht ihre Aufrufe von /api/leads.
+- Client ist der eingeloggte Benutzer (ID aus der Session, ohne
+  DB-Zugriff), sonst die IP-Adresse.
+- Backend "memory": Dict im Prozess (Standard, eine Sperre, ~1 µs pro
+  Entscheidung). "sqlite": gemeinsame SQLite-Datei für mehrere
+  Worker-Prozesse; eine Entscheidung ist ein einziges UPSERT ... RETURNING
+  (~20 µs).
+  "off" schaltet die Limits ab.
+- Abgelehnte Requests bekommen 429 mit Retry-After (Sekunden bis zum
+  nächsten Token).
+
+ConcurrencyLimiter – höchstens MAX_CONCURRENT_REQUESTS Requests gleichzeitig
+im Prozess. Weitere warten bis REQUEST_QUEUE_TIMEOUT Sekunden, solange
+höchstens REQUEST_QUEUE_LIMIT warten; alle anderen werden sofort mit 503 und
+Retry-After abgewiesen, statt sich vor den Worker-Threads zu stauen.
+/metrics und statische Dateien sind ausgenommen, damit Überwachung auch
+unter Überlast funktioniert.
+
+Fällt das sqlite-Backend aus (z.B. Datei gesperrt), werden Requests
+durchgelassen (fail open) und im Log vermerkt.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from flask import Response, g, jsonify, request, session
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ("memory", "sqlite", "off")
+DEFAULT_BACKEND = "memory"
+# Obergrenze für Buckets im Speicher; volle Buckets werden dann verworfen
+DEFAULT_MAX_KEYS = 100000
+# sqlite-Backend: volle Buckets nach so vielen Entscheidungen (pro Prozess) löschen
+SWEEP_EVERY = 1000
+
+DEFAULT_MAX_CONCURRENT = 16
+DEFAULT_QUEUE_LIMIT = 32
+DEFAULT_QUEUE_TIMEOUT = 2.0
+# Endpoints ohne Lastbegrenzung
+DEFAULT_EXEMPT_ENDPOINTS = ("static", "metrics")
+
+
+class Limit(NamedTuple):
+    """Token-Bucket-Regel: `rate` Tokens pro Sekunde, höchstens `burst` auf Vorrat."""
+    rate: float
+    burst: float
+    methods: tuple = None
+
+
+class MemoryBackend:
+    """Buckets im Prozessspeicher: Schlüssel → (Tokens, Zeitpunkt, voll ab)."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1.0):
+        """Token(s) entnehmen; gibt 0 zurück oder die Wartezeit in Sekunden."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._sweep(now)
+                tokens = burst
+            else:
+                tokens = min(burst, state[0] + (now - state[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+                return 0.0
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return (cost - tokens) / rate
+
+    def _sweep(self, now):
+        # Volle Buckets sind gleichbedeutend mit fehlenden → verwerfen
+        self._buckets = {key: state for key, state in self._buckets.items() if state[2] > now}
+        if len(self._buckets) >= self.max_keys:
+            # Alle aktiv (z.B. sehr viele IPs): lieber zurücksetzen als unbegrenzt wachsen
+            logger.warning("Rate limiter holds %d active buckets; resetting.", len(self._buckets))
+            self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SqliteBackend:
+    """Buckets in einer SQLite-Datei, die sich alle Worker-Prozesse teilen."""
+
+    # Rechte Seiten sehen die alten Werte der Zeile; allowed merkt sich die Entscheidung
+    _CONSUME = """
+        INSERT INTO rate_limit_buckets (key, tokens, updated, full_at, allowed)
+        VALUES (:key, :burst - :cost, :now, :now + :cost / :rate, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:burst, tokens + (:now - updated) * :rate)
+                     - (CASE WHEN min(:burst, tokens + (:now - updated) * :rate) >= :cost
+                        THEN :cost ELSE 0 END),
+            full_at = :now + (:burst - min(:burst, tokens + (:now - updated) * :rate)
+                     + (CASE WHEN min(:burst, tokens + (:now - updated) * :rate) >= :cost
+                        THEN :cost ELSE 0 END)) / :rate,
+            allowed = min(:burst, tokens + (:now - updated) * :rate) >= :cost,
+            updated = :now
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+            " full_at REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID"
+        )
+
+    def _connect(self):
+        # Eine Verbindung pro Thread und Prozess (sqlite3-Verbindungen überleben kein fork())
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Verlorene Buckets nach einem Absturz sind harmlos → kein fsync
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("PRAGMA busy_timeout=1000")
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def consume(self, key, rate, burst, cost=1.0):
+        """Token(s) entnehmen; gibt 0 zurück oder die Wartezeit in Sekunden."""
+        now = time.time()
+        connection = self._connect()
+        allowed, tokens = connection.execute(self._CONSUME, {
+            "key": key, "rate": rate, "burst": burst, "cost": cost, "now": now,
+        }).fetchone()
+        self._calls += 1
+        if self._calls % SWEEP_EVERY == 0:
+            connection.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+        return 0.0 if allowed else (cost - tokens) / rate
+
+    def __len__(self):
+        return self._connect().execute("SELECT count(*) FROM rate_limit_buckets").fetchone()[0]
+
+
+def _limit_response(status, message, retry_after):
+    """429/503 mit Retry-After; JSON für die API, sonst Klartext."""
+    if request.path.startswith("/api/"):
+        response = jsonify({"message": message})
+        response.status_code = status
+    else:
+        response = Response(message, status, mimetype="text/plain")
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimiter:
+    """Token-Bucket-Limits je Client und Endpoint (siehe Modul-Docstring)."""
+
+    def __init__(self):
+        self.backend = None
+        self.limits = {}
+        # Endpoint → (Scope, Limit) oder None; wird beim ersten Request pro Endpoint gefüllt
+        self._resolved = {}
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        """Backend und Regeln aus der App-Konfiguration, before_request-Hook registrieren."""
+        backend = app.config.get("RATE_LIMIT_BACKEND", DEFAULT_BACKEND)
+        if backend not in RATE_LIMIT_BACKENDS:
+            raise ValueError(f"RATE_LIMIT_BACKEND must be one of: {', '.join(RATE_LIMIT_BACKENDS)}")
+        self.limits = {
+            scope: Limit(*limit) for scope, limit in app.config.get("RATE_LIMITS", {}).items()
+        }
+        self._resolved = {}
+        if backend == "off" or not self.limits:
+            self.backend = None
+            return
+        if backend == "sqlite":
+            path = app.config.get("RATE_LIMIT_DB") or os.path.join(app.instance_path, "ratelimit.db")
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.backend = SqliteBackend(path)
+        else:
+            self.backend = MemoryBackend(app.config.get("RATE_LIMIT_MAX_KEYS", DEFAULT_MAX_KEYS))
+        app.before_request(self._before_request)
+
+    def limit_for(self, endpoint, blueprint):
+        """Regel für einen Endpoint: eigene Regel, sonst die des Blueprints (oder None)."""
+        try:
+            return self._resolved[endpoint]
+        except KeyError:
+            pass
+        resolved = None
+        for scope in (endpoint, blueprint):
+            if scope in self.limits:
+                resolved = (scope, self.limits[scope])
+                break
+        self._resolved[endpoint] = resolved
+        return resolved
+
+    def hit(self, key, limit):
+        """Einen Request für `key` verbuchen; 0 = erlaubt, sonst Wartezeit in Sekunden."""
+        try:
+            wait = self.backend.consume(key, limit.rate, limit.burst)
+        except sqlite3.Error:
+            self.errors += 1
+            logger.warning("Rate limit backend failed; letting the request through.", exc_info=True)
+            return 0.0
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def _before_request(self):
+        resolved = self.limit_for(request.endpoint, request.blueprint)
+        if resolved is None:
+            return None
+        limit = resolved[1]
+        if limit.methods and request.method not in limit.methods:
+            return None
+        # Flask-Login legt die Benutzer-ID in der Session ab → kein User-Lookup nötig
+        user_id = session.get("_user_id")
+        client = f"u:{user_id}" if user_id else f"ip:{request.remote_addr}"
+        wait = self.hit(f"{request.endpoint}|{client}", limit)
+        if wait:
+            return _limit_response(429, "Too many requests, please slow down.", wait)
+        return None
+
+    def stats(self):
+        """Zähler für /metrics und /api/cache-stats."""
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "errors": self.errors,
+            "buckets": len(self.backend) if isinstance(self.backend, MemoryBackend) else 0,
+        }
+
+
+class ConcurrencyLimiter:
+    """Begrenzt gleichzeitige Requests im Prozess (siehe Modul-Docstring)."""
+
+    def __init__(self, max_active=DEFAULT_MAX_CONCURRENT, queue_limit=DEFAULT_QUEUE_LIMIT,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.configure(max_active, queue_limit, queue_timeout)
+        self.exempt = frozenset(DEFAULT_EXEMPT_ENDPOINTS)
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    def configure(self, max_active, queue_limit, queue_timeout):
+        self.max_active = max_active
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        # Eine Bedingung statt Semaphore: der freie Fall kostet nur Sperren + Zählen
+        self._cond = threading.Condition(threading.Lock())
+        self._active = 0
+        self._waiting = 0
+
+    def init_app(self, app):
+        """Grenzen aus der App-Konfiguration, Hooks registrieren (0 = aus)."""
+        self.configure(
+            app.config.get("MAX_CONCURRENT_REQUESTS", DEFAULT_MAX_CONCURRENT),
+            app.config.get("REQUEST_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT),
+            app.config.get("REQUEST_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT),
+        )
+        self.exempt = frozenset(app.config.get("ADMISSION_EXEMPT_ENDPOINTS", DEFAULT_EXEMPT_ENDPOINTS))
+        if not self.max_active:
+            return
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _has_room(self):
+        return self._active < self.max_active
+
+    def acquire(self):
+        """Platz belegen; wartet höchstens queue_timeout. False = abweisen."""
+        with self._cond:
+            if self._active < self.max_active:
+                self._active += 1
+                self.admitted += 1
+                return True
+            if self._waiting >= self.queue_limit:
+                self.shed += 1
+                return False
+            self._waiting += 1
+            self.queued += 1
+            try:
+                acquired = self._cond.wait_for(self._has_room, self.queue_timeout)
+            finally:
+                self._waiting -= 1
+            if acquired:
+                self._active += 1
+                self.admitted += 1
+            else:
+                self.shed += 1
+            return acquired
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            if self._waiting:
+                self._cond.notify()
+
+    def _before_request(self):
+        if request.endpoint in self.exempt:
+            return None
+        if not self.acquire():
+            return _limit_response(503, "The server is busy, please try again in a moment.",
+                                   self.queue_timeout)
+        g._admitted = True
+        return None
+
+    def _teardown_request(self, exc):
+        if g.pop("_admitted", False):
+            self.release()
+
+    def stats(self):
+        """Zähler für /metrics und /api/cache-stats."""
+        return {
+            "limit": self.max_active,
+            "active": self._active,
+            "waiting": self._waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+
+# Prozessweite Instanzen
+rate_limiter = RateLimiter()
+concurrency_limiter = ConcurrencyLimiter()
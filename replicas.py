@@ -0,0 +1,262 @@
+"""
+Lesende Requests auf eine Read-Engine umleiten (Snapshot-Kopie oder Replica).
+
+READ_REPLICA wählt die Quelle:
+- "" / "off": alles läuft über die primäre Engine (Standard)
+- "snapshot": ein Hintergrund-Thread kopiert die SQLite-Datei alle
+  READ_REPLICA_REFRESH Sekunden per Backup-API in eine neue Datei
+  (READ_REPLICA_DIR, Standard instance/replica). Gelesen wird mit
+  immutable=1: keine Dateisperren, kein WAL-Index, keine Konkurrenz mit
+  Schreibern und Checkpoints der primären Datei.
+- eine Datenbank-URI: vorhandene Replica, die höchstens
+  READ_REPLICA_MAX_LAG Sekunden hinter der primären Datenbank liegt.
+
+GET-/HEAD-Requests bekommen in before_request die Read-Engine
+(g._read_engine); RoutingSession (models.py) schickt dann alle Abfragen
+dorthin, Flushes und INSERT/UPDATE/DELETE bleiben primär. Schreibt ein
+Request doch, liest er ab da primär. Endpoints in READ_REPLICA_EXEMPT
+(z.B. Job-Status, den Worker laufend aktualisieren) lesen immer primär.
+
+Read-your-writes: nach einem Request mit Schreibzugriff merkt sich die
+Session des Benutzers den Zeitpunkt (_wrote_at). Bis die Replica einen
+Stand ab diesem Zeitpunkt hat (Snapshot danach gestartet bzw. Zeitpunkt +
+MAX_LAG vorbei), liest dieser Benutzer von der primären Engine.
+"""
+import atexit
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, request, session
+from sqlalchemy import create_engine, event
+
+from instrumentation import instrumentation
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Nur diese Methoden dürfen von der Replica lesen
+READ_METHODS = ("GET", "HEAD")
+DEFAULT_REFRESH = 5.0
+DEFAULT_MAX_LAG = 1.0
+# Job-Status/-Ergebnis ändern Worker-Threads, nicht der Benutzer → immer aktuell lesen
+DEFAULT_EXEMPT = ("api.api_list_jobs", "api.api_get_job", "api.api_get_job_result")
+# Auf den Snapshot-Verbindungen (nur lesend, Datei ändert sich nie)
+SNAPSHOT_PRAGMAS = {"cache_size": -64000, "mmap_size": 256 * 1024 * 1024, "temp_store": "MEMORY"}
+# Session-Schlüssel für den Zeitpunkt des letzten Schreibzugriffs
+WROTE_AT_KEY = "_wrote_at"
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SNAPSHOT_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+class SnapshotReplica:
+    """Read-Engine auf einer regelmäßig erneuerten Kopie der SQLite-Datei."""
+
+    def __init__(self, primary, directory, interval):
+        self.primary = primary
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._current = None       # (Engine, Pfad, as_of)
+        self._previous = None      # bleibt eine Runde für laufende Requests erhalten
+        self._generation = 0
+        self._thread_pid = None
+        self._stopping = threading.Event()
+        self.last_refresh_seconds = None
+        self.refresh_errors = 0
+
+    def current(self):
+        """(Engine, as_of) des aktuellen Snapshots oder (None, None), solange keiner existiert."""
+        current = self._current
+        return (current[0], current[2]) if current else (None, None)
+
+    def ensure_thread(self):
+        """Refresh-Thread in diesem Prozess starten (Threads überleben kein fork())."""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            # Nach fork() gehören Snapshot und Dateien dem Elternprozess
+            self._current = self._previous = None
+            self._stopping.clear()
+            threading.Thread(target=self._refresh_loop, name="replica-snapshot", daemon=True).start()
+            self._thread_pid = os.getpid()
+            atexit.register(self.close)
+
+    def _refresh_loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                self.refresh_errors += 1
+                logger.exception("Read snapshot refresh failed; reads stay on the previous snapshot.")
+            self._stopping.wait(self.interval)
+
+    def refresh(self):
+        """Neuen Snapshot per Backup-API erstellen und als aktuelle Read-Engine einsetzen."""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        start = time.perf_counter()
+        # Alles, was vor diesem Zeitpunkt committet wurde, ist im Snapshot enthalten
+        as_of = time.time()
+        self._generation += 1
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"snapshot-{os.getpid()}-{self._generation}.db")
+        source = self.primary.raw_connection()
+        try:
+            target = sqlite3.connect(path)
+            try:
+                # Ein Schritt: ein konsistenter Lese-Snapshot, Schreiber laufen im WAL-Modus weiter
+                source.driver_connection.backup(target)
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+        finally:
+            source.close()
+        engine = create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true")
+        event.listen(engine, "connect", _set_pragmas)
+        instrumentation.instrument_engine(engine)
+        with self._lock:
+            retired, self._previous, self._current = self._previous, self._current, (engine, path, as_of)
+        if retired is not None:
+            self._discard(retired)
+        self.last_refresh_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _discard(snapshot):
+        engine, path, _ = snapshot
+        engine.dispose()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Thread stoppen und die Snapshot-Dateien dieses Prozesses löschen."""
+        self._stopping.set()
+        with self._lock:
+            snapshots, self._current, self._previous = (self._current, self._previous), None, None
+        for snapshot in snapshots:
+            if snapshot is not None:
+                self._discard(snapshot)
+        for path in glob.glob(os.path.join(self.directory, f"snapshot-{os.getpid()}-*.db")):
+            os.remove(path)
+
+    def stats(self):
+        current = self._current
+        return {
+            "generation": self._generation,
+            "age_seconds": time.time() - current[2] if current else -1,
+            "refresh_seconds": self.last_refresh_seconds or 0.0,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+class UriReplica:
+    """Read-Engine auf einer extern replizierten Datenbank mit bekannter Höchstverzögerung."""
+
+    def __init__(self, uri, max_lag, engine_options):
+        self.engine = create_engine(uri, **engine_options)
+        self.max_lag = max_lag
+        instrumentation.instrument_engine(self.engine)
+
+    def current(self):
+        return self.engine, time.time() - self.max_lag
+
+    def ensure_thread(self):
+        pass
+
+    def close(self):
+        self.engine.dispose()
+
+    def stats(self):
+        return {"max_lag_seconds": self.max_lag}
+
+
+class ReadRouter:
+    """Wählt pro Request die Engine für Lesezugriffe (prozessweite Instanz `read_router`)."""
+
+    def __init__(self):
+        self.replica = None
+        self.exempt = frozenset(DEFAULT_EXEMPT)
+        self.replica_requests = 0
+        self.primary_requests = 0
+        self.sticky_requests = 0
+
+    def init_app(self, app):
+        """Replica aus READ_REPLICA einrichten und die Request-Hooks registrieren."""
+        setting = app.config.get("READ_REPLICA") or "off"
+        self.exempt = frozenset(app.config.get("READ_REPLICA_EXEMPT", DEFAULT_EXEMPT))
+        if self.replica is not None:
+            self.replica.close()
+        self.replica = None
+        if setting == "off":
+            return
+        with app.app_context():
+            primary = db.engine
+        if setting == "snapshot":
+            if primary.dialect.name != "sqlite" or primary.url.database in (None, "", ":memory:"):
+                raise ValueError("READ_REPLICA=snapshot requires a file-based SQLite database.")
+            directory = app.config.get("READ_REPLICA_DIR") or os.path.join(app.instance_path, "replica")
+            self.replica = SnapshotReplica(
+                primary, directory, app.config.get("READ_REPLICA_REFRESH", DEFAULT_REFRESH)
+            )
+        else:
+            self.replica = UriReplica(
+                setting,
+                app.config.get("READ_REPLICA_MAX_LAG", DEFAULT_MAX_LAG),
+                app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+            )
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        if self.replica is None:
+            return
+        self.replica.ensure_thread()
+        if request.method not in READ_METHODS or request.endpoint in self.exempt:
+            self.primary_requests += 1
+            return
+        engine, as_of = self.replica.current()
+        if engine is None:
+            self.primary_requests += 1
+        elif session.get(WROTE_AT_KEY, 0) > as_of:
+            # Eigene Änderung ist noch nicht in der Replica → primär lesen
+            self.sticky_requests += 1
+        else:
+            self.replica_requests += 1
+            g._read_engine = engine
+
+    def _after_request(self, response):
+        if g.pop("_db_wrote", False):
+            session[WROTE_AT_KEY] = time.time()
+        return response
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        values = {
+            "replica_requests": self.replica_requests,
+            "primary_requests": self.primary_requests,
+            "sticky_requests": self.sticky_requests,
+        }
+        if self.replica is not None:
+            values.update(self.replica.stats())
+        return values
+
+
+# Prozessweite Instanz
+read_router = ReadRouter()
@@ -0,0 +1,244 @@
+"""
+Volltextsuche über Kunden und Leads mit SQLite FTS5.
+
+Alle Kunden und Leads landen in einer gemeinsamen FTS5-Tabelle. Die rowid
+kodiert Typ und ID (Kunde: id * 2, Lead: id * 2 + 1), sodass Trigger einen
+Eintrag beim Ändern/Löschen direkt per rowid finden, statt die Tabelle
+zu durchsuchen. Die Trigger halten den Index bei jedem INSERT/UPDATE/DELETE
+synchron – auch bei Bulk-Imports, die am ORM vorbei schreiben.
+
+Die Spalte tenant enthält den Mandanten als Token ("t<ID>"). Die Suche
+verknüpft ihn per AND mit dem Suchtext, FTS5 schneidet also schon im Index
+auf die Treffer des eigenen Teams zu (Text-SQL bekommt keinen automatischen
+Mandantenfilter, siehe models.py).
+"""
+import logging
+import re
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from models import current_tenant_id, data_engine, db
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "search_index"
+
+# Maximale Trefferzahl pro Suche
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Anzahl Kandidaten, die höchstens nach Relevanz sortiert werden. Ein kurzes
+# Präfix wie "a" trifft schnell Hunderttausende Zeilen; bm25 für alle zu
+# berechnen kostet dann Hunderte Millisekunden. Gerankt werden deshalb nur
+# die neuesten Treffer, die FTS5 direkt über die rowid findet (Standard für
+# SEARCH_RANK_WINDOW, 0 = alle Treffer ranken); die API meldet das Abschneiden.
+RANK_WINDOW = 1000
+
+# Gewichtung für bm25 in Spaltenreihenfolge: Treffer im Namen zählen am meisten,
+# die Mandanten-Spalte zählt nicht
+BM25_WEIGHTS = (10.0, 5.0, 3.0, 0.0)
+
+# Typ → (Quelltabelle, Offset in der rowid-Kodierung)
+KINDS = {"customer": ("customers", 0), "lead": ("leads", 1)}
+
+# prefix='2 3': zusätzliche Präfix-Indizes, damit "jo*" bzw. "joh*" beim
+# Tippen keine Bereichssuche über den ganzen Term-Index braucht
+_CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    name, email, company, tenant,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, name, email, company, tenant)
+        VALUES (new.id * 2 + {offset}, new.name, new.email, new.company, 't' || new.tenant_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN
+        DELETE FROM {fts} WHERE rowid = old.id * 2 + {offset};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_au
+    AFTER UPDATE OF name, email, company, tenant_id ON {table} BEGIN
+        DELETE FROM {fts} WHERE rowid = old.id * 2 + {offset};
+        INSERT INTO {fts}(rowid, name, email, company, tenant)
+        VALUES (new.id * 2 + {offset}, new.name, new.email, new.company, 't' || new.tenant_id);
+    END
+    """,
+)
+
+_BACKFILL = """
+INSERT INTO {fts}(rowid, name, email, company, tenant)
+SELECT id * 2 + {offset}, name, email, company, 't' || tenant_id FROM {table}
+"""
+
+# URL der Datenbank → ob der Index dort verfügbar ist (bei TENANT_STORAGE=files
+# hat jede Mandanten-Datei ihren eigenen Index)
+_available = {}
+
+
+def is_available():
+    """True, wenn die Datenbank des Mandanten FTS5 unterstützt und der Index angelegt ist."""
+    engine = data_engine()
+    if not _available.get(engine.url):
+        # Der Index entsteht per Migration, ggf. in einem anderen Prozess → nachsehen
+        _available[engine.url] = engine.dialect.name == "sqlite" and _index_exists(db.session.connection())
+    return _available[engine.url]
+
+
+def _index_exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+
+
+def init_search_index(backfill=True):
+    """
+    Volltextindex samt Triggern anlegen (idempotent, innerhalb eines App-Kontexts).
+    Existiert die FTS-Tabelle noch nicht, werden alle vorhandenen Kunden und
+    Leads übernommen – in einem Statement oder, mit backfill=False, später
+    blockweise über index_rows (Migration 3).
+    """
+    engine = data_engine()
+    if engine.dialect.name != "sqlite":
+        logger.info("Full-text search index skipped: %s is not SQLite.", engine.dialect.name)
+        _available[engine.url] = False
+        return False
+
+    with engine.begin() as conn:
+        if not _index_exists(conn):
+            try:
+                conn.exec_driver_sql(_CREATE_TABLE)
+            except OperationalError:
+                logger.warning("SQLite was built without FTS5; /api/search is disabled.")
+                _available[engine.url] = False
+                return False
+            if backfill:
+                for table, offset in KINDS.values():
+                    conn.exec_driver_sql(_BACKFILL.format(fts=FTS_TABLE, table=table, offset=offset))
+
+        for table, offset in KINDS.values():
+            for trigger in _TRIGGERS:
+                conn.exec_driver_sql(trigger.format(fts=FTS_TABLE, table=table, offset=offset))
+
+    _available[engine.url] = True
+    return True
+
+
+def index_rows(table, offset, lower, upper):
+    """
+    Zeilen lower < id <= upper aus `table` in den Index übernehmen, die dort
+    noch fehlen (in der laufenden Transaktion der Session). Zeilen, die die
+    Trigger schon eingetragen haben, bleiben unverändert.
+    """
+    db.session.connection().exec_driver_sql(
+        _BACKFILL.format(fts=FTS_TABLE, table=table, offset=offset)
+        + " WHERE id > ? AND id <= ?"
+        f" AND NOT EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE rowid = id * 2 + {offset})",
+        (lower, upper),
+    )
+
+
+def drop_index_without_tenant():
+    """
+    Index ohne Mandanten-Spalte (vor Migration 6) samt Triggern löschen.
+    Gibt True zurück, wenn gelöscht wurde.
+    """
+    engine = data_engine()
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        if not _index_exists(conn):
+            return False
+        columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({FTS_TABLE})")}
+        if "tenant" in columns:
+            return False
+        for table, _ in KINDS.values():
+            for suffix in ("ai", "ad", "au"):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+        conn.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+    _available[engine.url] = False
+    return True
+
+
+def rebuild_search_index():
+    """Index komplett neu aufbauen (z.B. nach manuellen Änderungen an der DB)."""
+    with data_engine().begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+        for table, offset in KINDS.values():
+            conn.exec_driver_sql(_BACKFILL.format(fts=FTS_TABLE, table=table, offset=offset))
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def build_match_query(text):
+    """
+    Suchtext in eine FTS5-MATCH-Abfrage übersetzen.
+    Jedes Wort wird als Präfix gesucht ("acm" findet "Acme"), alle Wörter
+    müssen vorkommen. Sonderzeichen werden entfernt, damit Benutzereingaben
+    nie als FTS5-Syntax interpretiert werden.
+    """
+    tokens = re.findall(r"\w+", text or "")
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(text, limit=DEFAULT_LIMIT, kind=None):
+    """
+    Kunden/Leads des aktuellen Mandanten per Volltextsuche finden, nach
+    bm25-Relevanz sortiert. Gibt (Treffer, abgeschnitten) zurück;
+    abgeschnitten = True, wenn es mehr Treffer gab als gerankt wurden.
+    kind: optional "customer" oder "lead", um nur einen Typ zu suchen.
+    """
+    match = build_match_query(text)
+    if not match:
+        return [], False
+    # Suchtext nur in den Textspalten, Mandant als eigenes Token
+    match = f"{{name email company}} : ({match})"
+    tenant_id = current_tenant_id()
+    if tenant_id is not None:
+        match = f'tenant : "t{tenant_id}" AND {match}'
+
+    kind_filter = ""
+    params = {"match": match, "limit": limit, "after": -1}
+    if kind is not None:
+        kind_filter = "AND rowid % 2 = :offset"
+        params["offset"] = KINDS[kind][1]
+
+    window = current_app.config.get("SEARCH_RANK_WINDOW", RANK_WINDOW)
+    if window:
+        # Erster Treffer außerhalb des Fensters (absteigend nach rowid); gibt
+        # es ihn, werden nur die neueren gerankt
+        outside = db.session.execute(db.text(f"""
+            SELECT rowid FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH :match {kind_filter}
+            ORDER BY rowid DESC LIMIT 1 OFFSET :window
+        """), {**params, "window": window}).scalar()
+        if outside is not None:
+            params["after"] = outside
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT rowid, name, email, company, bm25({FTS_TABLE}, {weights}) AS score
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match {kind_filter} AND rowid > :after
+        ORDER BY score
+        LIMIT :limit
+    """
+
+    results = []
+    for rowid, name, email, company, score in db.session.execute(db.text(sql), params):
+        results.append({
+            "type": "lead" if rowid % 2 else "customer",
+            "id": rowid // 2,
+            "name": name,
+            "email": email,
+            "company": company,
+            "score": round(-score, 4),
+        })
+    return results, params["after"] >= 0
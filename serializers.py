@@ -0,0 +1,106 @@
+"""
+Schnelle Serialisierung von API-Listen.
+
+Die Listen-Endpunkte laden nur die API-Spalten als Row-Tupel
+(Customer.get_customer_rows / Lead.get_lead_rows) und kodieren sie hier:
+- json:     wie bisher (Liste von Objekten bzw. {"items", "next"})
+- columnar: {"columns": [...], "data": [[Spalte 1], [Spalte 2], ...]} –
+            kompakter, Feldnamen stehen nur einmal im Body
+- csv:      Kopfzeile + eine Zeile pro Datensatz
+- arrow:    Apache Arrow IPC-Stream (benötigt pyarrow)
+
+JSON wird – falls installiert – mit orjson kodiert, sonst mit dem
+Standardmodul json (kompakte Trennzeichen).
+"""
+import csv
+import importlib.util
+import io
+import json
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+# pyarrow ist optional und wird erst beim ersten format=arrow importiert
+# (allein der Import dauert länger als der restliche App-Start)
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+pyarrow = None
+
+FORMATS = ("json", "columnar", "csv", "arrow")
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+# Header mit dem Cursor der nächsten Seite bei csv/arrow (kein Platz im Body)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class FormatUnavailable(RuntimeError):
+    """Das gewünschte Format braucht ein nicht installiertes Paket."""
+
+
+def dumps(obj):
+    """Objekt als kompaktes JSON (bytes) kodieren."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_response(obj, status=200):
+    """Wie jsonify, aber mit dem schnellen Encoder (Schlüsselreihenfolge bleibt erhalten)."""
+    return Response(dumps(obj), status=status, mimetype="application/json")
+
+
+def render_rows(fmt, fields, rows, paged=False, next_cursor=None):
+    """
+    Row-Tupel (Reihenfolge wie `fields`) im Format `fmt` als Response ausgeben.
+    paged: Seite mit Cursor (json: {"items", "next"}; columnar: "next";
+    csv/arrow: Header X-Next-Cursor) statt kompletter Liste.
+    """
+    if fmt == "json":
+        items = [dict(zip(fields, row)) for row in rows]
+        return json_response({"items": items, "next": next_cursor} if paged else items)
+
+    if fmt == "columnar":
+        body = {"columns": list(fields), "data": _columns(fields, rows)}
+        if paged:
+            body["next"] = next_cursor
+        return json_response(body)
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        writer.writerows(rows)
+        response = Response(buffer.getvalue(), mimetype="text/csv")
+    elif fmt == "arrow":
+        response = Response(_arrow_ipc(fields, rows), mimetype=ARROW_MIMETYPE)
+    else:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}.")
+
+    if paged and next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_cursor)
+    return response
+
+
+def _columns(fields, rows):
+    if not rows:
+        return [[] for _ in fields]
+    return [list(column) for column in zip(*rows)]
+
+
+def _import_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        import pyarrow.ipc  # bindet das globale `pyarrow` samt Untermodul ipc
+
+
+def _arrow_ipc(fields, rows):
+    if not HAVE_PYARROW:
+        raise FormatUnavailable("format=arrow requires the pyarrow package.")
+    _import_pyarrow()
+    table = pyarrow.table(dict(zip(fields, _columns(fields, rows))))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,446 @@
+"""
+Austauschbare Session-Backends mit möglichst wenigen Schreibzugriffen.
+
+SESSION_BACKEND (bzw. Umgebungsvariable CRM_SESSION_BACKEND) wählt:
+- "cached":     LRU-Cache im Prozess, Write-Behind in die Tabelle 'sessions'
+                (Standard). Änderungen werden gesammelt und von einem
+                Hintergrund-Thread gebündelt in einer Transaktion geschrieben.
+- "cookie":     signiertes Session-Cookie (Flask-Standard), keine Serverdaten.
+- "filesystem": eine Datei pro Session im Instanzordner (JSON wie in der
+                Datenbank).
+
+Für alle serverseitigen Backends gilt: Geschrieben wird nur, wenn sich der
+Session-Inhalt wirklich geändert hat – oder wenn bei permanenten Sessions
+mehr als die Hälfte der Laufzeit verstrichen ist und das Ablaufdatum
+verlängert werden muss. Abgelaufene Sessions entfernt ein Hintergrund-Thread.
+
+Login und Logout (Wechsel des eingeloggten Benutzers) bekommen eine neue
+Session-ID; die alte wird gelöscht. Ein Cookie mit der alten ID gilt damit
+nicht mehr (bei "cached" in anderen Prozessen spätestens nach
+SESSION_CACHE_TTL Sekunden, solange sie die alte ID noch im Cache haben).
+
+Hinweis zu "cached" mit mehreren Worker-Prozessen: jeder Prozess hat seinen
+eigenen Cache. Neue Sessions (auch nach Login/Logout mit neuer ID) und
+Löschungen (Logout, session.clear()) werden sofort geschrieben, andere
+Prozesse sehen sie also beim nächsten Request. Nur Änderungen an
+bestehenden Sessions gehen über das Write-Behind und erreichen die
+Datenbank nach höchstens SESSION_WRITE_BEHIND_INTERVAL Sekunden; ein
+anderer Prozess kann bis zu SESSION_CACHE_TTL Sekunden den älteren Stand
+aus seinem Cache lesen.
+"""
+import atexit
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ("cached", "cookie", "filesystem")
+
+# Tabelle für serverseitige Sessions (Schema kompatibel zu Flask-Session)
+sessions_table = db.Table(
+    "sessions",
+    db.Column("id", db.Integer, primary_key=True),
+    db.Column("session_id", db.String(255), unique=True),
+    db.Column("data", db.LargeBinary),
+    db.Column("expiry", db.DateTime),
+    db.Index("ix_sessions_expiry", "expiry"),
+    # Bleibt bei einer Datei pro Mandant in der primären Datenbank (tenancy.py)
+    info={"shared": True},
+)
+
+
+def _utcnow():
+    # Naive UTC-Zeit, passend zur DateTime-Spalte ohne Zeitzone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _is_empty(session):
+    """True, wenn die Session außer dem '_permanent'-Flag keine Daten enthält."""
+    return all(key == "_permanent" for key in session)
+
+
+def _user_of(data):
+    # Von Flask-Login gesetzte ID des eingeloggten Benutzers
+    return data.get("_user_id")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session-Dict mit Session-ID; merkt sich, ob es verändert wurde."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Eingeloggter Benutzer beim Laden (Login/Logout erkennen)
+        self.stored_user = _user_of(self)
+
+
+class _ServerSideSessionInterface(SessionInterface):
+    """
+    Gemeinsame Logik der serverseitigen Backends:
+    signierte Session-ID im Cookie, Daten im Backend.
+    Unterklassen implementieren _load, _store, _delete und _sweep.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, app):
+        self.permanent = app.config.get("SESSION_PERMANENT", True)
+        self.sweep_interval = app.config.get("SESSION_SWEEP_INTERVAL", 300)
+        self._sweeper = None
+        self._sweeper_pid = None
+        self._stop = threading.Event()
+
+    # --- Session-ID im Cookie -------------------------------------------
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="crm-session")
+
+    def _new_session(self):
+        session = ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+        session.permanent = self.permanent
+        # Das Setzen von 'permanent' allein ist noch keine Änderung
+        session.modified = False
+        return session
+
+    def open_session(self, app, request):
+        self._ensure_background_thread(app)
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self._new_session()
+
+        stored = self._load(sid)
+        if stored is None:
+            return self._new_session()
+        data, expiry = stored
+        if expiry is not None and expiry <= _utcnow():
+            self._delete(sid)
+            return self._new_session()
+        session = ServerSideSession(data, sid=sid)
+        session.stored_expiry = expiry
+        return session
+
+    # --- Speichern --------------------------------------------------------
+    def _needs_refresh(self, app, session, expires):
+        """
+        Nur-Lesen-Requests verlängern eine permanente Session nicht bei jedem
+        Aufruf, sondern erst, wenn mehr als die Hälfte der Laufzeit vorbei ist.
+        """
+        stored = getattr(session, "stored_expiry", None)
+        if expires is None or stored is None:
+            return False
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        return (stored - _utcnow()).total_seconds() < lifetime / 2
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if _is_empty(session):
+            # Leere Session (z.B. anonyme Besucher) wird nie gespeichert;
+            # hatte sie vorher Daten, wird sie gelöscht
+            if session.modified and not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        expires = self.get_expiration_time(app, session)
+        # Naive UTC-Zeit für die Datenbank; None = Browser-Session
+        expiry = expires.replace(tzinfo=None) if expires else None
+        login_changed = _user_of(session) != session.stored_user
+        if login_changed and not session.new:
+            # Neue ID nach Login/Logout: alte Cookies (und Caches anderer
+            # Prozesse unter der alten ID) zeigen nicht auf den neuen Stand
+            self._delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+        if session.modified or session.new or self._needs_refresh(app, session, expires):
+            self._store(session.sid, dict(session), expiry, immediate=session.new)
+
+        if session.modified or session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode()).decode(),
+                expires=expires,
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    # --- Hintergrund-Thread ----------------------------------------------
+    def _ensure_background_thread(self, app):
+        """
+        Hintergrund-Thread pro Prozess starten (auch nach einem fork(),
+        z.B. bei Gunicorn mit --preload, wo Threads nicht mitkopiert werden).
+        """
+        if self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        self._sweeper = threading.Thread(
+            target=self._background_loop, args=(app,), name="session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def _background_loop(self, app):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stop.wait(self._tick_interval()):
+            try:
+                with app.app_context():
+                    self._on_tick()
+                    if time.monotonic() >= next_sweep:
+                        removed = self._sweep(_utcnow())
+                        if removed:
+                            logger.info("Removed %d expired sessions.", removed)
+                        next_sweep = time.monotonic() + self.sweep_interval
+            except Exception:
+                logger.exception("Session background task failed.")
+
+    def _tick_interval(self):
+        return self.sweep_interval
+
+    def close(self):
+        """Hintergrund-Thread beenden (z.B. in Tests und Benchmarks)."""
+        self._stop.set()
+
+    def _on_tick(self):
+        """Wird bei jedem Durchlauf des Hintergrund-Threads aufgerufen."""
+
+    # --- Von Unterklassen zu implementieren ------------------------------
+    def _load(self, sid):
+        """(data, expiry) oder None zurückgeben."""
+        raise NotImplementedError
+
+    def _store(self, sid, data, expiry, immediate=False):
+        """immediate: sofort dauerhaft schreiben (neue Session), nicht verzögert."""
+        raise NotImplementedError
+
+    def _delete(self, sid):
+        """Sofort löschen."""
+        raise NotImplementedError
+
+    def _sweep(self, now):
+        """Abgelaufene Sessions entfernen, Anzahl zurückgeben."""
+        raise NotImplementedError
+
+
+class CachedSqlSessionInterface(_ServerSideSessionInterface):
+    """
+    Sessions in der Tabelle 'sessions' mit LRU-Cache davor.
+    Lesen: zuerst Cache, nur bei Fehlschlag (oder abgelaufener Cache-TTL) DB.
+    Schreiben: Änderungen bestehender Sessions landen in einer Warteschlange
+    (pro Session-ID wird nur der letzte Stand behalten) und werden gebündelt
+    geschrieben; neue Sessions und Löschungen gehen direkt in die Datenbank.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.cache_size = app.config.get("SESSION_CACHE_SIZE", 10000)
+        self.cache_ttl = app.config.get("SESSION_CACHE_TTL", 30)
+        self.write_behind_interval = app.config.get("SESSION_WRITE_BEHIND_INTERVAL", 1.0)
+        self._lock = threading.Lock()
+        # Reihenfolge der Schreibzugriffe: ein laufender flush() überschreibt
+        # keinen direkt geschriebenen, neueren Stand
+        self._write_lock = threading.Lock()
+        # sid → (data, expiry, geladen um)
+        self._cache = OrderedDict()
+        # sid → (data, expiry) zum Schreiben
+        self._pending = {}
+        self._app = app
+        atexit.register(self.flush)
+
+    def _load(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            if sid in self._pending:
+                data, expiry = self._pending[sid]
+                return dict(data), expiry
+            cached = self._cache.get(sid)
+            if cached is not None and now - cached[2] < self.cache_ttl:
+                self._cache.move_to_end(sid)
+                return dict(cached[0]), cached[1]
+
+        row = db.session.execute(
+            db.select(sessions_table.c.data, sessions_table.c.expiry).where(
+                sessions_table.c.session_id == sid
+            )
+        ).first()
+        if row is None:
+            return None
+        try:
+            data = self.serializer.loads(row.data.decode())
+        except (ValueError, UnicodeDecodeError):
+            # z.B. noch von Flask-Session gespeicherte (pickle) Daten
+            return None
+        self._remember(sid, data, row.expiry)
+        return dict(data), row.expiry
+
+    def _remember(self, sid, data, expiry):
+        with self._lock:
+            self._cache[sid] = (data, expiry, time.monotonic())
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _store(self, sid, data, expiry, immediate=False):
+        self._remember(sid, data, expiry)
+        if immediate or not self.write_behind_interval:
+            with self._write_lock:
+                with self._lock:
+                    self._pending.pop(sid, None)
+                self._write({sid: (data, expiry)}, [])
+            return
+        with self._lock:
+            self._pending[sid] = (data, expiry)
+
+    def _delete(self, sid):
+        with self._write_lock:
+            with self._lock:
+                self._cache.pop(sid, None)
+                self._pending.pop(sid, None)
+            self._write({}, [sid])
+
+    def _tick_interval(self):
+        return self.write_behind_interval or self.sweep_interval
+
+    def _on_tick(self):
+        self.flush()
+
+    def close(self):
+        super().close()
+        self.flush()
+
+    def flush(self):
+        """Alle ausstehenden Änderungen in einer Transaktion schreiben."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending:
+                self._write(pending, [])
+
+    def _write(self, pending, deletes):
+        upserts = [
+            {"session_id": sid, "data": self.serializer.dumps(data).encode(), "expiry": expiry}
+            for sid, (data, expiry) in pending.items()
+        ]
+        with self._app.app_context():
+            engine = db.engine
+            with engine.begin() as conn:
+                if deletes:
+                    conn.execute(
+                        sessions_table.delete().where(sessions_table.c.session_id.in_(deletes))
+                    )
+                if upserts:
+                    conn.execute(_upsert_statement(engine.dialect.name), upserts)
+
+    def _sweep(self, now):
+        with self._lock:
+            for sid in [s for s, (_, exp, _) in self._cache.items() if exp and exp <= now]:
+                del self._cache[sid]
+        with db.engine.begin() as conn:
+            result = conn.execute(sessions_table.delete().where(sessions_table.c.expiry <= now))
+        return result.rowcount
+
+
+def _upsert_statement(dialect_name):
+    """INSERT … ON CONFLICT(session_id) DO UPDATE für SQLite bzw. PostgreSQL."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(sessions_table)
+    return stmt.on_conflict_do_update(
+        index_elements=[sessions_table.c.session_id],
+        set_={"data": stmt.excluded.data, "expiry": stmt.excluded.expiry},
+    )
+
+
+class FileSystemSessionInterface(_ServerSideSessionInterface):
+    """Eine Datei pro Session; geschrieben wird atomar über eine Temp-Datei."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.directory = app.config.get(
+            "SESSION_FILE_DIR", os.path.join(app.instance_path, "sessions")
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, sid):
+        # Die Session-ID ist URL-sicher (token_urlsafe) und damit ein gültiger Dateiname
+        return os.path.join(self.directory, sid)
+
+    def _load(self, sid):
+        try:
+            with open(self._path(sid), "rb") as fh:
+                stored = self.serializer.loads(fh.read().decode())
+            expiry = stored["expiry"]
+            return stored["data"], datetime.fromisoformat(expiry) if expiry else None
+        except (OSError, ValueError, UnicodeDecodeError, KeyError, TypeError):
+            # z.B. noch mit pickle gespeicherte Sessions
+            return None
+
+    def _store(self, sid, data, expiry, immediate=False):
+        # Gleiches JSON-Format wie in der Datenbank; expiry als ISO-String,
+        # weil der Serializer Datumswerte nur sekundengenau und mit Zeitzone liefert
+        payload = {"data": data, "expiry": expiry.isoformat() if expiry else None}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(self.serializer.dumps(payload).encode())
+        os.replace(tmp_path, self._path(sid))
+
+    def _delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self, now):
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("."):
+                continue
+            stored = self._load(entry.name)
+            if stored is None or (stored[1] is not None and stored[1] <= now):
+                self._delete(entry.name)
+                removed += 1
+        return removed
+
+
+def create_session_interface(app, backend=None):
+    """Session-Interface für das konfigurierte Backend erzeugen."""
+    backend = backend or app.config.get("SESSION_BACKEND", "cached")
+    if backend == "cached":
+        return CachedSqlSessionInterface(app)
+    if backend == "cookie":
+        return SecureCookieSessionInterface()
+    if backend == "filesystem":
+        return FileSystemSessionInterface(app)
+    raise ValueError(f"SESSION_BACKEND must be one of: {', '.join(SESSION_BACKENDS)}")
+
+
+def init_session(app):
+    """Konfiguriertes Session-Backend an der App registrieren."""
+    app.session_interface = create_session_interface(app)
+    return app.session_interface
@@ -0,0 +1,202 @@
+"""
+Dashboard-Kennzahlen mit In-Process-Cache.
+
+Statt bei jedem Dashboard-Aufruf die Tabellen zu zählen, hält
+`DashboardStats` die Kennzahlen im Speicher:
+- Schreibzugriffe dieses Prozesses (Signale aus models.py) werden sofort
+  als Delta eingerechnet, das Dashboard ist damit ohne DB-Zugriff aktuell.
+- Nach Ablauf der TTL werden die Zahlen per GROUP BY neu aus der Datenbank
+  berechnet (Reconcile). Das gleicht Schreibzugriffe anderer Worker-Prozesse
+  und Rundungsfehler bei Summen aus.
+- Kennzahlen werden pro Mandant gehalten; ein Delta gilt dem Mandanten des
+  schreibenden Requests/Jobs.
+"""
+import copy
+import threading
+import time
+from collections import defaultdict
+
+from models import (
+    Customer,
+    Lead,
+    current_tenant_id,
+    db,
+    row_added,
+    row_deleted,
+    row_updated,
+    rows_deleted,
+    rows_imported,
+    rows_updated,
+)
+
+# Sekunden, nach denen der Cache aus der Datenbank neu berechnet wird
+DEFAULT_TTL = 60
+
+
+def _empty_stats():
+    return {
+        "customers": {"total": 0, "by_status": defaultdict(int)},
+        "leads": {
+            "total": 0,
+            "pipeline_value": 0.0,
+            "by_status": defaultdict(lambda: {"count": 0, "value": 0.0}),
+            "by_source": defaultdict(lambda: {"count": 0, "value": 0.0}),
+        },
+    }
+
+
+class DashboardStats:
+    """Thread-sicherer Cache für Kunden- und Lead-Kennzahlen."""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Mandant → Kennzahlen bzw. Zeitpunkt der Berechnung
+        self._stats = {}
+        self._loaded_at = {}
+        # Wird bei jedem Delta erhöht; so erkennt reconcile(), ob während der
+        # (lock-freien) DB-Abfrage Änderungen eingerechnet wurden
+        self._generation = 0
+
+    def init_app(self, app):
+        """TTL aus der App-Konfiguration übernehmen (STATS_CACHE_TTL)."""
+        self.ttl = app.config.get("STATS_CACHE_TTL", DEFAULT_TTL)
+
+    # -----------------------
+    # Lesen
+    # -----------------------
+    def get(self):
+        """Aktuelle Kennzahlen als einfache Dicts (bei abgelaufener TTL neu berechnet)."""
+        tenant_id = current_tenant_id()
+        with self._lock:
+            stats = self._stats.get(tenant_id)
+            if stats is not None and time.monotonic() - self._loaded_at[tenant_id] < self.ttl:
+                return self._export(stats)
+        return self.reconcile()
+
+    def invalidate(self):
+        """Cache verwerfen; der nächste Zugriff rechnet neu."""
+        with self._lock:
+            self._stats.clear()
+
+    def reconcile(self):
+        """Kennzahlen des Mandanten per GROUP BY aus der Datenbank berechnen und cachen."""
+        tenant_id = current_tenant_id()
+        with self._lock:
+            generation = self._generation
+
+        stats = _empty_stats()
+        # Fehlender Status zählt wie in _apply als Standardstatus des Modells
+        customer_status = db.func.coalesce(Customer.status, "prospect")
+        lead_status = db.func.coalesce(Lead.status, "new")
+        for status, count in db.session.execute(
+            db.select(customer_status, db.func.count()).group_by(customer_status)
+        ):
+            stats["customers"]["by_status"][status] = count
+            stats["customers"]["total"] += count
+        for status, count, value in db.session.execute(
+            db.select(lead_status, db.func.count(), db.func.sum(Lead.value)).group_by(lead_status)
+        ):
+            stats["leads"]["by_status"][status] = {"count": count, "value": value or 0.0}
+            stats["leads"]["total"] += count
+            stats["leads"]["pipeline_value"] += value or 0.0
+        for source, count, value in db.session.execute(
+            db.select(Lead.source, db.func.count(), db.func.sum(Lead.value)).group_by(Lead.source)
+        ):
+            stats["leads"]["by_source"][source] = {"count": count, "value": value or 0.0}
+
+        with self._lock:
+            self._stats[tenant_id] = stats
+            # Kam während der Abfrage ein Delta dazu, ist nicht sicher, ob es im
+            # Ergebnis enthalten ist → beim nächsten Zugriff erneut abgleichen
+            self._loaded_at[tenant_id] = time.monotonic() if generation == self._generation else 0.0
+            return self._export(stats)
+
+    @staticmethod
+    def _export(stats):
+        """Interne defaultdicts in JSON-taugliche Dicts kopieren (leere Gruppen entfallen)."""
+        data = copy.deepcopy(stats)
+        customers, leads = data["customers"], data["leads"]
+        customers["by_status"] = {k: v for k, v in customers["by_status"].items() if v}
+        for key in ("by_status", "by_source"):
+            leads[key] = {
+                k: {"count": v["count"], "value": round(v["value"], 2)}
+                for k, v in leads[key].items()
+                if v["count"]
+            }
+        leads["pipeline_value"] = round(leads["pipeline_value"], 2)
+        return data
+
+    # -----------------------
+    # Inkrementelle Updates
+    # -----------------------
+    @staticmethod
+    def _apply(stats, model, row, sign):
+        """Eine Zeile zu den Kennzahlen addieren (sign=1) oder abziehen (sign=-1)."""
+        if model is Customer:
+            customers = stats["customers"]
+            customers["total"] += sign
+            customers["by_status"][row.get("status") or "prospect"] += sign
+        elif model is Lead:
+            leads = stats["leads"]
+            value = sign * (row.get("value") or 0.0)
+            leads["total"] += sign
+            leads["pipeline_value"] += value
+            groups = (("by_status", row.get("status") or "new"), ("by_source", row.get("source")))
+            for key, group in groups:
+                bucket = leads[key][group]
+                bucket["count"] += sign
+                bucket["value"] += value
+
+    def apply_delta(self, model, added=(), removed=()):
+        """Hinzugefügte/entfernte Zeilen einrechnen (ohne Cache: nichts zu tun)."""
+        tenant_id = current_tenant_id()
+        with self._lock:
+            self._generation += 1
+            if tenant_id is None:
+                # Schreibzugriff ohne Mandantenfilter (Wartung): betrifft womöglich alle
+                self._stats.clear()
+                return
+            # Kennzahlen über alle Mandanten (ungefiltert berechnet) sind jetzt veraltet
+            self._stats.pop(None, None)
+            stats = self._stats.get(tenant_id)
+            if stats is None:
+                return
+            for row in removed:
+                self._apply(stats, model, row, -1)
+            for row in added:
+                self._apply(stats, model, row, 1)
+
+
+# Prozessweite Instanz, die von Dashboard und API genutzt wird
+dashboard_stats = DashboardStats()
+
+
+@row_added.connect
+def _on_row_added(model, row, **extra):
+    dashboard_stats.apply_delta(model, added=[row])
+
+
+@rows_imported.connect
+def _on_rows_imported(model, rows, **extra):
+    dashboard_stats.apply_delta(model, added=rows)
+
+
+@row_updated.connect
+def _on_row_updated(model, before, after, **extra):
+    dashboard_stats.apply_delta(model, added=[after], removed=[before])
+
+
+@row_deleted.connect
+def _on_row_deleted(model, row, **extra):
+    dashboard_stats.apply_delta(model, removed=[row])
+
+
+@rows_updated.connect
+def _on_rows_updated(model, before, after, **extra):
+    dashboard_stats.apply_delta(model, added=after, removed=before)
+
+
+@rows_deleted.connect
+def _on_rows_deleted(model, rows, **extra):
+    dashboard_stats.apply_delta(model, removed=rows)
@@ -0,0 +1,95 @@
+"""
+Template-Rendering: Bytecode-Cache für Jinja und Fragment-Cache für Listen.
+
+- Bytecode-Cache: kompilierte Templates landen als Dateien in
+  JINJA_BYTECODE_CACHE_DIR (Standard: instance/jinja-cache). Ein frisch
+  gestarteter Worker lädt sie, statt jedes Template neu zu parsen und zu
+  kompilieren; geänderte Templates erkennt Jinja an der Prüfsumme.
+- Fragment-Cache: fertig gerenderte HTML-Teile (z.B. der Tabellenkörper
+  einer Listenseite) im Speicher. Der Schlüssel enthält die Versionen der
+  beteiligten Tabellen (TableVersion), jede Schreiboperation macht alte
+  Einträge also unerreichbar; sie fallen per LRU heraus. Fragmente dürfen nur
+  von Rolle und Parametern abhängen, nicht vom einzelnen Benutzer; der
+  Mandant steht automatisch im Schlüssel.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from models import TableVersion, current_tenant_id
+
+# Anzahl gecachter Fragmente (0 = Fragment-Cache aus)
+DEFAULT_FRAGMENT_CACHE_SIZE = 256
+# Fragmente darüber werden nicht gecacht (Zeichen)
+DEFAULT_FRAGMENT_MAX_SIZE = 2 * 1024 * 1024
+
+
+class FragmentCache:
+    """LRU-Cache: Schlüssel → (HTML als Markup, Zusatzwert)."""
+
+    def __init__(self, max_entries=DEFAULT_FRAGMENT_CACHE_SIZE, max_size=DEFAULT_FRAGMENT_MAX_SIZE):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Cache-Größe und Jinja-Bytecode-Cache aus der App-Konfiguration einrichten."""
+        self.max_entries = app.config.get("FRAGMENT_CACHE_SIZE", DEFAULT_FRAGMENT_CACHE_SIZE)
+        self.max_size = app.config.get("FRAGMENT_CACHE_MAX_SIZE", DEFAULT_FRAGMENT_MAX_SIZE)
+        directory = app.config.get("JINJA_BYTECODE_CACHE_DIR")
+        if directory is None:
+            directory = os.path.join(app.instance_path, "jinja-cache")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    def render(self, key, tables, render):
+        """
+        Fragment zu `key` aus dem Cache liefern oder mit `render()` erzeugen.
+        render() gibt (HTML, Zusatzwert) zurück, z.B. den Cursor der nächsten
+        Seite; beides wird gemeinsam gecacht. Rückgabe: (Markup, Zusatzwert).
+        """
+        versions = TableVersion.get_versions(tables)
+        full_key = (current_tenant_id(), key, tuple(versions[name][0] for name in tables))
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        html, extra = render()
+        entry = (Markup(html), extra)
+        if self.max_entries and len(html) <= self.max_size:
+            with self._lock:
+                self._entries[full_key] = entry
+                self._entries.move_to_end(full_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "chars": sum(len(html) for html, _ in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Prozessweite Instanz
+fragment_cache = FragmentCache()
@@ -0,0 +1,249 @@
+"""
+Mandanten (Teams): Kontext pro Request/Job, Verwaltung und optional eine
+SQLite-Datei pro Mandant.
+
+- Jeder Benutzer gehört zu einem Mandanten (users.tenant_id). Kunden, Leads,
+  Tombstones und Jobs tragen tenant_id (TenantScoped, models.py).
+- before_request setzt den Mandanten des eingeloggten Benutzers. Anonyme
+  Requests bekommen keinen (NO_TENANT_ID) und sehen keine Zeilen; die
+  API-Endpunkte mit Mandantendaten antworten ihnen mit 401. Ab da hängt
+  RoutingSession an jede ORM-Abfrage und jedes ORM-UPDATE/-DELETE
+  tenant_id = ... an – Listen, Zählungen, Detailseiten, Änderungs-Feed,
+  Jobs; neue Zeilen bekommen den Mandanten als Default. Jobs laufen im Mandanten ihres Auftraggebers.
+- Alle Indizes von Kunden und Leads beginnen mit tenant_id: Listen und
+  Zählungen eines Teams lesen nur dessen Indexbereich.
+- Am ORM vorbei (Core über connection(), Text-SQL wie die Volltextsuche)
+  steht der Filter explizit im Code (tenant_clause, Token im FTS-Index).
+  Gecachte Ergebnisse (ETag/Body, Fragmente, Auswertungen, Kennzahlen)
+  sind nach Mandant getrennt.
+
+TENANT_STORAGE="files": die Daten jedes Mandanten liegen in einer eigenen
+SQLite-Datei (TENANT_DIR/tenant-<ID>.db, Standard instance/tenants); users,
+tenants, jobs und sessions bleiben in der primären Datenbank. Die Engines
+(je ein Connection-Pool) hält ein LRU-Cache mit TENANT_ENGINE_CACHE_SIZE
+Einträgen, verdrängte Engines werden geschlossen. Eine Datei bekommt beim
+ersten Öffnen im Prozess alle ausstehenden Migrationen. Vorhandene Daten
+werden beim Umstellen nicht verschoben.
+
+    flask --app app tenants create "Sales North"
+    flask --app app tenants assign alice 2
+    flask --app app tenants list
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import click
+from flask import g
+from flask.cli import with_appcontext
+from flask_login import current_user
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+
+from db_config import sqlite_pragma_listener
+from instrumentation import instrumentation
+from migrations import migrator
+from models import DEFAULT_TENANT_ID, NO_TENANT_ID, Customer, Lead, Tenant, User, db
+
+STORAGE_MODES = ("shared", "files")
+DEFAULT_ENGINE_CACHE_SIZE = 32
+
+
+class TenantRouter:
+    """Mandanten-Kontext und Engine-Cache (prozessweite Instanz `tenant_router`)."""
+
+    def __init__(self):
+        self.storage = "shared"
+        self.directory = None
+        self.cache_size = DEFAULT_ENGINE_CACHE_SIZE
+        self._app = None
+        self._lock = threading.Lock()
+        self._engines = OrderedDict()
+        # Mandanten, deren Datei in diesem Prozess schon migriert wurde
+        self._prepared = set()
+        self.engine_hits = 0
+        self.engine_opens = 0
+        self.engine_evictions = 0
+
+    def init_app(self, app):
+        """Speicherart aus TENANT_STORAGE übernehmen, Request-Hook und CLI `tenants` registrieren."""
+        storage = app.config.get("TENANT_STORAGE") or "shared"
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"TENANT_STORAGE must be one of: {', '.join(STORAGE_MODES)}.")
+        if storage == "files":
+            if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite:"):
+                raise ValueError("TENANT_STORAGE=files requires SQLite.")
+            if (app.config.get("READ_REPLICA") or "off") != "off":
+                # Die Replica kopiert nur die primäre Datei, nicht die der Mandanten
+                raise ValueError("TENANT_STORAGE=files cannot be combined with READ_REPLICA.")
+        self.close()
+        self._app = app
+        self.storage = storage
+        self.directory = app.config.get("TENANT_DIR") or os.path.join(app.instance_path, "tenants")
+        self.cache_size = max(1, app.config.get("TENANT_ENGINE_CACHE_SIZE", DEFAULT_ENGINE_CACHE_SIZE))
+        app.before_request(self._before_request)
+        app.cli.add_command(tenants_cli)
+
+    # -----------------------
+    # Kontext
+    # -----------------------
+    def _before_request(self):
+        if current_user.is_authenticated:
+            self.enter(current_user.tenant_id)
+        else:
+            # Kein Mandant (auch keine Datei öffnen): Abfragen liefern nichts
+            g.tenant_id, g._tenant_engine = NO_TENANT_ID, None
+
+    def enter(self, tenant_id, scoped=True):
+        """
+        Mandanten für den Rest des App-Kontexts setzen. scoped=False: Daten
+        des Mandanten (Datei), aber ohne Filter – für Wartung über alle Zeilen.
+        """
+        g.tenant_id = tenant_id if scoped else None
+        g._tenant_engine = self.engine(tenant_id) if self.storage == "files" else None
+
+    @contextmanager
+    def context(self, tenant_id, scoped=True):
+        """Wie enter(), danach wird der vorherige Mandant wiederhergestellt."""
+        previous = (g.get("tenant_id", DEFAULT_TENANT_ID), g.get("_tenant_engine"))
+        self.enter(tenant_id, scoped)
+        try:
+            yield
+        finally:
+            g.tenant_id, g._tenant_engine = previous
+
+    # -----------------------
+    # Engines (TENANT_STORAGE=files)
+    # -----------------------
+    def engine_for(self, tenant_id):
+        """Engine, in der die Daten des Mandanten liegen (ohne Datei pro Mandant: db.engine)."""
+        if self.storage != "files" or tenant_id is None:
+            return db.engine
+        return self.engine(tenant_id)
+
+    def engines(self):
+        """(Mandant, Engine) aller Datenbanken mit Mandantendaten, z.B. für die Retention."""
+        if self.storage != "files":
+            return [(None, db.engine)]
+        tenant_ids = db.session.scalars(db.select(Tenant.id).order_by(Tenant.id)).all()
+        db.session.rollback()
+        return [(tenant_id, self.engine(tenant_id)) for tenant_id in tenant_ids]
+
+    def engine(self, tenant_id):
+        """Engine der Mandanten-Datei aus dem LRU-Cache (bei Bedarf öffnen und migrieren)."""
+        with self._lock:
+            engine = self._engines.get(tenant_id)
+            if engine is not None:
+                self._engines.move_to_end(tenant_id)
+                self.engine_hits += 1
+                return engine
+            # Unter der Sperre: eine neue Datei wird genau einmal migriert
+            engine = self._open(tenant_id)
+            self._engines[tenant_id] = engine
+            while len(self._engines) > self.cache_size:
+                _, evicted = self._engines.popitem(last=False)
+                # Ausgeliehene Verbindungen bleiben gültig und werden bei Rückgabe geschlossen
+                evicted.dispose()
+                self.engine_evictions += 1
+            return engine
+
+    def _open(self, tenant_id):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"tenant-{int(tenant_id)}.db")
+        engine = create_engine(
+            f"sqlite:///{path}", **self._app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        )
+        pragmas = self._app.config.get("SQLITE_PRAGMAS")
+        if pragmas:
+            event.listen(engine, "connect", sqlite_pragma_listener(pragmas))
+        instrumentation.instrument_engine(engine)
+        self.engine_opens += 1
+        if tenant_id not in self._prepared:
+            # Eigener App-Kontext → eigene Session, unabhängig vom laufenden Request
+            with self._app.app_context():
+                g.tenant_id, g._tenant_engine = tenant_id, engine
+                migrator.upgrade()
+            self._prepared.add(tenant_id)
+        return engine
+
+    def close(self):
+        """Alle Engines schließen (z.B. beim erneuten init_app in Benchmarks)."""
+        with self._lock:
+            engines, self._engines = list(self._engines.values()), OrderedDict()
+            self._prepared.clear()
+        for engine in engines:
+            engine.dispose()
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            open_engines = len(self._engines)
+        return {
+            "open_engines": open_engines,
+            "engine_cache_size": self.cache_size,
+            "engine_hits": self.engine_hits,
+            "engine_opens": self.engine_opens,
+            "engine_evictions": self.engine_evictions,
+        }
+
+
+# Prozessweite Instanz
+tenant_router = TenantRouter()
+
+
+# -----------------------
+# CLI
+# -----------------------
+@click.group("tenants")
+def tenants_cli():
+    """Manage tenants (sales teams) and their users."""
+
+
+@tenants_cli.command("list")
+@with_appcontext
+def list_tenants_command():
+    """List tenants with their number of users, customers and leads."""
+    users = dict(db.session.execute(
+        db.select(User.tenant_id, db.func.count()).group_by(User.tenant_id)
+    ).all())
+    for tenant in db.session.scalars(db.select(Tenant).order_by(Tenant.id)).all():
+        # Gezählt wird wie in der App: im Mandanten, über dessen Indexbereich
+        with tenant_router.context(tenant.id):
+            customers = db.session.scalar(db.select(db.func.count()).select_from(Customer))
+            leads = db.session.scalar(db.select(db.func.count()).select_from(Lead))
+        click.echo(
+            f"{tenant.id:>4}  {tenant.name:<30} {users.get(tenant.id, 0):>5} users"
+            f"  {customers:>9,} customers  {leads:>9,} leads"
+        )
+
+
+@tenants_cli.command("create")
+@click.argument("name")
+@with_appcontext
+def create_tenant_command(name):
+    """Create a tenant and print its id."""
+    tenant = Tenant(name=name.strip())
+    db.session.add(tenant)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise click.ClickException(f"A tenant named {name!r} already exists.")
+    click.echo(f"Created tenant {tenant.id} ({tenant.name}).")
+
+
+@tenants_cli.command("assign")
+@click.argument("username")
+@click.argument("tenant_id", type=int)
+@with_appcontext
+def assign_tenant_command(username, tenant_id):
+    """Move a user to another tenant (running servers see it within USER_CACHE_TTL)."""
+    user = User.get_by_username(username)
+    if user is None:
+        raise click.ClickException(f"Unknown user {username!r}.")
+    if db.session.get(Tenant, tenant_id) is None:
+        raise click.ClickException(f"Unknown tenant {tenant_id}.")
+    user.tenant_id = tenant_id
+    db.session.commit()
+    click.echo(f"User {username} now belongs to tenant {tenant_id}.")
@@ -0,0 +1,142 @@
+"""
+Cache für eingeloggte User (Flask-Login user_loader).
+
+Statt bei jedem Request `User.query.get()` auszuführen, hält der Cache
+schlanke, unveränderliche User-Datensätze (id, username, role, tenant_id) im
+Speicher:
+- begrenzte Größe (LRU) und TTL pro Eintrag
+- Änderungen und Löschungen an der User-Tabelle (z.B. Passwort, Rolle)
+  entfernen den Eintrag nach dem Commit (IDs werden beim Flush gesammelt);
+  ein Request, der währenddessen noch den alten Stand gelesen hat, legt
+  ihn nicht mehr in den Cache
+- Treffer/Fehlschläge werden für das Monitoring gezählt
+
+Mit mehreren Worker-Prozessen sieht jeder Prozess Änderungen anderer
+Prozesse spätestens nach Ablauf der TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from models import ROLE_ADMIN, RoutingSession, User, db
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 300
+
+
+class CachedUser(UserMixin):
+    """Schlanker User-Datensatz für current_user (ohne ORM-Session)."""
+
+    def __init__(self, id, username, role, tenant_id):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.tenant_id = tenant_id
+
+    def is_admin(self):
+        """Wie User.is_admin – für Decorators und Templates."""
+        return self.role == ROLE_ADMIN
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.username!r}>"
+
+
+class UserCache:
+    """Thread-sicherer LRU/TTL-Cache: User-ID → CachedUser."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Zählt Invalidierungen; ein Ladevorgang, während dessen invalidiert
+        # wurde, kann den alten Stand gelesen haben und wird nicht gecacht
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Größe und TTL aus der App-Konfiguration übernehmen."""
+        self.max_size = app.config.get("USER_CACHE_SIZE", DEFAULT_MAX_SIZE)
+        self.ttl = app.config.get("USER_CACHE_TTL", DEFAULT_TTL)
+
+    def get(self, user_id):
+        """User aus dem Cache holen oder (bei Fehlschlag) aus der DB laden."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        row = db.session.execute(
+            db.select(User.id, User.username, User.role, User.tenant_id).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.username, row.role, row.tenant_id)
+        with self._lock:
+            if generation != self._generation:
+                return user
+            self._entries[user_id] = (user, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, user_id):
+        """Eintrag verwerfen (z.B. nach Passwort- oder Rollenänderung)."""
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Zähler für das Monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Prozessweite Instanz für auth.load_user
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_user(mapper, connection, target):
+    # Erst nach dem Commit verwerfen: vorher könnte ein paralleler Request
+    # den noch gültigen alten Stand erneut in den Cache laden
+    object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+# Auch nach einem Rollback: ein Eintrag zu viel verworfen kostet nur ein
+# erneutes Laden, liegengebliebene IDs würden sonst mit dem nächsten Commit
+# verworfen
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _invalidate_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)